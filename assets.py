@@ -0,0 +1,205 @@
+"""Fingerprinted static files.
+
+url_for('static', filename='styles.css') gives a URL with a hash of the
+file's contents in its name, e.g. /static/styles.0123abcd.css. Requests
+for such URLs are served with a year-long, immutable Cache-Control, so
+browsers never need to revalidate them: a change to the file changes
+its URL. Requests for the plain names still work as before.
+
+If a precompressed copy of a file (styles.css.br or styles.css.gz) is
+present and up to date, it is served to browsers that accept it. Make
+them with ``python -m assets compress``.
+"""
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+
+from flask import Flask, current_app, request, send_from_directory
+
+MAX_AGE = 365 * 24 * 60 * 60
+COMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+COMPRESSIBLE = ('.css', '.js', '.ico', '.svg', '.json', '.webmanifest',
+                '.txt')
+MIN_COMPRESS_SIZE = 1024
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def file_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def hashed_name(filename: str, digest: str) -> str:
+    """styles.css -> styles.<digest>.css"""
+    stem, ext = os.path.splitext(filename)
+    return f'{stem}.{digest}{ext}'
+
+
+def _static_files(static_dir: str):
+    for dirpath, _, filenames in os.walk(static_dir):
+        for name in filenames:
+            if name.endswith(tuple(COMPRESSED_SUFFIXES.values())):
+                continue
+            path = os.path.join(dirpath, name)
+            yield os.path.relpath(path, static_dir).replace(os.sep, '/')
+
+
+class AssetManifest:
+    """Maps each static file to its fingerprinted name and back.
+
+    With check_mtimes, a file is hashed again whenever it changes, so
+    that edits show up without a restart; this is for debug mode.
+    """
+
+    def __init__(self, static_dir: str, check_mtimes: bool = False) -> None:
+        self.static_dir = static_dir
+        self.check_mtimes = check_mtimes
+        self._lock = threading.Lock()
+        # filename -> (mtime, hashed name)
+        self._hashed: Dict[str, Tuple[float, str]] = {}
+        self._originals: Dict[str, str] = {}
+        for filename in _static_files(static_dir):
+            self._add(filename)
+
+    def _add(self, filename: str) -> Optional[str]:
+        path = os.path.join(self.static_dir, filename)
+        try:
+            mtime = os.stat(path).st_mtime
+            name = hashed_name(filename, file_hash(path))
+        except OSError:
+            return None
+        with self._lock:
+            self._hashed[filename] = (mtime, name)
+            self._originals[name] = filename
+        return name
+
+    def hashed(self, filename: str) -> Optional[str]:
+        entry = self._hashed.get(filename)
+        if entry is None:
+            return None
+        if self.check_mtimes:
+            try:
+                path = os.path.join(self.static_dir, filename)
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                return None
+            if mtime != entry[0]:
+                return self._add(filename)
+        return entry[1]
+
+    def original(self, name: str) -> Optional[str]:
+        return self._originals.get(name)
+
+    @property
+    def filenames(self):
+        return list(self._hashed)
+
+
+def _precompressed(filename: str) -> Optional[Tuple[str, str]]:
+    """A precompressed copy of filename that the client accepts, as
+    (path relative to the static folder, content encoding).
+    """
+    static_dir = current_app.static_folder
+    try:
+        mtime = os.stat(os.path.join(static_dir, filename)).st_mtime
+    except OSError:
+        return None
+    for encoding, suffix in COMPRESSED_SUFFIXES.items():
+        if encoding not in request.accept_encodings:
+            continue
+        try:
+            path = os.path.join(static_dir, filename + suffix)
+            if os.stat(path).st_mtime >= mtime:
+                return filename + suffix, encoding
+        except OSError:
+            continue
+    return None
+
+
+def static_view(filename: str):
+    manifest: AssetManifest = current_app.extensions['assets']
+    original = manifest.original(filename)
+    if original is None:
+        return current_app.send_static_file(filename)
+
+    compressed = _precompressed(original)
+    if compressed is not None:
+        path, encoding = compressed
+        mimetype = mimetypes.guess_type(original)[0]
+        response = send_from_directory(current_app.static_folder, path,
+                                       mimetype=mimetype, max_age=MAX_AGE)
+        response.content_encoding = encoding
+    else:
+        response = send_from_directory(current_app.static_folder, original,
+                                       max_age=MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_app(app: Flask) -> None:
+    """Fingerprint the app's static files and serve them."""
+    manifest = AssetManifest(app.static_folder, check_mtimes=app.debug)
+    app.extensions['assets'] = manifest
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            name = manifest.hashed(values['filename'])
+            if name is not None:
+                values['filename'] = name
+
+    app.view_functions['static'] = static_view
+
+
+def compress(static_dir: str) -> int:
+    """Write .gz (and, if brotli is installed, .br) copies of the
+    compressible static files. Returns the number of files written.
+    """
+    written = 0
+    for filename in _static_files(static_dir):
+        path = os.path.join(static_dir, filename)
+        if (not filename.endswith(COMPRESSIBLE)
+                or os.path.getsize(path) < MIN_COMPRESS_SIZE):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(data)
+        for suffix, compressed in variants.items():
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written += 1
+    return written
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Static file tools')
+    parser.add_argument('command', choices=['compress', 'manifest'])
+    parser.add_argument('--static-dir', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'static'
+    ))
+    args = parser.parse_args(argv)
+
+    if args.command == 'compress':
+        n = compress(args.static_dir)
+        print(f'Wrote {n} compressed files'
+              + ('' if brotli else ' (install brotli for .br files)'))
+    else:
+        manifest = AssetManifest(args.static_dir)
+        for filename in sorted(manifest.filenames):
+            print(f'{filename} -> {manifest.hashed(filename)}')
+
+
+if __name__ == '__main__':
+    main()
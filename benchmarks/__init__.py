@@ -0,0 +1,3 @@
+"""Benchmarks for PyPew. Run these from the repository root, e.g.
+``python -m benchmarks.importtime``.
+"""
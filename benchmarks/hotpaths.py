@@ -0,0 +1,273 @@
+"""Benchmarks for the hot paths of PyPew.
+
+Times the model methods that the views depend on and every GET endpoint
+through the Flask test client, and reports min/median/p95 for each. The
+results can be written to a JSON report and compared against a report
+from an earlier run:
+
+    python -m benchmarks.hotpaths --output baseline.json
+    # ... make some changes ...
+    python -m benchmarks.hotpaths --baseline baseline.json
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import statistics
+import sys
+import time
+from tempfile import TemporaryDirectory
+from typing import Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlencode
+
+import attr
+from flask import url_for
+
+import dateexpr
+import models
+from models import Feast, Music, Service
+from pypew import create_app
+
+BENCHMARKS: Dict[str, Callable[[], object]] = {}
+
+PEW_SHEET_ARGS = {
+    'title': 'Advent I (St. Andrew)',
+    'date': '2022-11-27',
+    'time': '11:00',
+    'primary_feast': 'advent-i',
+    'secondary_feasts': 'st-andrew',
+    'celebrant': 'Fr X',
+    'preacher': 'Fr Y',
+    'introit_hymn': 'NEH: 1a',
+    'offertory_hymn': 'NEH: 11',
+    'recessional_hymn': 'NEH: 6',
+    'anthem_group-title': 'Rorate caeli',
+    'anthem_group-composer': 'Byrd',
+    'anthem_group-lyrics': 'Rorate caeli desuper',
+    'anthem_group-translation': '',
+}
+
+# Sample arguments for endpoints that need them, as (path parameters,
+# query parameters).
+ENDPOINT_ARGS = {
+    'dateexpr_view': ({}, {'dexpr': 'Sunday nearest 11 November'}),
+    'feast_detail_view': ({'slug': 'advent-i'}, {}),
+    'feast_detail_api': ({'slug': 'advent-i'}, {}),
+    'feast_date_api': ({'slug': 'advent-i'}, {}),
+    'feast_docx_view': ({'slug': 'advent-i'}, {}),
+    'pew_sheet_create_view': ({}, PEW_SHEET_ARGS),
+    'pew_sheet_docx_view': ({}, PEW_SHEET_ARGS),
+    'service_detail_api': ({'service_id': 1}, {}),
+}
+
+# The memory report needs an admin token, and is slow by design
+SKIPPED_ENDPOINTS = {'static', 'debug_memory_api'}
+
+
+def benchmark(name: str):
+    def decorator(f):
+        BENCHMARKS[name] = f
+        return f
+
+    return decorator
+
+
+def sample_service() -> Service:
+    return Service(
+        title=PEW_SHEET_ARGS['title'],
+        date=dt.date(2022, 11, 27),
+        primary_feast=Feast.get(slug='advent-i'),
+        secondary_feasts=[Feast.get(slug='st-andrew')],
+        celebrant='Fr X',
+        preacher='Fr Y',
+        introit_hymn=Music.get_neh_hymn_by_ref('NEH: 1a'),
+        offertory_hymn=Music.get_neh_hymn_by_ref('NEH: 11'),
+        recessional_hymn=Music.get_neh_hymn_by_ref('NEH: 6'),
+        anthem=Music(title='Rorate caeli', category='Anthem',
+                     composer='Byrd', lyrics='Rorate caeli desuper',
+                     ref=None, translation=''),
+    )
+
+
+def register_model_benchmarks(tempdir: str) -> None:
+    benchmark('Feast.all')(Feast.all)
+    benchmark('Feast.upcoming')(lambda: Feast.upcoming(dt.date(2022, 11, 1)))
+    benchmark('Feast.get')(lambda: Feast.get(slug='st-andrew'))
+    benchmark('dateexpr.parse')(
+        lambda: [dateexpr.parse(expr, 2022) for expr in dateexpr.examples]
+    )
+    benchmark('Music.get_neh_hymn_by_ref')(
+        lambda: Music.get_neh_hymn_by_ref('NEH: 1a')
+    )
+
+    service = sample_service()
+    # Service.items is memoised, so time it on a fresh copy each time
+    benchmark('Service.items')(lambda: attr.evolve(service).items)
+
+    def render_items():
+        return [item.as_richtext() for item in attr.evolve(service).items]
+
+    def render_items_uncached():
+        models._richtext_fragments.cache_clear()
+        return render_items()
+
+    # Before and after pre-rendering the proper texts
+    benchmark('Service.items+richtext')(render_items)
+    benchmark('Service.items+richtext (uncached)')(render_items_uncached)
+    benchmark('Service.create_docx')(
+        lambda: service.create_docx(os.path.join(tempdir, 'service.docx'))
+    )
+
+
+def benchmark_config(tempdir: str) -> dict:
+    """The app config for benchmarks: nothing is kept outside tempdir,
+    and the debug endpoints are served without debug mode.
+    """
+    return {
+        'SERVER_NAME': 'localhost:5000',
+        'SESSION_TYPE': 'memory',
+        'SERVICE_DB': os.path.join(tempdir, 'services.sqlite3'),
+        'DEBUG': False,
+        'DEBUG_ENDPOINTS': True,
+    }
+
+
+def register_endpoint_benchmarks(tempdir: str) -> None:
+    app = create_app(config=benchmark_config(tempdir))
+    client = app.test_client()
+    # Make sure that there is a stored service for the detail API
+    client.get('/pewSheet?' + urlencode(PEW_SHEET_ARGS))
+
+    for rule in app.url_map.iter_rules():
+        if 'GET' not in rule.methods or rule.endpoint in SKIPPED_ENDPOINTS:
+            continue
+        path_args, query = ENDPOINT_ARGS.get(rule.endpoint, ({}, {}))
+        with app.test_request_context():
+            url = url_for(rule.endpoint, **path_args)
+        if query:
+            url += '?' + urlencode(query)
+
+        def get(url=url):
+            r = client.get(url)
+            if r.status_code >= 400:
+                raise RuntimeError(f'{url} returned {r.status_code}')
+            return r
+
+        benchmark(f'GET {rule.endpoint}')(get)
+
+
+def percentile(values: List[float], p: float) -> float:
+    """The p-th percentile (0 <= p <= 100), by linear interpolation."""
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarise(timings: List[float]) -> Dict[str, float]:
+    """Summary statistics, in milliseconds, of timings in seconds."""
+    ms = [t * 1000 for t in timings]
+    return {
+        'n': len(ms),
+        'min': min(ms),
+        'median': statistics.median(ms),
+        'p95': percentile(ms, 95),
+        'mean': statistics.fmean(ms),
+    }
+
+
+def time_benchmark(f: Callable[[], object], repeat: int) -> List[float]:
+    f()  # warm up
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        f()
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def run(repeat: int = 20, only: Optional[str] = None) -> Dict[str, dict]:
+    """Run every benchmark (or those whose names contain `only`) and
+    return the summary statistics for each.
+    """
+    results = {}
+    with TemporaryDirectory() as tempdir:
+        BENCHMARKS.clear()
+        register_model_benchmarks(tempdir)
+        register_endpoint_benchmarks(tempdir)
+        for name, f in BENCHMARKS.items():
+            if only and only not in name:
+                continue
+            results[name] = summarise(time_benchmark(f, repeat))
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict],
+            stat: str = 'median') -> Dict[str, float]:
+    """The ratio of each result to the baseline, for the benchmarks
+    present in both.
+    """
+    return {
+        name: results[name][stat] / baseline[name][stat]
+        for name in results
+        if name in baseline and baseline[name][stat] > 0
+    }
+
+
+def report(results: Dict[str, dict],
+           ratios: Optional[Dict[str, float]] = None) -> None:
+    width = max(len(name) for name in results)
+    header = f'{"benchmark":<{width}}  {"min":>9}  {"median":>9}  {"p95":>9}'
+    if ratios is not None:
+        header += '  vs baseline'
+    print(header)
+    for name, stats in results.items():
+        line = (f'{name:<{width}}  {stats["min"]:8.2f}ms'
+                f'  {stats["median"]:8.2f}ms  {stats["p95"]:8.2f}ms')
+        if ratios is not None and name in ratios:
+            line += f'  {ratios[name]:6.2f}x'
+        print(line)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='Number of timed runs per benchmark')
+    parser.add_argument('--only', help='Only run benchmarks whose names '
+                                       'contain this string')
+    parser.add_argument('--output', help='Write a JSON report here')
+    parser.add_argument('--baseline', help='Compare against this report')
+    parser.add_argument('--max-ratio', type=float, default=None,
+                        help='Fail if any median is this many times '
+                             'slower than the baseline')
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat, args.only)
+
+    ratios = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            ratios = compare(results, json.load(f)['results'])
+
+    report(results, ratios)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'created': dt.datetime.now().isoformat(),
+                'python': sys.version,
+                'repeat': args.repeat,
+                'results': results,
+            }, f, indent=2)
+
+    if ratios and args.max_ratio is not None:
+        regressions = {k: v for k, v in ratios.items() if v > args.max_ratio}
+        for name, ratio in regressions.items():
+            print(f'REGRESSION: {name} is {ratio:.2f}x slower')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""Import-time and cold-start budgets.
+
+Measures ``python -X importtime`` for the main modules and the time
+from a cold interpreter to the first response from the app's test
+client, each in a fresh subprocess. Exits with status 1 if any
+measurement is over budget, and reports the slowest imports.
+
+Budgets are in milliseconds. Override them with ``--budget NAME=MS`` or
+with the PYPEW_BUDGETS environment variable, e.g.
+``PYPEW_BUDGETS=pypew=1500,first_response=2500``.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+REPO_DIR = Path(__file__).parent.parent
+
+MODULES = ['pypew', 'models', 'forms', 'views']
+
+DEFAULT_BUDGETS_MS = {
+    'pypew': 2000,
+    'models': 1500,
+    'forms': 2000,
+    'views': 2000,
+    'first_response': 3000,
+}
+
+IMPORTTIME_RE = re.compile(
+    r'^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \| (?P<name>.*)$'
+)
+
+FIRST_RESPONSE_SCRIPT = '''
+import json, time
+t0 = time.perf_counter()
+from pypew import create_app
+t1 = time.perf_counter()
+app = create_app()
+client = app.test_client()
+t2 = time.perf_counter()
+r = client.get({path!r})
+t3 = time.perf_counter()
+print(json.dumps({{
+    'status': r.status_code,
+    'import_ms': (t1 - t0) * 1000,
+    'create_app_ms': (t2 - t1) * 1000,
+    'request_ms': (t3 - t2) * 1000,
+    'total_ms': (t3 - t0) * 1000,
+}}))
+'''
+
+
+class ImportRecord(NamedTuple):
+    self_us: int
+    cumulative_us: int
+    name: str
+
+
+def _run(args: List[str]) -> subprocess.CompletedProcess:
+    env = dict(os.environ)
+    env.setdefault('SERVER_NAME', 'localhost:5000')
+    return subprocess.run(
+        [sys.executable, *args], cwd=REPO_DIR, env=env,
+        capture_output=True, text=True, check=True,
+    )
+
+
+def measure_import(module: str) -> List[ImportRecord]:
+    """Import the module in a fresh interpreter and return one record
+    per imported module, as reported by -X importtime.
+    """
+    result = _run(['-X', 'importtime', '-c', f'import {module}'])
+    records = []
+    for line in result.stderr.splitlines():
+        m = IMPORTTIME_RE.match(line)
+        if m:
+            records.append(ImportRecord(
+                int(m.group('self')), int(m.group('cumulative')),
+                m.group('name').strip()
+            ))
+    return records
+
+
+def total_ms(records: List[ImportRecord], module: str) -> float:
+    """The cumulative import time of the module, in milliseconds."""
+    for record in records:
+        if record.name == module:
+            return record.cumulative_us / 1000
+    raise ValueError(f'{module} not found in import records')
+
+
+def measure_first_response(path: str = '/') -> Dict[str, float]:
+    """Time from a cold interpreter to the first response from the test
+    client.
+    """
+    result = _run(['-c', FIRST_RESPONSE_SCRIPT.format(path=path)])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def parse_budgets(specs: Sequence[str]) -> Dict[str, float]:
+    budgets = dict(DEFAULT_BUDGETS_MS)
+    env_specs = [s for s in os.environ.get('PYPEW_BUDGETS', '').split(',')
+                 if s]
+    for spec in [*env_specs, *specs]:
+        name, _, ms = spec.partition('=')
+        budgets[name.strip()] = float(ms)
+    return budgets
+
+
+def check(budgets: Dict[str, float], top: int = 10,
+          path: str = '/') -> List[str]:
+    """Measure everything and print a report. Returns a description of
+    each budget that was exceeded.
+    """
+    failures = []
+    for module in MODULES:
+        records = measure_import(module)
+        ms = total_ms(records, module)
+        status = 'OK' if ms <= budgets[module] else 'OVER BUDGET'
+        print(f'import {module}: {ms:.0f} ms '
+              f'(budget {budgets[module]:.0f} ms) {status}')
+        if ms > budgets[module]:
+            failures.append(f'import {module} took {ms:.0f} ms')
+
+        if module == MODULES[0]:
+            slowest = sorted(records, key=lambda r: r.self_us, reverse=True)
+            print('  slowest imports (self time):')
+            for record in slowest[:top]:
+                print(f'    {record.self_us / 1000:8.1f} ms  {record.name}')
+
+    timings = measure_first_response(path)
+    ms = timings['total_ms']
+    budget = budgets['first_response']
+    status = 'OK' if ms <= budget else 'OVER BUDGET'
+    print(f'first response to {path}: {ms:.0f} ms (budget {budget:.0f} ms) '
+          f'{status}')
+    print(f'  import {timings["import_ms"]:.0f} ms, '
+          f'create_app {timings["create_app_ms"]:.0f} ms, '
+          f'request {timings["request_ms"]:.0f} ms, '
+          f'status {timings["status"]}')
+    if ms > budget:
+        failures.append(f'first response took {ms:.0f} ms')
+    if timings['status'] != 200:
+        failures.append(f'first response had status {timings["status"]}')
+
+    return failures
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--budget', action='append', default=[],
+                        metavar='NAME=MS',
+                        help='Override a budget, e.g. pypew=1500')
+    parser.add_argument('--top', type=int, default=10,
+                        help='Number of slowest imports to report')
+    parser.add_argument('--path', default='/',
+                        help='Path to request for the first response')
+    args = parser.parse_args(argv)
+
+    failures = check(parse_budgets(args.budget), args.top, args.path)
+    for failure in failures:
+        print('FAIL:', failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,328 @@
+"""A load test that imitates Sunday-morning traffic.
+
+Several simulated users each loop over a weighted mix of requests:
+filling in the pew sheet form (which builds up their history in the
+session), downloading pew sheets (mostly the same few, as happens just
+before a service), and looking at feast pages and the upcoming feasts
+API. At the end the throughput, p50/p95/p99 latency and error rate of
+each kind of request are reported.
+
+By default the app is run in-process through Flask's test client. To
+load a real server instead, start one and pass its URL, or let the
+load test start one on a free port:
+
+    python -m benchmarks.loadtest --users 8 --duration 30
+    python pypew.py serve --bind 127.0.0.1:8000 &
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000
+    python -m benchmarks.loadtest --serve --workers 2 --threads 4
+
+Nothing is fetched from outside the machine.
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.cookiejar import CookieJar
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import (Callable, Dict, List, NamedTuple, Optional, Sequence,
+                    Tuple)
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, build_opener
+
+from benchmarks.hotpaths import (PEW_SHEET_ARGS, benchmark_config,
+                                 percentile)
+
+REPO_DIR = Path(__file__).parent.parent
+
+# Feasts that people are likely to be looking at on a Sunday morning
+FEASTS = ['advent-i', 'advent-ii', 'christmas-day', 'the-epiphany',
+          'ash-wednesday', 'easter-day', 'whitsunday', 'trinity-sunday',
+          'st-andrew', 'all-saints-day']
+
+# The pew sheets being made this week: a handful, each downloaded many
+# times
+PEW_SHEETS = [
+    dict(PEW_SHEET_ARGS),
+    dict(PEW_SHEET_ARGS, title='Advent II', date='2022-12-04',
+         primary_feast='advent-ii', secondary_feasts=''),
+    dict(PEW_SHEET_ARGS, title='Christmas Day', date='2022-12-25',
+         primary_feast='christmas-day', secondary_feasts='',
+         offertory_hymn='NEH: 30'),
+    dict(PEW_SHEET_ARGS, title='Advent I (said)', time='08:00',
+         introit_hymn='', offertory_hymn='', recessional_hymn='',
+         **{'anthem_group-title': '', 'anthem_group-composer': '',
+            'anthem_group-lyrics': ''}),
+]
+
+
+class Scenario(NamedTuple):
+    name: str
+    weight: int
+    # Makes the path (with query string) of one request
+    path: Callable[[random.Random], str]
+
+
+def _pew_sheet_form(rng: random.Random) -> str:
+    # Each user tries a few variations, adding each to their history
+    args = dict(rng.choice(PEW_SHEETS),
+                celebrant=rng.choice(['Fr X', 'Fr Y', 'Fr Z']))
+    return '/pewSheet?' + urlencode(args)
+
+
+SCENARIOS = [
+    Scenario('pew sheet form', 3, _pew_sheet_form),
+    Scenario('pew sheet docx', 3,
+             lambda rng: '/pewSheet/docx?'
+             + urlencode(rng.choice(PEW_SHEETS))),
+    Scenario('feast page', 4, lambda rng: f'/feast/{rng.choice(FEASTS)}'),
+    Scenario('upcoming feasts api', 2, lambda rng: '/feasts/api/upcoming'),
+]
+
+
+class Result(NamedTuple):
+    scenario: str
+    status: int  # 0 if the request failed without a response
+    seconds: float
+
+
+# Sends a GET for a path and returns the status code
+Client = Callable[[str], int]
+
+
+def in_process_clients(tempdir: str) -> Callable[[], Client]:
+    """A factory of clients for an app in this process, each with its
+    own cookies.
+    """
+    from pypew import create_app
+
+    app = create_app(config=benchmark_config(tempdir))
+
+    def make_client() -> Client:
+        client = app.test_client()
+
+        def get(path: str) -> int:
+            r = client.get(path)
+            r.get_data()  # streamed responses are only read here
+            return r.status_code
+
+        return get
+
+    return make_client
+
+
+def http_clients(url: str, timeout: float = 30) -> Callable[[], Client]:
+    """A factory of clients for a server, each with its own cookies."""
+    url = url.rstrip('/')
+
+    def make_client() -> Client:
+        opener = build_opener(HTTPCookieProcessor(CookieJar()))
+
+        def get(path: str) -> int:
+            try:
+                with opener.open(url + path, timeout=timeout) as r:
+                    r.read()
+                    return r.status
+            except HTTPError as e:
+                e.read()
+                return e.code
+            except (URLError, OSError):
+                return 0
+
+        return get
+
+    return make_client
+
+
+def _user(client: Client, rng: random.Random, deadline: float,
+          results: List[Result], lock: threading.Lock) -> None:
+    weights = [s.weight for s in SCENARIOS]
+    mine = []
+    while time.perf_counter() < deadline:
+        scenario = rng.choices(SCENARIOS, weights)[0]
+        path = scenario.path(rng)
+        t0 = time.perf_counter()
+        try:
+            status = client(path)
+        except Exception:
+            status = 0
+        mine.append(Result(scenario.name, status, time.perf_counter() - t0))
+    with lock:
+        results.extend(mine)
+
+
+def run(make_client: Callable[[], Client], users: int = 4,
+        duration: float = 10, seed: int = 0) -> Dict[str, dict]:
+    """Run the given number of simulated users for duration seconds and
+    return the statistics for each scenario, and for all of them.
+    """
+    results: List[Result] = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [
+        threading.Thread(
+            target=_user,
+            args=(make_client(), random.Random(seed + n), deadline, results,
+                  lock),
+        )
+        for n in range(users)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarise(results, time.perf_counter() - start)
+
+
+def _stats(results: List[Result], elapsed: float) -> dict:
+    ms = [r.seconds * 1000 for r in results]
+    errors = sum(1 for r in results if not 200 <= r.status < 400)
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[str(r.status)] = statuses.get(str(r.status), 0) + 1
+    return {
+        'requests': len(results),
+        'errors': errors,
+        'error_rate': errors / len(results),
+        'throughput': len(results) / elapsed,
+        'p50': percentile(ms, 50),
+        'p95': percentile(ms, 95),
+        'p99': percentile(ms, 99),
+        'statuses': dict(sorted(statuses.items())),
+    }
+
+
+def summarise(results: List[Result], elapsed: float) -> Dict[str, dict]:
+    """Statistics for each scenario (latencies in milliseconds,
+    throughput in requests per second), and for all of them together
+    under 'all'.
+    """
+    summary = {}
+    for scenario in SCENARIOS:
+        mine = [r for r in results if r.scenario == scenario.name]
+        if mine:
+            summary[scenario.name] = _stats(mine, elapsed)
+    if results:
+        summary['all'] = _stats(results, elapsed)
+    return summary
+
+
+def report(summary: Dict[str, dict]) -> None:
+    width = max([len(name) for name in summary] + [len('scenario')])
+    print(f'{"scenario":<{width}}  {"requests":>8}  {"req/s":>8}'
+          f'  {"errors":>7}  {"p50":>9}  {"p95":>9}  {"p99":>9}')
+    for name, s in summary.items():
+        print(f'{name:<{width}}  {s["requests"]:>8}  {s["throughput"]:8.1f}'
+              f'  {s["error_rate"]:6.1%}  {s["p50"]:7.1f}ms'
+              f'  {s["p95"]:7.1f}ms  {s["p99"]:7.1f}ms')
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers: int, threads: int, tempdir: str,
+                 timeout: float = 60) -> Tuple[subprocess.Popen, str]:
+    """Start `pypew.py serve` on a free port, and wait until it answers.
+    Its sessions and services are kept in tempdir.
+    """
+    port = _free_port()
+    env = dict(
+        os.environ,
+        SERVER_NAME=f'127.0.0.1:{port}',
+        SESSION_TYPE='sqlite',
+        SESSION_DB=os.path.join(tempdir, 'sessions.sqlite3'),
+        SERVICE_DB=os.path.join(tempdir, 'services.sqlite3'),
+    )
+    process = subprocess.Popen(
+        [sys.executable, 'pypew.py', 'serve', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--threads', str(threads),
+         '--log-level', 'warning'],
+        cwd=REPO_DIR, env=env,
+    )
+    url = f'http://127.0.0.1:{port}'
+    get = http_clients(url, timeout=1)()
+    deadline = time.perf_counter() + timeout
+    while get('/feasts/api/upcoming') != 200:
+        if process.poll() is not None or time.perf_counter() > deadline:
+            process.kill()
+            raise RuntimeError('The server did not start')
+        time.sleep(0.2)
+    return process, url
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=4,
+                        help='Number of simulated users, each sending one '
+                             'request at a time')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='Seconds to run for')
+    parser.add_argument('--seed', type=int, default=0)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', help='Load this server instead of an app '
+                                      'in this process')
+    target.add_argument('--serve', action='store_true',
+                        help='Start a server on a free port and load it')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='Workers for --serve')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='Threads per worker for --serve')
+    parser.add_argument('--output', help='Write a JSON report here')
+    parser.add_argument('--max-error-rate', type=float, default=None,
+                        help='Fail if more than this fraction of requests '
+                             'fail')
+    args = parser.parse_args(argv)
+
+    process = None
+    with TemporaryDirectory() as tempdir:
+        if args.serve:
+            process, url = start_server(args.workers, args.threads,
+                                        tempdir)
+            make_client = http_clients(url)
+        elif args.url:
+            make_client = http_clients(args.url)
+        else:
+            make_client = in_process_clients(tempdir)
+        try:
+            summary = run(make_client, args.users, args.duration, args.seed)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(30)
+
+    if not summary:
+        print('No requests were made')
+        return 1
+    report(summary)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'created': dt.datetime.now().isoformat(),
+                'target': (args.url
+                           or ('serve' if args.serve else 'in-process')),
+                'users': args.users,
+                'duration': args.duration,
+                'results': summary,
+            }, f, indent=2)
+
+    if (args.max_error_rate is not None
+            and summary['all']['error_rate'] > args.max_error_rate):
+        print(f'FAIL: error rate {summary["all"]["error_rate"]:.1%}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""The compiled feast catalogue.
+
+The feasts are edited as one YAML file per feast under data/feasts, but
+most pages only need each feast's name and date rule. The catalogue
+packs every feast into a single file in the cache directory: the first
+line is a JSON index holding the metadata of each feast and the offset
+and length of its proper texts, and the rest of the file is the proper
+texts of each feast as a JSON block. Loading the catalogue reads only
+the index; proper texts are read when first needed.
+
+The catalogue is named by a hash of the YAML files, and is recompiled
+automatically whenever they change; other catalogues in the cache
+directory are then deleted. So the catalogue is reused wherever the
+same feasts are unpacked again, e.g. by each launch of the one-file
+desktop build, and old catalogues don't pile up.
+
+A running app can also pick up edits to the YAML files without
+restarting: FeastWatcher notices which files have changed, and every
+reload bumps data_version(), which caches of anything derived from the
+feasts include in their keys.
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import yaml
+
+from tracing import span
+from utils import cache_dir, logger
+
+FORMAT_VERSION = 2
+
+# The fields that are loaded eagerly. Everything else is a proper text.
+METADATA_FIELDS = ['name', 'month', 'day', 'coeaster', 'coadvent', 'dateexpr']
+PROPER_FIELDS = ['introit', 'collect', 'epistle_ref', 'epistle', 'gat',
+                 'gradual', 'alleluia', 'tract', 'gospel_ref', 'gospel',
+                 'offertory', 'communion']
+
+
+_data_version = 0
+_data_version_lock = threading.Lock()
+
+
+def data_version() -> int:
+    """A number that changes whenever the feast data is reloaded."""
+    return _data_version
+
+
+def bump_data_version() -> int:
+    global _data_version
+    with _data_version_lock:
+        _data_version += 1
+        return _data_version
+
+
+def default_path(src_dir: Path, signature: Optional[dict] = None) -> str:
+    """Where to keep the catalogue of the feasts in src_dir (whose
+    source_signature may be given), so that checkouts and launches with
+    the same feasts share it.
+    """
+    if signature is None:
+        signature = source_signature(src_dir)
+    return os.path.join(cache_dir,
+                        f'feasts-{signature["sha1"][:12]}.catalogue')
+
+
+def remove_other_catalogues(path: str) -> None:
+    """Delete the catalogues in the cache directory other than path.
+    Processes that still have one open can go on reading it, except on
+    Windows, where it is left for next time.
+    """
+    for entry in os.scandir(cache_dir):
+        if (entry.name.startswith('feasts-')
+                and entry.name.endswith('.catalogue')
+                and not os.path.samefile(entry.path, path)):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def read_slugs(src_dir: Path) -> List[str]:
+    with open(src_dir / '_list.txt') as f:
+        return [x.strip() for x in f if x.strip()]
+
+
+def read_yaml(src_dir: Path, slug: str) -> dict:
+    with span('feast.load_yaml', slug=slug), \
+            open((src_dir / slug).with_suffix('.yaml')) as f:
+        return yaml.safe_load(f)
+
+
+def split_fields(info: dict) -> Tuple[dict, dict]:
+    """Split a feast's fields into metadata and proper texts."""
+    unknown = set(info) - set(METADATA_FIELDS) - set(PROPER_FIELDS)
+    if unknown:
+        raise ValueError(f'Unknown fields {sorted(unknown)}')
+    metadata = {k: v for k, v in info.items() if k in METADATA_FIELDS}
+    propers = {k: v for k, v in info.items() if k in PROPER_FIELDS}
+    return metadata, propers
+
+
+def source_signature(src_dir: Path) -> dict:
+    """A hash of the feast data, which changes whenever the data does
+    but not when the same files are unpacked somewhere else.
+    """
+    digest = hashlib.sha1()
+    names = sorted(name for name in os.listdir(src_dir)
+                   if name.endswith(('.yaml', '.txt')))
+    for name in names:
+        digest.update(f'{name}\0'.encode())
+        digest.update(hashlib.sha1((Path(src_dir) / name).read_bytes())
+                      .digest())
+    return {'sha1': digest.hexdigest(), 'count': len(names)}
+
+
+def compile_catalogue(src_dir: Path, path: Optional[str] = None,
+                      signature: Optional[dict] = None) -> None:
+    """Compile the YAML files in src_dir into a catalogue at path."""
+    with span('catalogue.compile'):
+        if signature is None:
+            signature = source_signature(src_dir)
+        write_catalogue(
+            ((slug, read_yaml(src_dir, slug)) for slug in read_slugs(src_dir)),
+            signature,
+            path or default_path(src_dir, signature),
+        )
+
+
+def write_catalogue(feasts: Iterable[Tuple[str, dict]], signature: dict,
+                    path: str) -> None:
+    """Write a catalogue of the given (slug, fields) pairs, which were
+    read from YAML files with the given source_signature.
+    """
+    entries, blocks = [], []
+    offset = 0
+    for slug, info in feasts:
+        metadata, propers = split_fields(info)
+        block = json.dumps(propers, ensure_ascii=False).encode() + b'\n'
+        entries.append({'slug': slug, **metadata,
+                        'offset': offset, 'length': len(block)})
+        blocks.append(block)
+        offset += len(block)
+
+    header = json.dumps({
+        'version': FORMAT_VERSION,
+        'source': signature,
+        'feasts': entries,
+    }, ensure_ascii=False).encode() + b'\n'
+
+    # Write to a temporary file and move it into place, so that other
+    # processes never see a half-written catalogue.
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.writelines(blocks)
+    os.replace(tmp_path, path)
+    logger.info(f'Compiled feast catalogue with {len(entries)} feasts '
+                f'to {path}')
+
+
+class Catalogue:
+    """An open catalogue file. The file is kept open so that proper
+    texts can still be read after a newer catalogue has replaced it.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, 'rb')
+        self._lock = threading.Lock()
+        header = json.loads(self._file.readline())
+        self._body_start = self._file.tell()
+        self.version: int = header['version']
+        self.source: dict = header['source']
+        self.entries: List[dict] = header['feasts']
+
+    def close(self) -> None:
+        self._file.close()
+
+    def read_propers(self, offset: int, length: int) -> Dict[str, str]:
+        with self._lock:
+            self._file.seek(self._body_start + offset)
+            block = self._file.read(length)
+        return json.loads(block)
+
+
+def load_catalogue(src_dir: Path, path: Optional[str] = None) -> Catalogue:
+    """Open the catalogue, compiling it first if it is missing or does
+    not match the YAML files. A catalogue compiled to the default path
+    replaces the other catalogues in the cache directory.
+    """
+    signature = source_signature(src_dir)
+    default = path is None
+    path = path or default_path(src_dir, signature)
+    catalogue: Optional[Catalogue] = None
+    if os.path.exists(path):
+        catalogue = Catalogue(path)
+        if (catalogue.version == FORMAT_VERSION
+                and catalogue.source == signature):
+            return catalogue
+        catalogue.close()
+
+    compile_catalogue(src_dir, path, signature)
+    if default:
+        remove_other_catalogues(path)
+    return Catalogue(path)
+
+
+class FeastWatcher:
+    """Watch a data directory for changed YAML files, in a background
+    thread.
+
+    Changes are found by comparing modification times every `interval`
+    seconds and also, if inotify_simple is installed, as soon as inotify
+    reports that something in the directory has changed. on_change is
+    called with the slugs of the changed feasts, or with None if
+    _list.txt has changed and everything needs reloading. If on_change
+    raises, e.g. because a file was caught half-written, the same
+    changes are reported again on the next check.
+    """
+
+    def __init__(self, src_dir: Path,
+                 on_change: Callable[[Optional[Set[str]]], None],
+                 interval: float = 2) -> None:
+        self.src_dir = Path(src_dir)
+        self.on_change = on_change
+        self.interval = interval
+        self._mtimes = self._scan()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _scan(self) -> Dict[str, int]:
+        return {entry.name: entry.stat().st_mtime_ns
+                for entry in os.scandir(self.src_dir)
+                if entry.name.endswith(('.yaml', '.txt'))}
+
+    def check(self) -> bool:
+        """Look for changes, and report them. Returns whether anything
+        was reloaded.
+        """
+        mtimes = self._scan()
+        if mtimes == self._mtimes:
+            return False
+        changed = {name for name in mtimes.keys() | self._mtimes.keys()
+                   if mtimes.get(name) != self._mtimes.get(name)}
+        slugs: Optional[Set[str]] = None
+        if all(name.endswith('.yaml') for name in changed):
+            # Deleted files can't be reloaded; if the feast is still in
+            # _list.txt then it keeps its last known contents.
+            slugs = {name[:-len('.yaml')] for name in changed
+                     if name in mtimes}
+
+        try:
+            self.on_change(slugs)
+        except Exception:
+            logger.exception('Failed to reload feast data')
+            return False
+        self._mtimes = mtimes
+        return True
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='feast-watcher')
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        try:
+            from inotify_simple import INotify, flags
+        except ImportError:
+            while not self._stop.wait(self.interval):
+                self.check()
+            return
+
+        with INotify() as inotify:
+            inotify.add_watch(self.src_dir, flags.CLOSE_WRITE | flags.CREATE
+                              | flags.DELETE | flags.MOVED_TO)
+            while not self._stop.is_set():
+                if inotify.read(timeout=int(self.interval * 1000)):
+                    # Editors often make several changes for one save
+                    inotify.read(timeout=100, read_delay=100)
+                # Check after a timeout too, in case an event was missed
+                self.check()
@@ -1,6 +1,8 @@
 import datetime as dt
 import re
 from datetime import date
+from functools import lru_cache
+from typing import Callable
 
 import dateutil
 import dateutil.parser
@@ -19,60 +21,76 @@ aliases = {
     "Remembrance Sunday": "Sunday nearest Remembrance Day",
 }
 
+# Examples shown on the dateexpr page
+examples = [
+    "4th Sunday before Christmas",
+    "Epiphany",
+    "1st Sunday after 13 days after Christmas",
+    "Easter",
+    "Easter Monday",
+    "17 weeks after Easter",
+    "11 November",
+    "Remembrance Sunday",
+]
+
+_easter = lru_cache(maxsize=None)(easter)
+
 dowmap = {
     "Monday": 0, "Tuesday": 1, "Wednesday": 2, "Thursday": 3,
     "Friday": 4, "Saturday": 5, "Sunday": 6
 }
 
 
-def parse_simple(expr: str, year=None) -> date:
+def compile_simple(expr: str) -> Callable[[int], date]:
     if expr in aliases:
-        return parse(aliases[expr], year)
-
-    if year is not None:
-        reference = date(year, 1, 1)
-    else:
-        reference = date.today()
+        return compile_expr(aliases[expr])
 
     if expr == "Easter":
-        d = easter(reference.year)
-    else:
-        d = dateutil.parser.parse(expr).replace(year=reference.year).date()
-    return d
+        return _easter
+
+    d = dateutil.parser.parse(expr)
+    month, day = d.month, d.day
+    return lambda year: date(year, month, day)
 
 
-def parse_compound(expr: str, year=None) -> date:
+def compile_compound(expr: str) -> Callable[[int], date]:
     # Break at the first operator word, recurse on the rest
     m = re.search("(?P<modifier>.*?) (?P<op>before|after|nearest) (?P<base>.*)", expr)
     if not m:
-        return parse_simple(expr, year)
+        return compile_simple(expr)
     modifier = m.group("modifier")
     op = m.group("op")
-    base = m.group("base")
-    basedate = parse_compound(base, year)
+    base = compile_compound(m.group("base"))
 
     if op in {"after", "before"}:
         m = re.match(r"(?:(?P<num>\d+)\w* )?(?P<unit>\w+)", modifier)
-        # breakpoint()
         if not m:
-            raise ValueError
+            raise ValueError(f"Bad clause {modifier!r}")
         num = int(m.group("num") or 1)
         unit = m.group("unit")
+        if unit.rstrip("s") not in {"day", "week"} | dowmap.keys():
+            raise ValueError(f"Unknown unit {unit!r}")
 
-        return apply_relative_clause(basedate, op, num, unit)
+        return lambda year: apply_relative_clause(base(year), op, num, unit)
 
-    elif op == "nearest":
+    else:
         m = re.match(r"(?P<what>\w+)", modifier)
-        if not m:
-            raise ValueError
+        if not m or m.group("what") not in dowmap:
+            raise ValueError(f"Bad clause {modifier!r}")
         what = m.group("what")
 
-        return apply_nearest_clause(basedate, what)
+        return lambda year: apply_nearest_clause(base(year), what)
 
-    else:
-        raise ValueError
 
-    return basedate
+@lru_cache(maxsize=None)
+def compile_expr(expr: str) -> Callable[[int], date]:
+    """Parse the expression once, returning a function from a year to
+    the date in that year. Raises ValueError if the expression is not
+    valid.
+    """
+    if expr in aliases:
+        return compile_expr(aliases[expr])
+    return compile_compound(expr)
 
 
 def apply_relative_clause(base: date, op: str, num: int, unit: str) -> date:
@@ -124,6 +142,6 @@ def apply_nearest_clause(base: date, what: str) -> date:
 
 
 def parse(expr: str, year=None) -> date:
-    if expr in aliases:
-        return parse(aliases[expr], year)
-    return parse_compound(expr, year)
+    if year is None:
+        year = date.today().year
+    return compile_expr(expr)(year)
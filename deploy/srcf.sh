@@ -9,7 +9,7 @@ export SCRIPT_NAME=/pypew
 . /home/jmft2/venvs/py312/bin/activate
 
 cd "$(dirname "$files")"
-exec gunicorn wsgi:app \
-    -w 4 \
+exec python pypew.py serve \
+    --workers 4 \
     --bind "$bindto" \
     --log-level debug
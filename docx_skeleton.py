@@ -0,0 +1,321 @@
+"""A faster renderer for the pew sheet template.
+
+docxtpl renders a template by patching the XML of the whole document,
+running it through Jinja, parsing and fixing up the result, and saving
+every part of the package again. The pew sheet only ever changes in a
+few places, so compile_template does all of that once, rendering the
+template with a marker in place of each placeholder. What is left is a
+skeleton: the static parts of document.xml between the markers, and
+the other members of the package, already compressed. Rendering a
+service then only escapes its few values, joins them to the skeleton
+and writes the zip.
+
+Only the placeholders that the pew sheet template uses are supported:
+``{{ service | filter }}`` in the text of a run, and a
+``{% for item in service.items %}`` loop over paragraphs containing
+``{{ item | filter }}``. compile_template raises UnsupportedTemplate for
+anything else, and render raises it for values that docxtpl would turn
+into more than text (tabs, line breaks and so on), so that the caller
+can fall back to docxtpl.
+"""
+import re
+import struct
+import time
+import zipfile
+import zlib
+from io import BytesIO
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple, Union
+
+import jinja2
+from attr import define, field
+from docxtpl import DocxTemplate
+from lxml import etree
+from markupsafe import escape
+
+MARKER = 'PYPEW-SLOT-{}'
+DOCUMENT = 'word/document.xml'
+
+_TAG = re.compile(r'{{(?:(?!}}).)*}}|{%(?:(?!%}).)*%}', re.DOTALL)
+_SERVICE_TEXT = re.compile(r'{{\s*service\s*\|\s*(\w+)\s*}}')
+_ITEM_TEXT = re.compile(r'{{\s*item\s*\|\s*(\w+)\s*}}')
+_FOR = re.compile(r'{%\s*for\s+item\s+in\s+service\.items\s*%}')
+_ENDFOR = re.compile(r'{%\s*endfor\s*%}')
+# Characters that docxtpl turns into markup, and those that XML can't
+# hold at all
+_SPECIAL = re.compile('[\x00-\x1f]')
+
+
+class UnsupportedTemplate(ValueError):
+    pass
+
+
+@define
+class _TextSlot:
+    """A {{ service | filter }} in the text of a run."""
+    filter: str = field()
+    # The static XML around the slot if its value is empty and it is
+    # the whole text of its element, which lxml writes as <w:t .../>
+    empty: Optional[Tuple[bytes, bytes]] = field(default=None)
+
+
+@define
+class _LoopSlot:
+    """A {% for item in service.items %} loop over whole paragraphs."""
+    # The source of the loop body, split around its placeholders:
+    # [xml, filter, xml, filter, ..., xml]
+    body: List[str] = field()
+
+
+@define
+class _Member:
+    name: str = field()
+    crc: int = field()
+    size: int = field()
+    data: bytes = field()  # deflated
+
+
+def _deflate(data: bytes) -> bytes:
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED,
+                                  -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _member(name: str, data: bytes) -> _Member:
+    return _Member(name, zlib.crc32(data), len(data), _deflate(data))
+
+
+def _unescape_braces(s: str) -> str:
+    # As docxtpl does after rendering
+    return (s.replace('{_{', '{{').replace('}_}', '}}')
+            .replace('{_%', '{%').replace('%_}', '%}'))
+
+
+def _escape_text(s: str) -> str:
+    """Escape text as lxml does when writing it."""
+    return s.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+class _MarkedTemplate(DocxTemplate):
+    """Renders the given body source instead of the template's own."""
+
+    def __init__(self, template_file, body_src: str):
+        super().__init__(template_file)
+        self.body_src = body_src
+
+    def build_xml(self, context, jinja_env=None):
+        return self.render_xml_part(self.body_src, self.docx._part, context,
+                                    jinja_env)
+
+
+class SkeletonTemplate:
+    def __init__(self, body_start: str, pieces: List[bytes],
+                 slots: List[Union[_TextSlot, _LoopSlot]],
+                 members: List[Union[_Member, str]]):
+        self._body_start = body_start
+        self._pieces = pieces
+        self._slots = slots
+        self._members = members
+        self._parser = etree.XMLParser(recover=True)
+
+    def _normalize(self, xml: str) -> str:
+        """Parse the paragraphs and write them again, as docxtpl does
+        with the whole document.
+        """
+        if not xml:
+            return ''
+        tree = etree.fromstring(f'{self._body_start}{xml}</w:body>',
+                                parser=self._parser)
+        s = etree.tostring(tree, encoding='unicode')
+        return s[s.index('>') + 1:-len('</w:body>')]
+
+    def _render_loop(self, slot: _LoopSlot, items: list,
+                     filters: Dict[str, Callable]) -> str:
+        parts = []
+        for item in items:
+            for n, part in enumerate(slot.body):
+                parts.append(str(escape(filters[part](item))) if n % 2
+                             else part)
+        xml = _unescape_braces(''.join(parts))
+        return self._normalize(DocxTemplate.resolve_listing(None, xml))
+
+    def document_xml(self, service, filters: Dict[str, Callable]) -> bytes:
+        out = [self._pieces[0]]
+        for n, slot in enumerate(self._slots):
+            after = self._pieces[n + 1]
+            if isinstance(slot, _LoopSlot):
+                out.append(self._render_loop(slot, service.items, filters)
+                           .encode())
+            else:
+                value = str(filters[slot.filter](service))
+                if _SPECIAL.search(value):
+                    raise UnsupportedTemplate(
+                        f'{slot.filter} gives {value!r}, which needs docxtpl'
+                    )
+                if not value and slot.empty is not None:
+                    out[-1] = out[-1][:-len(slot.empty[0])] + slot.empty[1]
+                    after = after[len(b'</w:t>'):]
+                else:
+                    out.append(_escape_text(_unescape_braces(value)).encode())
+            out.append(after)
+        return b''.join(out)
+
+    def render(self, service, filters: Dict[str, Callable],
+               out: Union[str, BinaryIO]) -> None:
+        """Write the pew sheet for the service to a path or a file."""
+        document = self.document_xml(service, filters)
+        members = [_member(DOCUMENT, document) if m == DOCUMENT else m
+                   for m in self._members]
+        if isinstance(out, str):
+            with open(out, 'wb') as f:
+                write_zip(f, members)
+        else:
+            write_zip(out, members)
+
+
+def _loop_marker(n: int) -> str:
+    return f'<w:p><w:r><w:t>{MARKER.format(n)}</w:t></w:r></w:p>'
+
+
+def _parse_loop(src: str, tags: List[re.Match],
+                i: int) -> Tuple[_LoopSlot, int]:
+    """The loop opened by tags[i], and the index of its endfor."""
+    body, body_pos = [], tags[i].end()
+    i += 1
+    while i < len(tags) and not _ENDFOR.fullmatch(tags[i].group(0)):
+        m = _ITEM_TEXT.fullmatch(tags[i].group(0))
+        if not m:
+            raise UnsupportedTemplate(
+                f'Unsupported tag {tags[i].group(0)!r} in loop'
+            )
+        body += [src[body_pos:tags[i].start()], m.group(1)]
+        body_pos = tags[i].end()
+        i += 1
+    if i == len(tags):
+        raise UnsupportedTemplate('Unclosed for loop')
+    body.append(src[body_pos:tags[i].start()])
+    if not (body[0].startswith(('<w:p>', '<w:p '))
+            and body[-1].endswith('</w:p>')):
+        raise UnsupportedTemplate('Loop is not over whole paragraphs')
+    return _LoopSlot(body), i
+
+
+def _mark(src: str) -> Tuple[str, List[Union[_TextSlot, _LoopSlot]]]:
+    """Replace each placeholder with a marker, keeping the source of
+    the loop body.
+    """
+    marked, slots = [], []
+    pos = 0
+    tags = list(_TAG.finditer(src))
+    i = 0
+    while i < len(tags):
+        tag = tags[i]
+        marked.append(src[pos:tag.start()])
+        m = _SERVICE_TEXT.fullmatch(tag.group(0))
+        if m:
+            marked.append(MARKER.format(len(slots)))
+            slots.append(_TextSlot(m.group(1)))
+        elif _FOR.fullmatch(tag.group(0)):
+            marked.append(_loop_marker(len(slots)))
+            slot, i = _parse_loop(src, tags, i)
+            slots.append(slot)
+        else:
+            raise UnsupportedTemplate(f'Unsupported tag {tag.group(0)!r}')
+        pos = tags[i].end()
+        i += 1
+    marked.append(src[pos:])
+    return ''.join(marked), slots
+
+
+def _render_marked(template: bytes, marked_src: str,
+                   jinja_env: Optional[jinja2.Environment]
+                   ) -> Tuple[str, List[Union[_Member, str]]]:
+    """Render everything else with docxtpl, returning document.xml and
+    the members of the package, with DOCUMENT in place of document.xml.
+    """
+    marked_tpl = _MarkedTemplate(BytesIO(template), marked_src)
+    marked_tpl.render({}, jinja_env or jinja2.Environment(autoescape=True))
+    f = BytesIO()
+    marked_tpl.save(f)
+
+    document = ''
+    members: List[Union[_Member, str]] = []
+    with zipfile.ZipFile(f) as z:
+        for info in z.infolist():
+            data = z.read(info)
+            if info.filename == DOCUMENT:
+                document = data.decode()
+                members.append(DOCUMENT)
+            else:
+                members.append(_member(info.filename, data))
+    return document, members
+
+
+def _split(document: str,
+           slots: List[Union[_TextSlot, _LoopSlot]]) -> List[bytes]:
+    """Split the rendered document.xml at the markers, noting how each
+    text slot's element is written when its value is empty.
+    """
+    pieces = []
+    for n, slot in enumerate(slots):
+        if isinstance(slot, _LoopSlot):
+            marker = _loop_marker(n)
+        else:
+            marker = MARKER.format(n)
+        if document.count(marker) != 1:
+            raise UnsupportedTemplate(f'Lost the marker for {slot}')
+        before, document = document.split(marker)
+        pieces.append(before.encode())
+        if isinstance(slot, _TextSlot):
+            m = re.search(r'<w:t( [^>]*)?>$', before)
+            if m and document.startswith('</w:t>'):
+                slot.empty = (m.group(0).encode(),
+                              f'<w:t{m.group(1) or ""}/>'.encode())
+    pieces.append(document.encode())
+    return pieces
+
+
+def compile_template(template: bytes,
+                     jinja_env: Optional[jinja2.Environment] = None
+                     ) -> SkeletonTemplate:
+    tpl = DocxTemplate(BytesIO(template))
+    tpl.render_init()
+    src = tpl.patch_xml(tpl.get_xml())
+
+    marked_src, slots = _mark(src)
+    document, members = _render_marked(template, marked_src, jinja_env)
+    pieces = _split(document, slots)
+
+    body_start = re.match(r'<w:body[^>]*>', src)
+    if body_start is None:
+        raise UnsupportedTemplate('No body')
+    return SkeletonTemplate(body_start.group(0), pieces, slots, members)
+
+
+def _dos_time(t: time.struct_time) -> Tuple[int, int]:
+    return ((t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday,
+            t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2)
+
+
+def write_zip(f: BinaryIO, members: List[_Member]) -> None:
+    """Write a zip of members whose data is already deflated."""
+    date, time_ = _dos_time(time.localtime())
+    central = []
+    offset = 0
+    for m in members:
+        name = m.name.encode()
+        header = struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, 20, 0, zipfile.ZIP_DEFLATED, time_,
+            date, m.crc, len(m.data), m.size, len(name), 0
+        )
+        f.write(header + name)
+        f.write(m.data)
+        central.append(struct.pack(
+            '<IHHHHHHIIIHHHHHII', 0x02014b50, 20, 20, 0,
+            zipfile.ZIP_DEFLATED, time_, date, m.crc, len(m.data), m.size,
+            len(name), 0, 0, 0, 0, 0o600 << 16, offset
+        ) + name)
+        offset += len(header) + len(name) + len(m.data)
+    directory = b''.join(central)
+    f.write(directory)
+    f.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, len(members),
+                        len(members), len(directory), offset, 0))
@@ -0,0 +1,339 @@
+"""Sync the feast YAML files with a spreadsheet of the propers.
+
+    python feastsync.py export texts.xlsx   # or texts.csv
+    # ... edit the spreadsheet ...
+    python feastsync.py import texts.xlsx
+
+The spreadsheet has one row per feast, in the order of _list.txt, and
+one column per field. The slug column may be left blank for new
+feasts, in which case the slug is made from the name.
+
+An import validates every row before writing anything, rewrites only
+the YAML files whose contents have actually changed (so hand-formatted
+files are left alone), rewrites _list.txt only if the list of feasts
+has changed, and compiles the feast catalogue from the rows it has
+already parsed.
+"""
+import argparse
+import csv
+import datetime as dt
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+import yaml
+from attr import define, field
+from slugify import slugify  # python-slugify, not slugify
+
+from catalogue import METADATA_FIELDS, PROPER_FIELDS, default_path, \
+    read_slugs, remove_other_catalogues, source_signature, write_catalogue
+from models import DATA_DIR, Feast
+
+COLUMNS = ['slug'] + METADATA_FIELDS + PROPER_FIELDS
+INT_FIELDS = ['month', 'day', 'coeaster', 'coadvent']
+# Unless --jobs is given, rows and files are only processed in parallel
+# if there are at least this many: below that, starting the processes
+# takes longer than it saves (for the 104 feasts, about 135 ms in
+# parallel against 50 ms serially)
+PARALLEL_MIN_ITEMS = 1000
+
+# The C loader, if PyYAML was built with libyaml, is much faster
+YAMLLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+class SyncError(ValueError):
+    """Some rows of the spreadsheet are invalid."""
+
+    def __init__(self, errors: List[str]) -> None:
+        super().__init__('\n'.join(errors))
+        self.errors = errors
+
+
+@define
+class SyncResult:
+    written: List[str] = field(factory=list)
+    unchanged: List[str] = field(factory=list)
+    # YAML files for feasts that are no longer in the list
+    orphaned: List[str] = field(factory=list)
+    list_changed: bool = field(default=False)
+
+
+def _is_blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _parse_value(key: str, value):
+    if key in INT_FIELDS:
+        try:
+            return int(float(value))
+        except ValueError:
+            raise ValueError(f'{key} should be a number, not {value!r}')
+    return value
+
+
+def _parse_fields(row: dict) -> dict:
+    """The non-blank fields of a row, with the numbers parsed."""
+    info = {}
+    for key, value in row.items():
+        if key is None or _is_blank(value):
+            continue
+        key = key.strip()
+        info[key] = _parse_value(key, value)
+    return info
+
+
+def _check_date(info: dict) -> None:
+    if ('month' in info) != ('day' in info):
+        raise ValueError('month and day must be given together')
+    if 'month' in info:
+        try:
+            dt.date(2000, info['month'], info['day'])
+        except ValueError as exc:
+            raise ValueError(f'Invalid date: {exc}')
+
+
+def clean_row(row: dict) -> Tuple[str, dict]:
+    """Turn a spreadsheet row into a slug and the fields of its YAML
+    file, raising ValueError if the row is not a valid feast.
+    """
+    info = _parse_fields(row)
+    slug = info.pop('slug', None)
+    if 'name' not in info:
+        raise ValueError('Missing name')
+    slug = slug or slugify(info['name'])
+    _check_date(info)
+
+    # Check the fields against the schema, and keep them in the usual
+    # order
+    Feast.from_dict(slug, info)
+    info = {k: info[k] for k in METADATA_FIELDS + PROPER_FIELDS if k in info}
+    return slug, info
+
+
+def content_hash(info: dict) -> str:
+    """A hash of a feast's fields, ignoring how its YAML is formatted."""
+    return hashlib.sha256(
+        json.dumps(info, sort_keys=True, ensure_ascii=False).encode()
+    ).hexdigest()
+
+
+def dump_yaml(info: dict) -> str:
+    return yaml.safe_dump(info, sort_keys=False, width=72, indent=4,
+                          default_flow_style=False, allow_unicode=True)
+
+
+def _prepare_row(numbered_row: Tuple[int, dict]):
+    """Clean one row, returning (slug, fields, hash) or an error
+    message.
+    """
+    n, row = numbered_row
+    try:
+        slug, info = clean_row(row)
+    except (ValueError, TypeError) as exc:
+        return f'Row {n}: {exc}'
+    return slug, info, content_hash(info)
+
+
+def _hash_yaml(path: Path) -> Tuple[str, Optional[str]]:
+    try:
+        with open(path) as f:
+            return path.stem, content_hash(yaml.load(f, YAMLLoader))
+    except (OSError, yaml.YAMLError):
+        return path.stem, None
+
+
+def _load_yaml(path: Path) -> dict:
+    with open(path) as f:
+        return yaml.load(f, YAMLLoader)
+
+
+def _map(f: Callable, items: Iterable, jobs: Optional[int]) -> list:
+    """map f over items, in jobs processes. If jobs is None, in one
+    process per CPU if there are at least PARALLEL_MIN_ITEMS items, and
+    otherwise in this process.
+    """
+    items = list(items)
+    if jobs is None and len(items) < PARALLEL_MIN_ITEMS:
+        jobs = 1
+    if jobs == 1 or len(items) < 2:
+        return [f(item) for item in items]
+    with ProcessPoolExecutor(jobs) as executor:
+        return list(executor.map(f, items, chunksize=8))
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    tmp_path.write_text(text)
+    os.replace(tmp_path, path)
+
+
+def read_rows(path: str) -> List[dict]:
+    """Read the rows of a .csv or .xlsx file as dicts."""
+    if path.endswith('.xlsx'):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(h).strip() if h is not None else None
+                      for h in next(rows)]
+            return [dict(zip(header, row)) for row in rows
+                    if not all(_is_blank(v) for v in row)]
+        finally:
+            workbook.close()
+
+    with open(path, newline='', encoding='utf-8') as f:
+        return [row for row in csv.DictReader(f)
+                if not all(_is_blank(v) for v in row.values())]
+
+
+def write_rows(path: str, rows: List[dict]) -> None:
+    """Write rows to a .csv or .xlsx file, with the columns COLUMNS."""
+    if path.endswith('.xlsx'):
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Feasts')
+        sheet.append(COLUMNS)
+        for row in rows:
+            sheet.append([row.get(c) for c in COLUMNS])
+        workbook.save(path)
+        return
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _compile(prepared: list, feast_dir: Path,
+             catalogue_path: Optional[str]) -> None:
+    """Compile the catalogue from the prepared rows. One compiled to the
+    default path replaces the other catalogues in the cache directory.
+    """
+    signature = source_signature(feast_dir)
+    path = catalogue_path or default_path(feast_dir, signature)
+    write_catalogue(((slug, info) for slug, info, _ in prepared), signature,
+                    path)
+    if catalogue_path is None:
+        remove_other_catalogues(path)
+
+
+def import_rows(rows: List[dict], feast_dir: Path = DATA_DIR,
+                catalogue_path: Optional[str] = None,
+                jobs: Optional[int] = None, prune: bool = False,
+                dry_run: bool = False) -> SyncResult:
+    """Bring the YAML files in feast_dir into line with rows. Raises
+    SyncError, without writing anything, if any row is invalid.
+    """
+    feast_dir = Path(feast_dir)
+    prepared = _map(_prepare_row, enumerate(rows, start=2), jobs)
+    errors = [p for p in prepared if isinstance(p, str)]
+    slugs = [p[0] for p in prepared if not isinstance(p, str)]
+    duplicates = sorted({s for s in slugs if slugs.count(s) > 1})
+    if duplicates:
+        errors.append(f'Duplicate slugs: {", ".join(duplicates)}')
+    if errors:
+        raise SyncError(errors)
+
+    existing = dict(_map(_hash_yaml, feast_dir.glob('*.yaml'), jobs))
+    list_path = feast_dir / '_list.txt'
+    old_slugs = read_slugs(feast_dir) if list_path.exists() else []
+
+    result = SyncResult()
+    result.list_changed = slugs != old_slugs
+    result.orphaned = sorted(set(existing) - set(slugs))
+    for slug, info, digest in prepared:
+        if existing.get(slug) == digest:
+            result.unchanged.append(slug)
+            continue
+        result.written.append(slug)
+        if not dry_run:
+            _write_atomic((feast_dir / slug).with_suffix('.yaml'),
+                          dump_yaml(info))
+
+    if dry_run:
+        return result
+
+    if result.list_changed:
+        _write_atomic(list_path, ''.join(f'{slug}\n' for slug in slugs))
+    if prune:
+        for slug in result.orphaned:
+            (feast_dir / slug).with_suffix('.yaml').unlink()
+
+    _compile(prepared, feast_dir, catalogue_path)
+    return result
+
+
+def export_rows(feast_dir: Path = DATA_DIR,
+                jobs: Optional[int] = None) -> List[dict]:
+    """The feasts in feast_dir, as spreadsheet rows."""
+    feast_dir = Path(feast_dir)
+    slugs = read_slugs(feast_dir)
+    infos = _map(_load_yaml,
+                 [(feast_dir / slug).with_suffix('.yaml') for slug in slugs],
+                 jobs)
+    return [{'slug': slug, **info} for slug, info in zip(slugs, infos)]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--feast-dir', default=str(DATA_DIR),
+                        help='Directory of feast YAML files')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Number of processes (default: one per CPU '
+                             f'for {PARALLEL_MIN_ITEMS} or more feasts, '
+                             'otherwise one)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser(
+        'import', help='Update the YAML files from a .csv or .xlsx file'
+    )
+    import_parser.add_argument('path')
+    import_parser.add_argument('--dry-run', action='store_true',
+                               help='Report changes without writing them')
+    import_parser.add_argument('--prune', action='store_true',
+                               help='Delete YAML files of feasts that are '
+                                    'no longer listed')
+
+    export_parser = subparsers.add_parser(
+        'export', help='Write the feasts to a .csv or .xlsx file'
+    )
+    export_parser.add_argument('path')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        rows = export_rows(Path(args.feast_dir), args.jobs)
+        write_rows(args.path, rows)
+        print(f'Exported {len(rows)} feasts to {args.path}')
+        return 0
+
+    try:
+        result = import_rows(read_rows(args.path), Path(args.feast_dir),
+                             jobs=args.jobs, prune=args.prune,
+                             dry_run=args.dry_run)
+    except SyncError as exc:
+        for error in exc.errors:
+            print(error, file=sys.stderr)
+        return 1
+
+    verb = 'Would update' if args.dry_run else 'Updated'
+    print(f'{verb} {len(result.written)} feasts '
+          f'({len(result.unchanged)} unchanged)')
+    for slug in result.written:
+        print(f'  {slug}')
+    if result.list_changed:
+        print(f'{verb} _list.txt')
+    if result.orphaned:
+        verb = 'Deleted' if args.prune and not args.dry_run else 'Not listed'
+        print(f'{verb}: {", ".join(result.orphaned)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
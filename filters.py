@@ -5,6 +5,7 @@ from functools import wraps
 from docxtpl import RichText
 
 from models import Service, ServiceItem
+from tracing import span
 
 
 def nullsafe(f):
@@ -16,7 +17,8 @@ def nullsafe(f):
 
 
 def as_richtext(item: ServiceItem) -> RichText:
-    return item.as_richtext()
+    with span('as_richtext', title=item.title):
+        return item.as_richtext()
 
 
 def service_supertitle(service: Service) -> str:
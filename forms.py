@@ -1,3 +1,6 @@
+from datetime import date
+from functools import lru_cache
+
 from flask import request
 from flask_wtf import FlaskForm, Form
 from wtforms import DateField, HiddenField, SelectField, SelectMultipleField, \
@@ -9,13 +12,50 @@ from wtforms import (
 from wtforms.validators import DataRequired
 from wtforms.widgets import TextArea
 
+from catalogue import data_version
 from models import Feast, Music
+from utils import keyed_cache
+
+# Choices are computed when a form is first instantiated rather than
+# when this module is imported, so that importing the app stays cheap.
+
+
+@lru_cache()
+def hymns():
+    return [('', 'None')] + [(h.ref, f'{h.ref} - {h.title}') for h in
+                             Music.neh_hymns()]
+
+
+@lru_cache()
+def translations():
+    return [('', 'None')] + [(h.translation, f'{h.translation}') for h in
+                             Music.neh_hymns()]
 
-hymns = [('', 'None')] + [(h.ref, f'{h.ref} - {h.title}') for h in
-                          Music.neh_hymns()]
 
-translations = [('', 'None')] + [(h.translation, f'{h.translation}') for h in
-                          Music.neh_hymns()]
+@keyed_cache(lambda: (date.today(), data_version()))
+def feast_choices():
+    """Feasts in the order in which they next occur, recomputed each
+    day and whenever the feasts are reloaded.
+    """
+    return [(feast.slug, feast.name) for feast in Feast.upcoming()]
+
+
+@keyed_cache(lambda: (date.today(), data_version()))
+def feast_dates():
+    """The next date of each feast, by slug, for the service form to
+    fill in the date when a feast is chosen.
+    """
+    dates = {}
+    for feast in Feast.all():
+        d = feast.get_next_date()
+        if d is not None:
+            dates[feast.slug] = d.isoformat()
+    return dates
+
+
+def secondary_feast_choices():
+    return [('', '')] + feast_choices()
+
 
 class AnthemForm(Form):
     title = StringField('Anthem')
@@ -25,15 +65,13 @@ class AnthemForm(Form):
 
 class PewSheetForm(FlaskForm):
     title = HiddenField('Title')
-    feasts = Feast.upcoming()
-    feast_choices = [(feast.slug, feast.name) for feast in feasts]
     primary_feast = SelectField(
         'Primary Feast',
         choices=feast_choices,
     )
     secondary_feasts = SelectMultipleField(
         'Secondary Feasts',
-        choices=[('', '')] + feast_choices,
+        choices=secondary_feast_choices,
     )
     date = DateField('Date', validators=[DataRequired()])
     time = TimeField('Time', validators=[DataRequired()])
@@ -46,6 +84,10 @@ class PewSheetForm(FlaskForm):
 
     anthem_group = FormField(AnthemForm)
 
+    @property
+    def feast_dates(self):
+        return feast_dates()
+
     class Meta:
         csrf = False
 
@@ -0,0 +1,146 @@
+"""Writing feasts as an iCalendar (RFC 5545) feed, and serving it.
+
+A feed is streamed the first time it is asked for and cached after
+that. Its ETag is worked out from what the feed is made of before it
+is generated, so that calendar clients polling for changes get a 304
+even from the first, streamed response.
+"""
+import datetime as dt
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, Iterator, Optional
+
+from attr import define, field
+from flask import Response, request, stream_with_context
+
+from metrics import record_cache
+
+PRODID = '-//PyPew//Feast calendar//EN'
+MIMETYPE = 'text/calendar'
+MAX_AGE = 300
+
+
+@define
+class Event:
+    """An all-day event."""
+    uid: str = field()
+    date: dt.date = field()
+    summary: str = field()
+    url: Optional[str] = field(default=None)
+
+
+def escape(text: str) -> str:
+    return (text.replace('\\', '\\\\').replace(';', r'\;')
+            .replace(',', r'\,').replace('\n', r'\n'))
+
+
+def fold(line: str) -> str:
+    """Fold a content line into lines of at most 75 octets, ending with
+    CRLF.
+    """
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+
+    parts = []
+    start, limit = 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Don't split a multi-byte character
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode())
+        start, limit = end, 74  # continuation lines start with a space
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def event_lines(event: Event) -> Iterator[str]:
+    day = f'{event.date:%Y%m%d}'
+    yield 'BEGIN:VEVENT'
+    yield f'UID:{event.uid}'
+    # Derived from the event rather than the time of generation, so
+    # that the same feasts always give the same feed
+    yield f'DTSTAMP:{day}T000000Z'
+    yield f'DTSTART;VALUE=DATE:{day}'
+    yield f'DTEND;VALUE=DATE:{event.date + dt.timedelta(days=1):%Y%m%d}'
+    yield f'SUMMARY:{escape(event.summary)}'
+    if event.url:
+        yield f'URL:{event.url}'
+    yield 'TRANSP:TRANSPARENT'
+    yield 'END:VEVENT'
+
+
+def calendar(events: Iterable[Event], name: str = 'Feasts') -> Iterator[str]:
+    """The calendar, in chunks of one event each."""
+    yield ''.join(fold(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{escape(name)}',
+    ])
+    for event in events:
+        yield ''.join(fold(line) for line in event_lines(event))
+    yield fold('END:VCALENDAR')
+
+
+class FeedCache:
+    """The most recently used feeds, by key."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._feeds: 'OrderedDict[Hashable, bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            body = self._feeds.get(key)
+            if body is not None:
+                self._feeds.move_to_end(key)
+        record_cache('ics', body is not None)
+        return body
+
+    def put(self, key: Hashable, body: bytes) -> None:
+        with self._lock:
+            self._feeds[key] = body
+            while len(self._feeds) > self.maxsize:
+                self._feeds.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._feeds.clear()
+
+
+def make_etag(key: Hashable) -> str:
+    """An ETag for the feed with the given key, which must determine
+    the feed's contents.
+    """
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+def feed_response(cache: FeedCache, key: Hashable,
+                  events: Callable[[], Iterable[Event]]) -> Response:
+    """Serve the feed of the events, which key determines: a 304 if
+    the client already has it, the cached feed, or else the feed
+    streamed as it is generated and cached at the end.
+    """
+    body = cache.get(key)
+    if body is None:
+        def generate():
+            chunks = []
+            for chunk in calendar(events()):
+                chunk = chunk.encode()
+                chunks.append(chunk)
+                yield chunk
+            cache.put(key, b''.join(chunks))
+
+        response = Response(stream_with_context(generate()),
+                            mimetype=MIMETYPE)
+    else:
+        response = Response(body, mimetype=MIMETYPE)
+
+    response.set_etag(make_etag(key))
+    response.cache_control.public = True
+    response.cache_control.max_age = MAX_AGE
+    return response.make_conditional(request)
@@ -0,0 +1,355 @@
+"""How much memory each part of PyPew keeps hold of.
+
+Memory is traced with tracemalloc, and each block that is still
+allocated is put down to the subsystem whose code allocated it: the
+innermost frame of its traceback that lies in one of the modules or
+functions listed in _subsystems(). So the feasts loaded while rendering
+a feast's docx file count towards the feast catalogue, and the docx
+file itself towards the feast docx cache. Whatever matches nothing is 'other'.
+
+From the command line, ``python -m memreport`` traces a fresh app while
+it warms its caches (and, with --load, while it serves the load test),
+and reports what each stage added. Snapshots saved with --save can be
+compared later with ``python -m memreport diff before.snap
+after.snap``.
+
+In a running app, start tracing with PYPEW_TRACEMALLOC (the number of
+frames to keep, e.g. 50; tracing slows the app down). If an admin
+secret is set in PYPEW_ADMIN_SECRET, /debug/memory then reports on the
+worker that serves it, to callers with an admin token from ``python -m
+memreport token`` in the X-PyPew-Admin header. POST to it to take a
+baseline snapshot, against which later reports show the changes, to
+find out what grows in a long-running worker.
+"""
+import argparse
+import gc
+import inspect
+import os
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, \
+    Tuple
+
+from itsdangerous import BadSignature, TimestampSigner
+
+DEFAULT_FRAMES = 50
+ADMIN_HEADER = 'X-PyPew-Admin'
+ADMIN_SECRET_ENV = 'PYPEW_ADMIN_SECRET'
+# Secrets that anyone could guess: the empty one, and the default
+# SECRET_KEY
+DEFAULT_SECRETS = ('', 'password')
+SALT = 'pypew-admin'
+OTHER = 'other'
+
+
+class Usage(NamedTuple):
+    size: int  # bytes
+    count: int  # blocks
+
+
+def _subsystems() -> List[Tuple[str, list]]:
+    """(subsystem, the modules and functions whose allocations count
+    towards it), most specific first. Imported here, so that the
+    command line can start tracing before any of them is imported.
+    """
+    import jinja2
+
+    import catalogue
+    import docx_skeleton
+    import forms
+    import ical
+    import metrics
+    import models
+    import precedence
+    import tracing
+    import utils
+    from views import feast_views, pew_sheet_views
+
+    return [
+        ('hymn dataframe', [utils.get_neh_df]),
+        ('music lists', [models._neh_hymns, models._neh_hymns_by_ref,
+                         forms.hymns, forms.translations]),
+        ('feast catalogue', [catalogue, models._load_feasts,
+                             models.Feast.propers.fget]),
+        ('html templates', [jinja2.Environment._load_template]),
+        ('docx template', [docx_skeleton, models._pew_sheet_template,
+                           models._pew_sheet_skeleton]),
+        ('calendar cache', [precedence._resolve_year, forms.feast_choices,
+                            forms.feast_dates]),
+        ('richtext cache', [models._richtext_fragments, models.prerendered]),
+        ('feast docx cache', [models._feast_docx]),
+        ('pew sheet docx cache', [pew_sheet_views.pew_sheet_docx_view]),
+        ('feast json cache', [feast_views.feast_index_json,
+                              feast_views._feast_detail_json]),
+        ('ics cache', [ical.feed_response]),
+        ('trace buffer', [tracing]),
+        ('metrics', [metrics]),
+        # Including the baseline snapshot
+        ('tracemalloc', [tracemalloc]),
+    ]
+
+
+class _Classifier:
+    """Finds the subsystem of a traceback."""
+
+    def __init__(self) -> None:
+        # filename -> [(first line, last line, subsystem)]
+        self._ranges: Dict[str, List[Tuple[int, int, str]]] = {}
+        # (filename, lineno) -> subsystem
+        self._frames: Dict[Tuple[str, int], Optional[str]] = {}
+        for name, members in _subsystems():
+            for member in members:
+                if inspect.ismodule(member):
+                    self._add(member.__file__, 0, float('inf'), name)
+                    continue
+                code = inspect.unwrap(member).__code__
+                last = max(line for _, _, line in code.co_lines() if line)
+                self._add(code.co_filename, code.co_firstlineno, last, name)
+
+    def _add(self, filename: str, first, last, name: str) -> None:
+        self._ranges.setdefault(os.path.normcase(filename), []).append(
+            (first, last, name)
+        )
+
+    def _frame(self, frame: Tuple[str, int]) -> Optional[str]:
+        name = self._frames.get(frame, '')
+        if name == '':
+            filename, lineno = frame
+            # The narrowest range, e.g. a function rather than its module
+            matches = [(last - first, name) for first, last, name
+                       in self._ranges.get(os.path.normcase(filename), [])
+                       if first <= lineno <= last]
+            name = self._frames[frame] = min(matches)[1] if matches else None
+        return name
+
+    def __call__(self, traceback: tracemalloc.Traceback) -> str:
+        # The raw (filename, lineno) pairs, oldest first: much quicker
+        # than making a Frame of each
+        for frame in reversed(traceback._frames):
+            name = self._frame(frame)
+            if name is not None:
+                return name
+        return OTHER
+
+
+_classifier: Optional[_Classifier] = None
+_baseline: Optional[Dict[str, Usage]] = None
+
+
+def _classify(traceback: tracemalloc.Traceback) -> str:
+    global _classifier
+    if _classifier is None:
+        _classifier = _Classifier()
+    return _classifier(traceback)
+
+
+def start(frames: int = DEFAULT_FRAMES) -> None:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def start_from_env() -> None:
+    """Start tracing if PYPEW_TRACEMALLOC is set."""
+    frames = os.environ.get('PYPEW_TRACEMALLOC')
+    if frames:
+        start(int(frames) if frames.isdigit() else DEFAULT_FRAMES)
+
+
+def take_snapshot() -> tracemalloc.Snapshot:
+    # Only count what is really still in use
+    gc.collect()
+    return tracemalloc.take_snapshot()
+
+
+def by_subsystem(snapshot: tracemalloc.Snapshot) -> Dict[str, Usage]:
+    """The memory still allocated by each subsystem, largest first."""
+    totals: Dict[str, List[int]] = {}
+    for stat in snapshot.statistics('traceback'):
+        entry = totals.setdefault(_classify(stat.traceback), [0, 0])
+        entry[0] += stat.size
+        entry[1] += stat.count
+    return {name: Usage(*entry) for name, entry
+            in sorted(totals.items(), key=lambda kv: -kv[1][0])}
+
+
+def diff(before: Dict[str, Usage],
+         after: Dict[str, Usage]) -> Dict[str, Usage]:
+    """The change in each subsystem's usage, largest first."""
+    changes = {}
+    for name in set(before) | set(after):
+        b, a = before.get(name, Usage(0, 0)), after.get(name, Usage(0, 0))
+        changes[name] = Usage(a.size - b.size, a.count - b.count)
+    return dict(sorted(changes.items(), key=lambda kv: -abs(kv[1].size)))
+
+
+def cache_sizes() -> Dict[str, int]:
+    """The number of entries in each cache reported at /metrics."""
+    import metrics
+
+    return {name: f.cache_info().currsize
+            for name, f in sorted(metrics.registered_caches().items())}
+
+
+def set_baseline() -> Dict[str, Usage]:
+    """Remember the usage now to report changes against. Needs tracing
+    to have been started.
+    """
+    global _baseline
+    _baseline = by_subsystem(take_snapshot())
+    return _baseline
+
+
+def report() -> dict:
+    """The memory used by each subsystem now, and the changes since the
+    baseline if there is one. Needs tracing to have been started.
+    """
+    usage = by_subsystem(take_snapshot())
+    out = {
+        'traced': sum(u.size for u in usage.values()),
+        'peak': tracemalloc.get_traced_memory()[1],
+        'subsystems': {name: u._asdict() for name, u in usage.items()},
+        'cache_entries': cache_sizes(),
+    }
+    baseline = _baseline
+    if baseline is not None:
+        out['since_baseline'] = {
+            name: u._asdict()
+            for name, u in diff(baseline, usage).items()
+        }
+    return out
+
+
+def _signer(secret_key: str) -> TimestampSigner:
+    return TimestampSigner(secret_key, salt=SALT)
+
+
+def admin_secret(secret: Optional[str], secret_key: str) -> Optional[str]:
+    """The admin secret, or None if it is not set, is a default, or is
+    the same as the app's secret key.
+    """
+    if not secret or secret in DEFAULT_SECRETS or secret == secret_key:
+        return None
+    return secret
+
+
+def make_token(secret_key: str) -> str:
+    return _signer(secret_key).sign('admin').decode()
+
+
+def is_admin(token: Optional[str], secret_key: str,
+             max_age: int = 3600) -> bool:
+    if not token:
+        return False
+    try:
+        _signer(secret_key).unsign(token, max_age=max_age)
+        return True
+    except BadSignature:
+        return False
+
+
+def _kib(size: int) -> str:
+    return f'{size / 1024:,.1f} KiB'
+
+
+def format_usage(usage: Dict[str, Usage], signed: bool = False) -> str:
+    width = max([len(name) for name in usage] + [len('subsystem')])
+    lines = [f'{"subsystem":<{width}}  {"size":>14}  {"blocks":>9}']
+    for name, u in usage.items():
+        size = _kib(u.size)
+        if signed and u.size >= 0:
+            size = '+' + size
+        lines.append(f'{name:<{width}}  {size:>14}  {u.count:>9}')
+    total = _kib(sum(u.size for u in usage.values()))
+    lines.append(f'{"total":<{width}}  {total:>14}')
+    return '\n'.join(lines)
+
+
+def _report_command(args) -> None:
+    # Trace everything from here on, including the imports
+    start(args.frames)
+    stages: List[Tuple[str, Callable[[], None]]] = []
+
+    from pypew import create_app
+    import warmup
+
+    app = create_app()
+    snapshots = [('start', take_snapshot())]
+    stages.append(('warm', lambda: warmup.warm(app)))
+    if args.load:
+        from tempfile import TemporaryDirectory
+
+        from benchmarks import loadtest
+
+        def load():
+            with TemporaryDirectory() as tempdir:
+                loadtest.run(loadtest.in_process_clients(tempdir),
+                             users=args.users, duration=args.load)
+
+        stages.append(('load', load))
+
+    for name, stage in stages:
+        stage()
+        snapshots.append((name, take_snapshot()))
+
+    usages = [(name, by_subsystem(s)) for name, s in snapshots]
+    print(f'Memory in use after {usages[-1][0]}:')
+    print(format_usage(usages[-1][1]))
+    for (_, before), (name, after) in zip(usages, usages[1:]):
+        print(f'\nChanges during {name}:')
+        print(format_usage(diff(before, after), signed=True))
+    print('\nCache entries:')
+    for name, n in cache_sizes().items():
+        print(f'  {name}: {n}')
+
+    if args.save:
+        snapshots[-1][1].dump(args.save)
+        print(f'\nSaved the snapshot to {args.save}')
+
+
+def _diff_command(args) -> None:
+    before = by_subsystem(tracemalloc.Snapshot.load(args.before))
+    after = by_subsystem(tracemalloc.Snapshot.load(args.after))
+    print(format_usage(diff(before, after), signed=True))
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    subparsers = parser.add_subparsers(dest='command')
+    report_parser = subparsers.add_parser(
+        'report', help='Trace a fresh app as it warms up (the default)'
+    )
+    report_parser.add_argument('--frames', type=int, default=DEFAULT_FRAMES,
+                               help='Frames of each traceback to keep')
+    report_parser.add_argument('--load', type=float, default=0,
+                               help='Then run the load test for this many '
+                                    'seconds')
+    report_parser.add_argument('--users', type=int, default=4,
+                               help='Users for the load test')
+    report_parser.add_argument('--save', help='Save the last snapshot here')
+    diff_parser = subparsers.add_parser(
+        'diff', help='Compare two saved snapshots'
+    )
+    diff_parser.add_argument('before')
+    diff_parser.add_argument('after')
+    subparsers.add_parser('token', help='Print an admin token for '
+                                        '/debug/memory')
+    args = parser.parse_args(argv)
+
+    if args.command == 'diff':
+        _diff_command(args)
+    elif args.command == 'token':
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        secret = admin_secret(os.environ.get(ADMIN_SECRET_ENV),
+                              os.environ.get('SECRET_KEY', 'password'))
+        if secret is None:
+            parser.error(f'Set {ADMIN_SECRET_ENV} to a secret of its own')
+        print(make_token(secret))
+    else:
+        if args.command is None:
+            args = report_parser.parse_args([])
+        _report_command(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""Request and cache metrics in the Prometheus text format.
+
+The metrics are kept in memory in each process, so with several
+workers each scrape of /metrics reports on the worker that served it.
+Recording a sample only takes a lock and a few additions, so this is
+cheap enough to leave on in production.
+"""
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from flask import Flask, g, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str],
+                   extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return (str(value).replace('\\', r'\\').replace('\n', r'\n')
+            .replace('"', r'\"'))
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = ''
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(name suffix, formatted labels, value) for each sample."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} {self.type}']
+        for suffix, labels, value in self.samples():
+            lines.append(f'{self.name}{suffix}{labels} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = (
+                self._values.get(labelvalues, 0) + amount
+            )
+
+    def set_total(self, *labelvalues: str, value: float) -> None:
+        """Overwrite the total, for counts that are kept elsewhere."""
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def get(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def samples(self):
+        return [('_total', _format_labels(self.labelnames, k), v)
+                for k, v in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = (
+                self._values.get(labelvalues, 0) + amount
+            )
+
+    def dec(self, *labelvalues: str, amount: float = 1) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, *labelvalues: str, value: float) -> None:
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def get(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def samples(self):
+        return [('', _format_labels(self.labelnames, k), v)
+                for k, v in sorted(self._values.items())]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket (non-cumulative), sum, count]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, *labelvalues: str, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labelvalues)
+            if entry is None:
+                entry = self._values[labelvalues] = [
+                    [0] * (len(self.buckets) + 1), 0.0, 0
+                ]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, *labelvalues: str) -> int:
+        entry = self._values.get(labelvalues)
+        return entry[2] if entry is not None else 0
+
+    def samples(self):
+        out = []
+        for k, (bucket_counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float('inf')), bucket_counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                out.append(('_bucket',
+                            _format_labels(self.labelnames, k, le),
+                            cumulative))
+            out.append(('_sum', _format_labels(self.labelnames, k), total))
+            out.append(('_count', _format_labels(self.labelnames, k), count))
+        return out
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            collector()
+        return '\n'.join(m.render() for m in self.metrics) + '\n'
+
+
+registry = Registry()
+
+request_duration = registry.register(Histogram(
+    'pypew_request_duration_seconds',
+    'Time taken to handle each request, by endpoint.',
+    ['endpoint', 'method'],
+))
+requests_total = registry.register(Counter(
+    'pypew_requests',
+    'Requests handled, by endpoint and status code.',
+    ['endpoint', 'method', 'status'],
+))
+requests_in_progress = registry.register(Gauge(
+    'pypew_requests_in_progress',
+    'Requests currently being handled.',
+))
+response_size = registry.register(Histogram(
+    'pypew_response_size_bytes',
+    'Size of each response body, by endpoint.',
+    ['endpoint'],
+    buckets=SIZE_BUCKETS,
+))
+cache_hits = registry.register(Counter(
+    'pypew_cache_hits',
+    'Cache hits, by cache.',
+    ['cache'],
+))
+cache_misses = registry.register(Counter(
+    'pypew_cache_misses',
+    'Cache misses, by cache.',
+    ['cache'],
+))
+renders_in_progress = registry.register(Gauge(
+    'pypew_renders_in_progress',
+    'Docx files currently being rendered.',
+))
+render_queue_depth = registry.register(Gauge(
+    'pypew_render_queue_depth',
+    'Renders waiting for a free render slot.',
+))
+render_wait = registry.register(Histogram(
+    'pypew_render_wait_seconds',
+    'Time that each render waited for a render slot.',
+))
+renders_rejected = registry.register(Counter(
+    'pypew_renders_rejected',
+    'Renders refused because too many were running, by reason.',
+    ['reason'],
+))
+
+# functools.lru_cache keeps its own statistics, so rather than wrapping
+# every call, read them when the metrics are scraped.
+_lru_caches: Dict[str, Callable] = {}
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Record a hit or miss for one of our own caches."""
+    (cache_hits if hit else cache_misses).inc(cache)
+
+
+def register_lru_cache(cache: str, cached_function: Callable) -> None:
+    """Report the hits and misses of a functools.lru_cache-wrapped
+    function under the given cache name.
+    """
+    _lru_caches[cache] = cached_function
+
+
+def registered_caches() -> Dict[str, Callable]:
+    """The caches registered with register_lru_cache, by name."""
+    return dict(_lru_caches)
+
+
+def _collect_lru_caches() -> None:
+    for cache, f in _lru_caches.items():
+        info = f.cache_info()
+        cache_hits.set_total(cache, value=info.hits)
+        cache_misses.set_total(cache, value=info.misses)
+
+
+registry.collectors.append(_collect_lru_caches)
+
+
+def _endpoint() -> str:
+    return request.endpoint or 'none'
+
+
+def _before_request() -> None:
+    g.metrics_start = time.perf_counter()
+    g.metrics_in_progress = True
+    requests_in_progress.inc()
+
+
+def _after_request(response):
+    start: Optional[float] = g.pop('metrics_start', None)
+    if start is not None:
+        endpoint, method = _endpoint(), request.method
+        request_duration.observe(endpoint, method,
+                                 value=time.perf_counter() - start)
+        requests_total.inc(endpoint, method, str(response.status_code))
+        size = response.content_length
+        if size is not None:
+            response_size.observe(endpoint, value=size)
+    return response
+
+
+def _teardown_request(exc) -> None:
+    if g.pop('metrics_in_progress', False):
+        requests_in_progress.dec()
+
+
+def init_app(app: Flask) -> None:
+    """Register the request hooks. Call this before registering any
+    other before_request functions, because a before_request function
+    that returns a response stops the later ones from running.
+    """
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
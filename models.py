@@ -1,30 +1,39 @@
 import datetime as dt
 import os
 import re
+import threading
 import typing
 from abc import ABC, abstractmethod
-from functools import lru_cache
+from functools import lru_cache, partial, wraps
+from io import BytesIO
 from pathlib import Path
-from typing import List, Optional
+from tempfile import TemporaryDirectory
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
+import cattrs
 import jinja2
-import yaml
-from attr import define, field
+from attr import define, field, setters
 from dateutil.easter import easter
 from docx import Document
 from docxtpl import DocxTemplate, RichText
 
-from models_base import get
+import dateexpr
+import render_limit
+from catalogue import METADATA_FIELDS, PROPER_FIELDS, FeastWatcher, \
+    bump_data_version, data_version, load_catalogue, read_yaml, split_fields
+from docx_skeleton import SkeletonTemplate, UnsupportedTemplate, \
+    compile_template
+from metrics import record_cache, register_lru_cache
+from models_base import NotFoundError, get
+from tracing import span
 
 if typing.TYPE_CHECKING:
     from forms import PewSheetForm, AnthemForm
 
-from utils import get_neh_df, advent, closest_sunday_to, NoPandasError, logger
+from utils import get_neh_df, advent, NoPandasError, \
+    keyed_cache, logger, single_flight_cache
 
-feasts_fields = ['name', 'month', 'day', 'coeaster', 'coadvent',
-                 'introit', 'collect', 'epistle_ref', 'epistle',
-                 'gat', 'gradual', 'alleluia', 'tract', 'gospel_ref',
-                 'gospel', 'offertory', 'communion']
+feasts_fields = METADATA_FIELDS + PROPER_FIELDS
 DATA_DIR = Path(os.path.dirname(__file__)) / 'data' / 'feasts'
 PEW_SHEET_TEMPLATE = os.path.join('templates', 'pewSheetTemplate.docx')
 
@@ -36,17 +45,104 @@ def _none2datemax(d: Optional[dt.date]) -> dt.date:
     return d
 
 
+_easter = lru_cache(maxsize=None)(easter)
+_advent = lru_cache(maxsize=None)(advent)
+
+
+@define
+class DateRule:
+    """When a feast falls, compiled into a function of the year.
+
+    A feast is on a fixed day (month and day), a number of days from
+    Easter (coeaster) or Advent Sunday (coadvent), or on the date given
+    by a dateexpr expression, e.g. 'Sunday nearest 11 November'.
+    """
+    month: Optional[int] = field(default=None)
+    day: Optional[int] = field(default=None)
+    coeaster: Optional[int] = field(default=None)
+    coadvent: Optional[int] = field(default=None)
+    dateexpr: Optional[str] = field(default=None)
+    _evaluate: Callable[[int], Optional[dt.date]] = field(
+        init=False, eq=False, repr=False
+    )
+
+    def __attrs_post_init__(self):
+        self._evaluate = self._compile()
+
+    def _compile(self) -> Callable[[int], Optional[dt.date]]:
+        given = [k for k in ('month', 'coeaster', 'coadvent', 'dateexpr')
+                 if getattr(self, k) is not None]
+        if len(given) > 1:
+            raise ValueError(f'Only one of {", ".join(given)} may be given')
+
+        if self.month is not None and self.day is not None:
+            month, day = self.month, self.day
+            return lambda year: dt.date(year, month, day)
+
+        if self.coeaster is not None:
+            delta = dt.timedelta(days=self.coeaster)
+            return lambda year: _easter(year) + delta
+
+        if self.coadvent is not None:
+            delta = dt.timedelta(days=self.coadvent)
+            return lambda year: _advent(year) + delta
+
+        if self.dateexpr is not None:
+            return dateexpr.compile_expr(self.dateexpr)
+
+        return lambda year: None
+
+    def __call__(self, year: int) -> Optional[dt.date]:
+        return self._evaluate(year)
+
+    def dates(self, years: Iterable[int]) -> List[Optional[dt.date]]:
+        """The date in each of the given years."""
+        evaluate = self._evaluate
+        return [evaluate(year) for year in years]
+
+
+@define
+class Propers:
+    """The proper texts of a feast."""
+    introit: Optional[str] = field(default=None)
+    collect: Optional[str] = field(default=None)
+    epistle_ref: Optional[str] = field(default=None)
+    epistle: Optional[str] = field(default=None)
+    gat: str = field(default='')
+    gradual: Optional[str] = field(default=None)
+    alleluia: Optional[str] = field(default=None)
+    tract: Optional[str] = field(default=None)
+    gospel_ref: Optional[str] = field(default=None)
+    gospel: Optional[str] = field(default=None)
+    offertory: Optional[str] = field(default=None)
+    communion: Optional[str] = field(default=None)
+
+
+def _proper(name: str) -> property:
+    def getter(self):
+        return getattr(self.propers, name)
+
+    getter.__name__ = name
+    return property(getter)
+
+
 @define
 class Feast:
+    """A feast's name and date rule. Its proper texts are loaded from
+    the catalogue when first needed.
+    """
     @classmethod
     def from_yaml(cls, slug):
-        return _feast_from_yaml(slug)
+        return cls.from_dict(slug, read_yaml(DATA_DIR, slug))
+
+    @classmethod
+    def from_dict(cls, slug: str, info: dict) -> 'Feast':
+        metadata, propers = split_fields(info)
+        return cls(slug=slug, **metadata, propers=Propers(**propers))
 
     @classmethod
     def all(cls):
-        with open(DATA_DIR / '_list.txt') as f:
-            slugs = [x.strip() for x in f]
-            return [cls.from_yaml(slug) for slug in slugs]
+        return list(_feasts())
 
     @classmethod
     def upcoming(cls, date: Optional[dt.date] = None) -> List['Feast']:
@@ -66,15 +162,17 @@ class Feast:
 
     @classmethod
     def get(cls, **kwargs):
-        return get(cls.all(), **kwargs)
+        if kwargs.keys() == {'slug'}:
+            try:
+                return _feasts_by_slug()[kwargs['slug']]
+            except KeyError:
+                raise NotFoundError(kwargs)
+        return get(_feasts(), **kwargs)
 
     slug: str = field()
     name: str = field()
 
     # Specified for the fixed holy days, None for the movable feasts.
-    # TODO - what about Remembrance Sunday and Advent Sunday? Not fixed
-    #  days but also not comoving with Easter. As a hack go with 11 Nov
-    #  and 30 Nov respectively but the exact dates are
     month: Optional[int] = field(default=None)
     day: Optional[int] = field(default=None)
 
@@ -82,39 +180,59 @@ class Feast:
     coeaster: Optional[int] = field(default=None)
     coadvent: Optional[int] = field(default=None)
 
-    introit: Optional[str] = field(default=None)
-    collect: Optional[str] = field(default=None)
-    epistle_ref: Optional[str] = field(default=None)
-    epistle: Optional[str] = field(default=None)
-    gat: str = field(default='')
-    gradual: Optional[str] = field(default=None)
-    alleluia: Optional[str] = field(default=None)
-    tract: Optional[str] = field(default=None)
-    gospel_ref: Optional[str] = field(default=None)
-    gospel: Optional[str] = field(default=None)
-    offertory: Optional[str] = field(default=None)
-    communion: Optional[str] = field(default=None)
-
-    def get_date(self, year=None) -> Optional[dt.date]:
-        if year is None:
-            year = dt.datetime.now().year
+    # For anything else, e.g. 'Sunday nearest 11 November'
+    dateexpr: Optional[str] = field(default=None)
 
-        if self.month is not None and self.day is not None:
-            # TODO Check this definition
-            if self.name == 'Remembrance Sunday':
-                return closest_sunday_to(dt.date(year, self.month, self.day))
+    # Compiled from the fields above
+    _rule: DateRule = field(init=False, eq=False, repr=False)
 
-            return dt.date(year, self.month, self.day)
+    # Either the proper texts, or a function that loads them
+    _propers: Optional[Propers] = field(default=None, eq=False, repr=False)
+    _propers_loader: Optional[Callable[[], dict]] = field(
+        default=None, eq=False, repr=False
+    )
 
-        assert not (self.coeaster is not None and self.coadvent is not None)
+    def __attrs_post_init__(self):
+        self._rule = DateRule(self.month, self.day, self.coeaster,
+                              self.coadvent, self.dateexpr)
 
-        if self.coeaster is not None:
-            return easter(year) + dt.timedelta(days=self.coeaster)
+    @property
+    def propers(self) -> Propers:
+        if self._propers is None:
+            if self._propers_loader is None:
+                self._propers = Propers()
+            else:
+                self._propers = Propers(**self._propers_loader())
+        return self._propers
+
+    introit = _proper('introit')
+    collect = _proper('collect')
+    epistle_ref = _proper('epistle_ref')
+    epistle = _proper('epistle')
+    gat = _proper('gat')
+    gradual = _proper('gradual')
+    alleluia = _proper('alleluia')
+    tract = _proper('tract')
+    gospel_ref = _proper('gospel_ref')
+    gospel = _proper('gospel')
+    offertory = _proper('offertory')
+    communion = _proper('communion')
+
+    def as_dict(self) -> dict:
+        """All of the feast's fields, including the proper texts."""
+        d = {'slug': self.slug}
+        d.update({k: getattr(self, k) for k in METADATA_FIELDS})
+        d.update(cattrs.unstructure(self.propers))
+        return d
 
-        if self.coadvent is not None:
-            return advent(year) + dt.timedelta(days=self.coadvent)
+    def get_date(self, year=None) -> Optional[dt.date]:
+        if year is None:
+            year = dt.datetime.now().year
+        return self._rule(int(year))
 
-        return None
+    def get_dates(self, years: Iterable[int]) -> List[Optional[dt.date]]:
+        """The feast's date in each of the given years."""
+        return self._rule.dates(years)
 
     @property
     def date(self):
@@ -148,19 +266,9 @@ class Feast:
         document.add_heading(self.name, 0)
         document.save(path)
 
-
-@define
-class DateRule:
-    # Specified for the fixed holy days, None for the movable feasts.
-    # TODO - what about Remembrance Sunday and Advent Sunday? Not fixed
-    #  days but also not comoving with Easter. As a hack go with 11 Nov
-    #  and 30 Nov respectively but the exact dates are
-    month: Optional[int] = field(default=None)
-    day: Optional[int] = field(default=None)
-
-    # For the feasts synced with Easter, the number of days since Easter
-    coeaster: Optional[int] = field(default=None)
-    coadvent: Optional[int] = field(default=None)
+    def docx(self) -> bytes:
+        """The feast's docx, rendered once per feast data version."""
+        return _feast_docx(self.slug, data_version())
 
 
 class PewSheetItem(ABC):
@@ -186,37 +294,11 @@ class Music:
 
     @classmethod
     def neh_hymns(cls) -> List['Music']:
-        try:
-            records = get_neh_df().itertuples()
-        except NoPandasError as exc:
-            logger.warning(exc)
-            return []
-
-        def nehref2num(nehref: str) -> typing.Tuple[int, str]:
-            m = re.match(r"NEH: (\d+)([a-z]?)", nehref)
-            assert m is not None
-            num, suffix = m.groups()
-            return int(num), suffix
-
-        hymns = [
-            Music(
-                title=record.firstLine,
-                category='Hymn',
-                composer=None,
-                lyrics=None,
-                ref=f'NEH: {record.number}',
-                translation=f'Words/translation available at NEH: {record.number}, {record.firstLine}'
-            ) for record in records
-        ]
-        hymns.sort(key=lambda m: nehref2num(m.ref or ""))
-        return hymns
+        return list(_neh_hymns())
 
     @classmethod
     def get_neh_hymn_by_ref(cls, ref: str) -> Optional['Music']:
-        try:
-            return next(filter(lambda h: h.ref == ref, cls.neh_hymns()))
-        except StopIteration:
-            return None
+        return _neh_hymns_by_ref().get(ref)
 
     def __str__(self):
         if self.category == 'Hymn':
@@ -235,14 +317,44 @@ class Music:
         return rt
 
 
+@keyed_cache(data_version)
+def _richtext_fragments() -> Dict[tuple, str]:
+    """RichText XML rendered from the feasts' proper texts, which is the
+    same for every service, so it is kept until the feasts change.
+    """
+    return {}
+
+
+def prerendered(key: tuple, render: Callable[[], RichText]) -> RichText:
+    """The RichText that render() gives, rendering it only the first
+    time for each key.
+    """
+    fragments = _richtext_fragments()
+    xml = fragments.get(key)
+    record_cache('richtext', xml is not None)
+    if xml is None:
+        xml = fragments[key] = render().xml
+    rt = RichText()
+    rt.xml = xml
+    return rt
+
+
 @define
 class ServiceItem(PewSheetItem):
     title: str = field(default='')
     paragraphs: List[typing.Any] = field(factory=list)
     subtitle: Optional[str] = field(default=None)
+    # Whether the text comes from the feasts rather than from the
+    # service, so that it can be pre-rendered
+    proper: bool = field(default=False, kw_only=True, eq=False)
 
     def as_richtext(self) -> RichText:
+        if self.proper:
+            key = ('item', self.title, tuple(self.paragraphs), self.subtitle)
+            return prerendered(key, self._render)
+        return self._render()
 
+    def _render(self) -> RichText:
         rt = RichText()
         rt.add(self.title, **CharacterStyles.title)
         if self.subtitle is not None:
@@ -256,6 +368,16 @@ class ServiceItem(PewSheetItem):
         return rt
 
 
+def _render_collect(collect: str) -> RichText:
+    rt = RichText()
+    if collect.endswith('Amen.'):
+        rt.add('\a' + collect[:-5], **CharacterStyles.paragraph)
+        rt.add(collect[-5:], **CharacterStyles.paragraph, bold=True)
+    else:
+        rt.add('\a' + collect, **CharacterStyles.paragraph)
+    return rt
+
+
 @define
 class CollectItem(PewSheetItem):
     collects: List[str] = field(factory=list)
@@ -273,20 +395,16 @@ class CollectItem(PewSheetItem):
         return self.collects
 
     def as_richtext(self) -> RichText:
-        rt = RichText()
-        rt.add(self.title, **CharacterStyles.title)
+        # Which collects are said depends on the service, so each one is
+        # pre-rendered separately
+        rt = prerendered(('title', self.title),
+                         lambda: RichText(self.title, **CharacterStyles.title))
         for collect in self.collects:
-            if collect.endswith('Amen.'):
-                rt.add('\a' + collect[:-5], **CharacterStyles.paragraph)
-                rt.add(collect[-5:], **CharacterStyles.paragraph, bold=True)
-            else:
-                rt.add('\a' + collect, **CharacterStyles.paragraph)
-
+            rt.add(prerendered(('collect', collect),
+                               partial(_render_collect, collect)))
         return rt
 
 
-
-
 @define
 class MusicItem(PewSheetItem):
     title: str = field()
@@ -302,13 +420,85 @@ class MusicItem(PewSheetItem):
 
     def as_richtext(self) -> RichText:
         rt = RichText()
-        rt.add(self.title, font='Merriweather', size=20, bold=True)
+        rt.add(self.title, **CharacterStyles.title)
         rt.add('\a')
         rt.add(self.music.as_richtext())
         return rt
 
 
-@define
+def derived_property(f):
+    """Like property, but the value is computed on first access and then
+    kept until one of the Service's fields is reassigned. (Mutating a
+    field in place, e.g. appending to secondary_feasts, is not noticed.)
+    """
+    name = f.__name__
+
+    @wraps(f)
+    def getter(self):
+        try:
+            return self._derived[name]
+        except KeyError:
+            value = self._derived[name] = f(self)
+            return value
+
+    return property(getter)
+
+
+def _invalidate_derived(instance, attribute, value):
+    instance._derived.clear()
+    return value
+
+
+def _nehref2num(nehref: str) -> typing.Tuple[int, str]:
+    m = re.match(r"NEH: (\d+)([a-z]?)", nehref)
+    assert m is not None
+    num, suffix = m.groups()
+    return int(num), suffix
+
+
+@single_flight_cache()
+def _neh_hymns() -> Tuple[Music, ...]:
+    """The hymns in the New English Hymnal, in order."""
+    try:
+        records = get_neh_df().itertuples()
+    except NoPandasError as exc:
+        logger.warning(exc)
+        return ()
+
+    hymns = [
+        Music(
+            title=record.firstLine,
+            category='Hymn',
+            composer=None,
+            lyrics=None,
+            ref=f'NEH: {record.number}',
+            translation=(f'Words/translation available at NEH: '
+                         f'{record.number}, {record.firstLine}')
+        ) for record in records
+    ]
+    hymns.sort(key=lambda m: _nehref2num(m.ref or ""))
+    return tuple(hymns)
+
+
+@lru_cache()
+def _neh_hymns_by_ref() -> Dict[str, Music]:
+    return {hymn.ref: hymn for hymn in _neh_hymns()}
+
+
+register_lru_cache('hymn', _neh_hymns_by_ref)
+
+
+@keyed_cache(data_version)
+def _seasonal_feasts() -> Dict[str, Feast]:
+    """The feasts whose collects are repeated throughout a season."""
+    return {
+        'Advent': Feast.get(name='Advent I'),
+        'Lent': Feast.get(name='Ash Wednesday'),
+    }
+
+
+@define(on_setattr=setters.pipe(setters.convert, setters.validate,
+                                _invalidate_derived))
 class Service:
     # Mandatory fields first, then fields with default values.
     title: str = field()
@@ -324,10 +514,14 @@ class Service:
     anthem: Optional[Music] = field(default=None)
     service_type: str = field(default='Sung Mass')
 
+    # Cache for the derived_properties below
+    _derived: dict = field(factory=dict, init=False, repr=False, eq=False,
+                           on_setattr=setters.NO_OP)
+
     # One can't call methods in jinja2 templates, so one must provide
     # everything as member properties instead.
 
-    @property
+    @derived_property
     def collects(self) -> List[str]:
         out = []
         if self.primary_feast.collect:
@@ -338,10 +532,12 @@ class Service:
 
         # Collects for Advent I and Ash Wednesday are repeated
         # throughout Advent and Lent respectively.
-        advent1 = Feast.get(name='Advent I')
-        ash_wednesday = Feast.get(name='Ash Wednesday')
+        seasonal = _seasonal_feasts()
+        advent1 = seasonal['Advent']
+        ash_wednesday = seasonal['Lent']
 
-        if 'Advent' in self.primary_feast.name and self.primary_feast != advent1:
+        if ('Advent' in self.primary_feast.name
+                and self.primary_feast != advent1):
             out.append(advent1.collect)
 
         if 'Lent' in self.primary_feast.name:
@@ -359,7 +555,7 @@ class Service:
         assert self.primary_feast.gat is not None
         return self.primary_feast.gat
 
-    @property
+    @derived_property
     def gat_propers(self) -> List[str]:
         propers = []
         if 'Gradual' in self.primary_feast.gat:
@@ -397,31 +593,41 @@ class Service:
     def gospel(self) -> Optional[str]:
         return self.primary_feast.gospel
 
-    @property
+    @derived_property
     def items(self) -> List[PewSheetItem]:
+        with span('Service.items'):
+            return self._items()
+
+    def _items(self) -> List[PewSheetItem]:
         items: List[PewSheetItem] = []
         if self.introit_hymn:
             items.append(
                 MusicItem('Introit Hymn', self.introit_hymn)
             )
-        items.append(ServiceItem('Introit Proper', [self.introit_proper]))
+        items.append(ServiceItem('Introit Proper', [self.introit_proper],
+                                 proper=True))
 
         collects = CollectItem(self.collects)
         items.append(collects)
 
-        items.append(ServiceItem('Epistle', [self.epistle], self.epistle_ref))
-        items.append(ServiceItem(self.gat, self.gat_propers))
-        items.append(ServiceItem('Gospel', [self.gospel], self.gospel_ref))
+        items.append(ServiceItem('Epistle', [self.epistle], self.epistle_ref,
+                                 proper=True))
+        items.append(ServiceItem(self.gat, self.gat_propers, proper=True))
+        items.append(ServiceItem('Gospel', [self.gospel], self.gospel_ref,
+                                 proper=True))
 
-        items.append(ServiceItem('Offertory Proper', [self.offertory_proper]))
+        items.append(ServiceItem('Offertory Proper', [self.offertory_proper],
+                                 proper=True))
         if self.offertory_hymn:
             items.append(MusicItem('Offertory Hymn', self.offertory_hymn))
 
-        items.append(ServiceItem('Communion Proper', [self.communion_proper]))
+        items.append(ServiceItem('Communion Proper', [self.communion_proper],
+                                 proper=True))
 
         if self.anthem:
             items.append(
-                ServiceItem('Anthem', [self.anthem.lyrics, self.anthem.translation],
+                ServiceItem('Anthem',
+                            [self.anthem.lyrics, self.anthem.translation],
                             f'{self.anthem.title}. {self.anthem.composer}'))
 
         if self.recessional_hymn:
@@ -470,20 +676,144 @@ class Service:
         )
 
     def create_docx(self, path):
-        doc = DocxTemplate(PEW_SHEET_TEMPLATE)
-        jinja_env = jinja2.Environment(autoescape=True)
-        jinja_env.globals['len'] = len
-
         # local import to avoid circular import
         from filters import filters_context
 
-        jinja_env.filters.update(filters_context)
-        doc.render({'service': self}, jinja_env)
-        doc.save(path)
+        with span('Service.create_docx', title=self.title):
+            skeleton = _pew_sheet_skeleton()
+            if skeleton is not None:
+                try:
+                    with span('docx.skeleton_render'):
+                        skeleton.render(self, filters_context, path)
+                    return
+                except UnsupportedTemplate as exc:
+                    logger.info(f'Rendering with docxtpl: {exc}')
 
+            with span('docx.load_template'):
+                doc = DocxTemplate(BytesIO(_pew_sheet_template()))
 
-@lru_cache()
-def _feast_from_yaml(slug: str) -> Feast:
-    with open((DATA_DIR / slug).with_suffix('.yaml')) as f:
-        info = yaml.safe_load(f)
-        return Feast(slug=slug, **info)
+            with span('docx.jinja_env'):
+                jinja_env = jinja2.Environment(autoescape=True)
+                jinja_env.globals['len'] = len
+                jinja_env.filters.update(filters_context)
+
+            # Service.items and as_richtext are called from within the
+            # template, so their spans are children of this one.
+            with span('docx.render'):
+                doc.render({'service': self}, jinja_env)
+
+            with span('docx.save'):
+                doc.save(path)
+
+    def docx(self) -> bytes:
+        """The pew sheet, as the contents of a docx file."""
+        return _docx_bytes(self.create_docx)
+
+
+def _docx_bytes(create_docx: Callable[[str], None]) -> bytes:
+    with render_limit.limiter.slot(), TemporaryDirectory() as d:
+        path = os.path.join(d, 'rendered.docx')
+        create_docx(path)
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+@single_flight_cache(maxsize=256)
+def _feast_docx(slug: str, version: int) -> bytes:
+    return _docx_bytes(Feast.get(slug=slug).create_docx)
+
+
+register_lru_cache('feast_docx', _feast_docx)
+
+
+@single_flight_cache()
+def _pew_sheet_template() -> bytes:
+    with open(PEW_SHEET_TEMPLATE, 'rb') as f:
+        return f.read()
+
+
+@single_flight_cache()
+def _pew_sheet_skeleton() -> Optional[SkeletonTemplate]:
+    """The pew sheet template compiled for docx_skeleton, or None to
+    render with docxtpl.
+    """
+    if os.environ.get('PYPEW_DOCX_RENDERER', 'skeleton') != 'skeleton':
+        return None
+    try:
+        with span('docx.compile_template'):
+            return compile_template(_pew_sheet_template())
+    except UnsupportedTemplate as exc:
+        logger.warning(f'Rendering pew sheets with docxtpl: {exc}')
+        return None
+
+
+_feast_lock = threading.Lock()
+_feast_list: Optional[Tuple[Feast, ...]] = None
+_watcher: Optional[FeastWatcher] = None
+
+
+def _load_feasts() -> Tuple[Feast, ...]:
+    with span('feast.load_catalogue'):
+        catalogue = load_catalogue(DATA_DIR)
+        return tuple(
+            Feast(
+                slug=entry['slug'],
+                **{k: entry[k] for k in METADATA_FIELDS if k in entry},
+                propers_loader=partial(catalogue.read_propers,
+                                       entry['offset'], entry['length']),
+            )
+            for entry in catalogue.entries
+        )
+
+
+def _feasts() -> Tuple[Feast, ...]:
+    """Every feast in the catalogue, in the order of _list.txt."""
+    global _feast_list
+    feasts = _feast_list
+    record_cache('feast', feasts is not None)
+    if feasts is None:
+        with _feast_lock:
+            if _feast_list is None:
+                _feast_list = _load_feasts()
+            feasts = _feast_list
+    return feasts
+
+
+@keyed_cache(data_version)
+def _feasts_by_slug() -> Dict[str, Feast]:
+    return {feast.slug: feast for feast in _feasts()}
+
+
+def reload_feasts(slugs: Optional[Iterable[str]] = None) -> None:
+    """Reload the given feasts from their YAML files, or every feast if
+    slugs is None, and bump the data version.
+    """
+    global _feast_list
+    with _feast_lock, span('feast.reload'):
+        if slugs is None or _feast_list is None:
+            feasts = _load_feasts()
+        else:
+            slugs = set(slugs)
+            feasts = tuple(Feast.from_yaml(f.slug) if f.slug in slugs else f
+                           for f in _feast_list)
+        # Replace the feasts before bumping the version, so that nothing
+        # can cache the old feasts under the new version.
+        _feast_list = feasts
+        version = bump_data_version()
+    logger.info(f'Reloaded {"all feasts" if slugs is None else sorted(slugs)}'
+                f' (data version {version})')
+
+
+def watch_feasts(interval: float = 2, start: bool = True) -> FeastWatcher:
+    """Reload feasts whenever their YAML files change. Only one watcher
+    is created per process. With start=False, the watcher notes the
+    files' current state but its thread is not started until this is
+    called again, e.g. in a worker process forked after the feasts were
+    loaded.
+    """
+    global _watcher
+    if _watcher is None:
+        _watcher = FeastWatcher(DATA_DIR, reload_feasts, interval)
+    if start:
+        _watcher.start()
+    return _watcher
@@ -0,0 +1,218 @@
+"""Which feast is kept on each day, when feasts coincide.
+
+Each feast is given a rank. When several feasts fall on the same day,
+the highest-ranked one is kept as the primary feast of the day and the
+others are kept as secondary feasts, except that festivals are
+transferred to the next free day when they fall
+
+  * in Holy Week or Easter Week (so the Annunciation, when it falls in
+    Holy Week, is kept on the Monday after Easter I),
+  * on Ash Wednesday, Maundy Thursday, a principal feast or a Sunday of
+    Advent, Lent or Eastertide, or
+  * on the same day as a more important festival.
+
+A whole year is resolved in one pass over its days, starting in the
+December before so that festivals transferred from the end of one year
+are kept at the start of the next, and the result is cached for each
+year and feast data version.
+"""
+import datetime as dt
+from collections import defaultdict
+from enum import IntEnum
+from typing import Dict, List, Optional, Tuple
+
+from attr import define, field
+from dateutil.easter import easter
+
+from catalogue import data_version
+from metrics import register_lru_cache
+from models import Feast
+from utils import advent, single_flight_cache
+
+
+class Rank(IntEnum):
+    """Lower ranks take precedence."""
+    PRINCIPAL = 1
+    # Ash Wednesday, Maundy Thursday and the Sundays of Advent, Lent
+    # and Eastertide
+    PRIVILEGED = 2
+    FESTIVAL = 3
+    SUNDAY = 4
+    LESSER = 5
+
+
+PRINCIPAL_FEASTS = {
+    'midnight-mass', 'christmas-day', 'the-epiphany', 'candlemas',
+    'the-annunciation-of-the-bvm', 'easter-day', 'ascension-day',
+    'whitsunday', 'trinity-sunday', 'all-saints-day',
+}
+PRIVILEGED_DAYS = {'ash-wednesday', 'maundy-thursday'}
+LESSER_FEASTS = {
+    'remembrance-sunday', 'anniversary-of-kings-accession',
+    'the-blessed-virgin-mary', 'dormition-of-the-bvm', 'st-clement',
+    'st-etheldreda', 'st-bernard', 'st-augustine-of-hippo', 'st-jerome',
+    'st-augustine-of-canterbury', 'st-francis', 'st-edward-confessor',
+    'st-leo', 'st-athanasius',
+}
+# Principal feasts that are moved rather than displacing what they
+# fall on
+TRANSFERABLE_PRINCIPAL_FEASTS = {'the-annunciation-of-the-bvm'}
+
+
+def is_privileged_sunday(date: dt.date) -> bool:
+    if date.weekday() != 6:
+        return False
+    e = easter(date.year)
+    return (advent(date.year) <= date < dt.date(date.year, 12, 25)
+            or e - dt.timedelta(days=46) <= date <= e + dt.timedelta(days=49))
+
+
+def is_sunday(feast: Feast, date: dt.date) -> bool:
+    """Whether the feast is one of the Sundays of the year, e.g.
+    Trinity IV.
+    """
+    return (feast.month is None and date.weekday() == 6
+            and feast.slug not in PRINCIPAL_FEASTS | LESSER_FEASTS)
+
+
+def rank(feast: Feast, date: dt.date) -> Rank:
+    if feast.slug in PRINCIPAL_FEASTS:
+        return Rank.PRINCIPAL
+    if feast.slug in PRIVILEGED_DAYS:
+        return Rank.PRIVILEGED
+    if feast.slug in LESSER_FEASTS:
+        return Rank.LESSER
+    if is_sunday(feast, date):
+        return Rank.PRIVILEGED if is_privileged_sunday(date) else Rank.SUNDAY
+    return Rank.FESTIVAL
+
+
+def transferable(feast: Feast, r: Rank) -> bool:
+    """Fixed festivals are moved when they are displaced; everything
+    else is kept on its day.
+    """
+    return ((r == Rank.FESTIVAL and feast.month is not None)
+            or feast.slug in TRANSFERABLE_PRINCIPAL_FEASTS)
+
+
+@define
+class Observance:
+    date: dt.date = field()
+    primary: Feast = field()
+    secondary: List[Feast] = field(factory=list)
+    # If the primary feast has been transferred, the day it fell on
+    transferred_from: Optional[dt.date] = field(default=None)
+
+    def as_dict(self) -> dict:
+        return {
+            'date': self.date.isoformat(),
+            'primary': {'slug': self.primary.slug, 'name': self.primary.name},
+            'secondary': [{'slug': f.slug, 'name': f.name}
+                          for f in self.secondary],
+            'transferred_from': (self.transferred_from.isoformat()
+                                 if self.transferred_from else None),
+        }
+
+
+# (rank, position in the feast list, feast, the date it fell on)
+_Candidate = Tuple[Rank, int, Feast, dt.date]
+
+
+def _candidates(start: dt.date,
+                end: dt.date) -> Dict[dt.date, List[_Candidate]]:
+    """The feasts that fall on each day from start to end."""
+    table: Dict[dt.date, List[_Candidate]] = defaultdict(list)
+    for n, feast in enumerate(Feast.all()):
+        for year in range(start.year, end.year + 1):
+            date = feast.get_date(year=year)
+            if (date is not None and date.year == year
+                    and start <= date <= end):
+                table[date].append((rank(feast, date), n, feast, date))
+
+    # Only one Sunday is kept on each Sunday: in late years, the last
+    # Sundays after Trinity fall in Advent
+    for date, candidates in table.items():
+        sundays = sorted(c for c in candidates if is_sunday(c[2], date))
+        for c in sundays[1:]:
+            candidates.remove(c)
+    return table
+
+
+def _is_blocked(day: dt.date, kept: List[_Candidate]) -> bool:
+    """Whether festivals must be transferred away from the day."""
+    e = easter(day.year)
+    # Palm Sunday to Easter I
+    if e - dt.timedelta(days=7) <= day <= e + dt.timedelta(days=7):
+        return True
+    return min((c[0] for c in kept), default=Rank.LESSER) <= Rank.PRIVILEGED
+
+
+def _keep(day: dt.date, candidates: List[_Candidate]) \
+        -> Tuple[List[_Candidate], List[_Candidate]]:
+    """Split the candidates for the day into those kept on it and those
+    transferred to the next day.
+    """
+    kept = [c for c in candidates if not transferable(c[2], c[0])]
+    movable = [c for c in candidates if transferable(c[2], c[0])]
+    if movable and not _is_blocked(day, kept):
+        # Keep the most important, preferring one that falls on this
+        # day over one transferred to it
+        best = min(movable, key=lambda c: (c[0], c[3] != day, c[3], c[1]))
+        kept.append(best)
+        movable.remove(best)
+    movable.sort(key=lambda c: (c[3], c[0], c[1]))
+    return kept, movable
+
+
+def _resolve(year: int) -> Dict[dt.date, Observance]:
+    # Start in the December before: see above
+    table = _candidates(dt.date(year - 1, 12, 1), dt.date(year, 12, 31))
+
+    observances = {}
+    pending: List[_Candidate] = []
+    day = dt.date(year - 1, 12, 1)
+    while day.year <= year:
+        kept, pending = _keep(day, sorted(table.get(day, [])) + pending)
+        if kept and day.year == year:
+            kept.sort(key=lambda c: (c[0], c[1]))
+            first = kept[0]
+            observances[day] = Observance(
+                date=day,
+                primary=first[2],
+                secondary=[c[2] for c in kept[1:]],
+                transferred_from=first[3] if first[3] != day else None,
+            )
+        day += dt.timedelta(days=1)
+
+    return observances
+
+
+@single_flight_cache(maxsize=16)
+def _resolve_year(year: int, version: int) -> Dict[dt.date, Observance]:
+    return _resolve(year)
+
+
+register_lru_cache('calendar', _resolve_year)
+
+
+def resolve_year(year: int) -> Dict[dt.date, Observance]:
+    """The observance of each day of the year that has one."""
+    return _resolve_year(year, data_version())
+
+
+def observance(date: dt.date) -> Optional[Observance]:
+    return resolve_year(date.year).get(date)
+
+
+def next_observance(date: Optional[dt.date] = None) -> Observance:
+    """The observance of the given day, or of the next day that has
+    one.
+    """
+    if date is None:
+        date = dt.date.today()
+    for year in (date.year, date.year + 1):
+        # The table is in date order
+        for day, obs in resolve_year(year).items():
+            if day >= date:
+                return obs
+    raise ValueError(f'No feasts after {date}')
@@ -0,0 +1,162 @@
+"""On-demand profiling of individual requests.
+
+When PYPEW_PROFILING is set, a request that carries a valid profiling
+token, either in the X-PyPew-Profile header or in the _profile query
+parameter, is run under cProfile. The raw profile (.prof, for snakeviz
+or pstats) and a summary of the top functions (.txt) are written to
+the 'profiles' directory under utils.cache_dir.
+
+Tokens are signed with the app's SECRET_KEY and expire, and at most
+one request is profiled at a time and at most once every
+PYPEW_PROFILING_INTERVAL seconds, so this is safe to switch on briefly
+in production. Generate a token with ``python -m profiling``.
+"""
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode
+
+from itsdangerous import BadSignature, TimestampSigner
+
+from utils import cache_dir, logger
+
+PROFILE_HEADER = 'HTTP_X_PYPEW_PROFILE'
+PROFILE_ARG = '_profile'
+SALT = 'pypew-profile'
+
+
+def make_token(secret_key: str) -> str:
+    return TimestampSigner(secret_key, salt=SALT).sign('profile').decode()
+
+
+class ProfilingMiddleware:
+    """WSGI middleware that profiles requests that ask for it."""
+
+    def __init__(self, wsgi_app, secret_key: str,
+                 output_dir: Optional[str] = None,
+                 min_interval: float = 10, top: int = 40,
+                 max_age: int = 3600) -> None:
+        self.wsgi_app = wsgi_app
+        self.signer = TimestampSigner(secret_key, salt=SALT)
+        self.output_dir = output_dir or os.path.join(cache_dir, 'profiles')
+        self.min_interval = min_interval
+        self.top = top
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._last_profiled = float('-inf')
+
+    def _pop_token(self, environ) -> Optional[str]:
+        """Find the profiling token, removing it from the query string
+        so that views don't see it.
+        """
+        token = environ.get(PROFILE_HEADER)
+        query = parse_qsl(environ.get('QUERY_STRING', ''),
+                          keep_blank_values=True)
+        if any(k == PROFILE_ARG for k, _ in query):
+            token = token or dict(query)[PROFILE_ARG]
+            environ['QUERY_STRING'] = urlencode(
+                [(k, v) for k, v in query if k != PROFILE_ARG]
+            )
+        return token
+
+    def _valid(self, token: str) -> bool:
+        try:
+            self.signer.unsign(token, max_age=self.max_age)
+            return True
+        except BadSignature:
+            return False
+
+    def _acquire(self) -> bool:
+        """Claim the right to profile a request, subject to the rate
+        limit.
+        """
+        if not self._lock.acquire(blocking=False):
+            return False
+        now = time.monotonic()
+        if now - self._last_profiled < self.min_interval:
+            self._lock.release()
+            return False
+        self._last_profiled = now
+        return True
+
+    def __call__(self, environ, start_response):
+        token = self._pop_token(environ)
+        if not token:
+            return self.wsgi_app(environ, start_response)
+        if not self._valid(token):
+            logger.warning('Ignoring invalid profiling token')
+            return self.wsgi_app(environ, start_response)
+        if not self._acquire():
+            logger.info('Not profiling request: rate limited')
+            return self.wsgi_app(environ, start_response)
+
+        try:
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                # Consume the whole response inside the profiler, so
+                # that streamed bodies and send_file are included.
+                response = self.wsgi_app(environ, start_response)
+                try:
+                    body = list(response)
+                finally:
+                    if hasattr(response, 'close'):
+                        response.close()
+            finally:
+                profiler.disable()
+                elapsed = time.perf_counter() - start
+                self._write(profiler, environ, elapsed)
+        finally:
+            self._lock.release()
+
+        return body
+
+    def _write(self, profiler: cProfile.Profile, environ,
+               elapsed: float) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = environ.get('PATH_INFO', '/')
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', path).strip('-') or 'index'
+        stem = os.path.join(
+            self.output_dir,
+            f'{datetime.now():%Y%m%d-%H%M%S-%f}'
+            f'-{environ["REQUEST_METHOD"]}-{slug}'
+        )
+        profiler.dump_stats(stem + '.prof')
+
+        summary = io.StringIO()
+        summary.write(f'{environ["REQUEST_METHOD"]} {path}'
+                      f'?{environ.get("QUERY_STRING", "")}\n')
+        summary.write(f'Total time: {elapsed * 1000:.1f} ms\n\n')
+        stats = pstats.Stats(profiler, stream=summary)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        with open(stem + '.txt', 'w') as f:
+            f.write(summary.getvalue())
+
+        logger.info(f'Wrote profile of {path} ({elapsed * 1000:.1f} ms) '
+                    f'to {stem}.prof')
+
+
+def init_app(app) -> None:
+    """Install the profiling middleware if PYPEW_PROFILING is set."""
+    if not os.environ.get('PYPEW_PROFILING'):
+        return
+    app.wsgi_app = ProfilingMiddleware(
+        app.wsgi_app,
+        app.config['SECRET_KEY'],
+        min_interval=float(os.environ.get('PYPEW_PROFILING_INTERVAL', 10)),
+    )
+    logger.warning('Request profiling is enabled')
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    print(make_token(os.environ.get('SECRET_KEY', 'password')))
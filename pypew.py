@@ -9,9 +9,19 @@ from dotenv import load_dotenv
 from flask import Flask, redirect, request, url_for
 from jinja2 import StrictUndefined
 
+import assets
 import filters
+import memreport
+import metrics
+import profiling
+import tracing
 import views
-from utils import logger
+import warmup
+from models import watch_feasts
+from render_limit import Overloaded
+from service_store import ServiceStore
+from session_store import ServerSideSessionInterface, make_session_store
+from utils import cache_dir, logger
 
 load_dotenv()
 
@@ -22,7 +32,16 @@ class PyPew:
         self.thread: Optional[Thread] = None
 
 
-def create_app(pypew: Optional[PyPew] = None, **kwargs) -> Flask:
+def create_app(pypew: Optional[PyPew] = None, preload: bool = False,
+               config: Optional[dict] = None, **kwargs) -> Flask:
+    """Create the app. Pass preload=True when creating it in a server's
+    master process, before forking the workers: background threads are
+    then left for the server to start in each worker. Settings in config
+    override those read from the environment.
+    """
+    # Before anything is loaded, so that it is all traced
+    memreport.start_from_env()
+
     # https://stackoverflow.com/a/50132788
     base_dir = '.'
     if hasattr(sys, '_MEIPASS'):
@@ -38,15 +57,36 @@ def create_app(pypew: Optional[PyPew] = None, **kwargs) -> Flask:
 
     app.config['SERVER_NAME'] = os.environ.get('SERVER_NAME', 'localhost:5000')
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'password')
+    # For /debug/memory; it is not served unless this is set
+    app.config['ADMIN_SECRET'] = os.environ.get(memreport.ADMIN_SECRET_ENV)
+    # For /debug/traces, which is also served in debug mode
+    app.config['DEBUG_ENDPOINTS'] = bool(
+        os.environ.get('PYPEW_DEBUG_ENDPOINTS')
+    )
+    app.config['SESSION_TYPE'] = os.environ.get('SESSION_TYPE', 'sqlite')
+    app.config['SERVICE_DB'] = os.environ.get(
+        'SERVICE_DB', os.path.join(cache_dir, 'services.sqlite3')
+    )
+    if config is not None:
+        app.config.update(config)
 
     # store session information server-side to avoid large cookies
     # https://stackoverflow.com/questions/53551637/session-cookie-is-too-large-flask-application
-    app.config['SESSION_TYPE'] = 'filesystem'
+    app.session_interface = ServerSideSessionInterface(
+        make_session_store(app.config['SESSION_TYPE'])
+    )
+    app.extensions['service_store'] = ServiceStore(app.config['SERVICE_DB'])
 
     app.add_url_rule(
         '/', 'index_view', views.index_view, methods=['GET', 'POST']
     )
-    app.add_url_rule('/acknowledgements', 'acknowledgements_view', views.acknowledgements_view)
+    app.add_url_rule('/metrics', 'metrics_view', views.metrics_view)
+    app.add_url_rule('/debug/traces', 'debug_traces_api',
+                     views.debug_traces_api)
+    app.add_url_rule('/debug/memory', 'debug_memory_api',
+                     views.debug_memory_api, methods=['GET', 'POST'])
+    app.add_url_rule('/acknowledgements', 'acknowledgements_view',
+                     views.acknowledgements_view)
     app.add_url_rule(
         '/dateexpr',
         'dateexpr_view',
@@ -55,27 +95,48 @@ def create_app(pypew: Optional[PyPew] = None, **kwargs) -> Flask:
     )
     app.add_url_rule('/feasts', 'feast_index_view', views.feast_index_view)
     app.add_url_rule('/feasts/api', 'feast_index_api', views.feast_index_api)
-    app.add_url_rule('/feasts/api/upcoming', 'feast_upcoming_api', views.feast_upcoming_api)
-    app.add_url_rule('/feast/<slug>', 'feast_detail_view', views.feast_detail_view)
-    app.add_url_rule('/feast/api/<slug>', 'feast_detail_api', views.feast_detail_api)
-    app.add_url_rule('/feast/api/<slug>/date', 'feast_date_api', views.feast_date_api)
-    app.add_url_rule('/feast/<slug>/docx', 'feast_docx_view', views.feast_docx_view)
-    app.add_url_rule('/pewSheet', 'pew_sheet_create_view', views.pew_sheet_create_view, methods=['GET'])
-    app.add_url_rule('/pewSheet/docx', 'pew_sheet_docx_view', views.pew_sheet_docx_view, methods=['GET'])
+    app.add_url_rule('/feasts/api/upcoming', 'feast_upcoming_api',
+                     views.feast_upcoming_api)
+    app.add_url_rule('/feasts/api/on', 'feast_on_api', views.feast_on_api)
+    app.add_url_rule('/feasts/calendar.ics', 'feast_calendar_ics',
+                     views.feast_calendar_ics)
+    app.add_url_rule('/feast/<slug>', 'feast_detail_view',
+                     views.feast_detail_view)
+    app.add_url_rule('/feast/api/<slug>', 'feast_detail_api',
+                     views.feast_detail_api)
+    app.add_url_rule('/feast/api/<slug>/date', 'feast_date_api',
+                     views.feast_date_api)
+    app.add_url_rule('/feast/<slug>/docx', 'feast_docx_view',
+                     views.feast_docx_view)
+    app.add_url_rule('/pewSheet', 'pew_sheet_create_view',
+                     views.pew_sheet_create_view, methods=['GET'])
+    app.add_url_rule('/pewSheet/docx', 'pew_sheet_docx_view',
+                     views.pew_sheet_docx_view, methods=['GET'])
     app.add_url_rule('/pewSheet/clearHistory',
                      'pew_sheet_clear_history_endpoint',
                      views.pew_sheet_clear_history_endpoint,
                      methods=['DELETE'])
+    app.add_url_rule('/services/api', 'service_index_api',
+                     views.service_index_api)
+    app.add_url_rule('/service/api/<int:service_id>', 'service_detail_api',
+                     views.service_detail_api)
     app.url_map.strict_slashes = False
+    assets.init_app(app)
+
+    # Must come before any other before_request hooks, so that requests
+    # that they answer early are still counted
+    metrics.init_app(app)
+    tracing.init_app(app)
 
     @app.before_request
     def clear_trailing_slashes():
-        """https://stackoverflow.com/questions/40365390/trailing-slash-in-flask-route#40365514"""
+        """https://stackoverflow.com/a/40365514"""
         rp = request.path
         if rp != '/' and rp.endswith('/'):
             return redirect(rp[:-1])
 
     app.errorhandler(404)(views.not_found_handler)
+    app.errorhandler(Overloaded)(views.overloaded_handler)
     app.errorhandler(Exception)(views.internal_error_handler)
 
     for filter_name, filter_func in filters.filters_context.items():
@@ -83,10 +144,22 @@ def create_app(pypew: Optional[PyPew] = None, **kwargs) -> Flask:
 
     app.jinja_env.globals.update(len=len)
 
+    profiling.init_app(app)
+
+    # Pick up edits to data/feasts without restarting
+    if os.environ.get('PYPEW_WATCH_FEASTS'):
+        watch_feasts(float(os.environ.get('PYPEW_WATCH_FEASTS_INTERVAL', 2)),
+                     start=not preload)
+
     if pypew is not None:
         pypew.app = app
 
     app.app_context().push()
+
+    # The server warms the caches itself, before forking the workers
+    if os.environ.get('PYPEW_WARM') and not preload:
+        warmup.warm(app)
+
     return app
 
 
@@ -103,8 +176,52 @@ def main(argv: Optional[Sequence[str]] = None) -> None:
         help="Don't launch web browser automatically",
         action="store_true"
     )
+    subparsers = parser.add_subparsers(dest="command")
+    serve_parser = subparsers.add_parser(
+        "serve", help="Run a production server with several workers"
+    )
+    serve_parser.add_argument(
+        "--bind", default=os.environ.get("PYPEW_BIND", "127.0.0.1:5000"),
+        help="Address to listen on, e.g. 0.0.0.0:8000 or unix:pypew.sock"
+    )
+    serve_parser.add_argument(
+        "--workers", type=int, default=os.environ.get("PYPEW_WORKERS"),
+        help="Number of worker processes (default: 2 * CPUs + 1)"
+    )
+    serve_parser.add_argument(
+        "--threads", type=int, default=os.environ.get("PYPEW_THREADS", 1),
+        help="Number of threads per worker"
+    )
+    serve_parser.add_argument(
+        "--timeout", type=int, default=30,
+        help="Restart workers that are silent for this many seconds"
+    )
+    serve_parser.add_argument(
+        "--graceful-timeout", type=int, default=30,
+        help="Seconds to let workers finish their requests on reload"
+    )
+    serve_parser.add_argument("--log-level", default="info")
+    subparsers.add_parser(
+        "warm", help="Fill the caches, reporting how long each step takes"
+    )
     args = parser.parse_args(argv)
 
+    if args.command == "warm":
+        timings = warmup.warm(create_app())
+        for name, ms in timings.items():
+            print(f'{name:<20}{ms:>10.1f} ms')
+        print(f'{"total":<20}{sum(timings.values()):>10.1f} ms')
+        return
+
+    if args.command == "serve":
+        # local import: gunicorn is not available on Windows
+        from server import serve
+
+        serve(bind=args.bind, workers=args.workers, threads=args.threads,
+              timeout=args.timeout, graceful_timeout=args.graceful_timeout,
+              log_level=args.log_level)
+        return
+
     pypew = PyPew()
     app = create_app(pypew)
 
@@ -119,7 +236,8 @@ def main(argv: Optional[Sequence[str]] = None) -> None:
             target=lambda: app.run(debug=False, load_dotenv=True)
         )
         pypew.thread.start()
-        logger.info('Started Flask app. Close this terminal window to terminate PyPew.')
+        logger.info('Started Flask app. '
+                    'Close this terminal window to terminate PyPew.')
         logger.info('Opening web browser...')
         if not args.no_launch:
             with app.app_context():
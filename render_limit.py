@@ -0,0 +1,88 @@
+"""A limit on the number of docx files rendered at once.
+
+Rendering a docx file takes far longer than anything else the app
+does, so a burst of downloads could otherwise tie up every worker
+thread and hold up cheap requests behind them. At most
+PYPEW_RENDER_CONCURRENCY renders run at once in each process (default
+2); up to PYPEW_RENDER_QUEUE more wait for a slot (default 8), for at
+most PYPEW_RENDER_TIMEOUT seconds (default 10). Any others are refused
+straight away with Overloaded, which the app answers with a 503 and a
+Retry-After header.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, TypeVar
+
+from metrics import (render_queue_depth, render_wait, renders_in_progress,
+                     renders_rejected)
+
+T = TypeVar('T')
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str, retry_after: int) -> None:
+        super().__init__(f'Too many renders ({reason})')
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RenderLimiter:
+    def __init__(self, concurrency: int = 2, queue_size: int = 8,
+                 timeout: float = 10) -> None:
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._waiting = 0
+
+    @property
+    def retry_after(self) -> int:
+        """Seconds after which a refused client could try again."""
+        return max(1, round(self.timeout))
+
+    def _acquire(self) -> None:
+        if self._slots.acquire(blocking=False):
+            render_wait.observe(value=0)
+            return
+        with self._lock:
+            if self._waiting >= self.queue_size:
+                renders_rejected.inc('queue_full')
+                raise Overloaded('queue_full', self.retry_after)
+            self._waiting += 1
+            render_queue_depth.set(value=self._waiting)
+        start = time.perf_counter()
+        try:
+            acquired = self._slots.acquire(timeout=self.timeout)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+                render_queue_depth.set(value=self._waiting)
+        render_wait.observe(value=time.perf_counter() - start)
+        if not acquired:
+            renders_rejected.inc('timeout')
+            raise Overloaded('timeout', self.retry_after)
+
+    @contextmanager
+    def slot(self):
+        """Wait for a free render slot and hold it for the block."""
+        self._acquire()
+        renders_in_progress.inc()
+        try:
+            yield
+        finally:
+            renders_in_progress.dec()
+            self._slots.release()
+
+    def run(self, render: Callable[[], T]) -> T:
+        with self.slot():
+            return render()
+
+
+limiter = RenderLimiter(
+    concurrency=int(os.environ.get('PYPEW_RENDER_CONCURRENCY', 2)),
+    queue_size=int(os.environ.get('PYPEW_RENDER_QUEUE', 8)),
+    timeout=float(os.environ.get('PYPEW_RENDER_TIMEOUT', 10)),
+)
@@ -0,0 +1,83 @@
+"""Run PyPew under gunicorn with several worker processes.
+
+The app is created and its caches warmed in the master process, which
+then forks the workers, so that the workers share the feasts, hymns and
+templates copy-on-write rather than each loading their own.
+
+Send the master SIGHUP to reload gracefully: it reloads the feasts,
+warms the caches again and replaces the workers one by one, letting the
+old workers finish their requests. (Code changes need a restart.)
+"""
+import gc
+import multiprocessing
+import os
+from typing import Optional
+
+from flask import Flask
+from gunicorn.app.base import BaseApplication
+
+import models
+import warmup
+from pypew import create_app
+from utils import logger
+
+
+def default_workers() -> int:
+    return multiprocessing.cpu_count() * 2 + 1
+
+
+def _warm_and_freeze(app: Flask) -> None:
+    warmup.warm(app)
+    # Move everything allocated so far out of the garbage collector's
+    # reach, so that collections in the workers don't write to (and so
+    # copy) the pages that they share with the master.
+    gc.freeze()
+
+
+def post_fork(server, worker) -> None:
+    # Threads don't survive forking, so start the feast watcher here
+    # rather than in the master
+    if os.environ.get('PYPEW_WATCH_FEASTS'):
+        models.watch_feasts()
+
+
+def on_reload(arbiter) -> None:
+    logger.info('Reloading feasts before replacing the workers')
+    gc.unfreeze()
+    models.reload_feasts()
+    # With preload_app, this is the app that the workers are forked with
+    _warm_and_freeze(arbiter.app.wsgi())
+
+
+class PyPewServer(BaseApplication):
+    def __init__(self, options: Optional[dict] = None) -> None:
+        self.options = {
+            'preload_app': True,
+            'post_fork': post_fork,
+            'on_reload': on_reload,
+            **(options or {}),
+        }
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self) -> Flask:
+        app = create_app(preload=True)
+        _warm_and_freeze(app)
+        return app
+
+
+def serve(bind: str = '127.0.0.1:5000', workers: Optional[int] = None,
+          threads: int = 1, timeout: int = 30, graceful_timeout: int = 30,
+          log_level: str = 'info') -> None:
+    PyPewServer({
+        'bind': bind,
+        'workers': workers or default_workers(),
+        'threads': threads,
+        'timeout': timeout,
+        'graceful_timeout': graceful_timeout,
+        'loglevel': log_level,
+    }).run()
@@ -0,0 +1,269 @@
+"""Local persistence for services.
+
+Each service is stored once, together with the query string that the
+pew sheet form was submitted with, so that it can be listed and
+queried without rebuilding it from form data every time.
+"""
+import datetime as dt
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from attr import define, field
+from flask import current_app
+
+from models import Feast, Music, Service
+from models_base import NotFoundError
+from utils import logger
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS services ('
+    ' id INTEGER PRIMARY KEY,'
+    ' query TEXT NOT NULL UNIQUE,'
+    ' title TEXT NOT NULL,'
+    ' date TEXT NOT NULL,'
+    ' time TEXT NOT NULL,'
+    ' primary_feast TEXT NOT NULL,'
+    ' secondary_feasts TEXT NOT NULL,'
+    ' celebrant TEXT NOT NULL,'
+    ' preacher TEXT NOT NULL,'
+    ' introit_hymn TEXT,'
+    ' offertory_hymn TEXT,'
+    ' recessional_hymn TEXT,'
+    ' anthem TEXT,'
+    ' service_type TEXT NOT NULL,'
+    ' created REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS services_date ON services (date)',
+    'CREATE INDEX IF NOT EXISTS services_primary_feast'
+    ' ON services (primary_feast, date)',
+    'CREATE INDEX IF NOT EXISTS services_celebrant'
+    ' ON services (celebrant, date)',
+]
+
+COLUMNS = ('id', 'query', 'title', 'date', 'time', 'primary_feast',
+           'secondary_feasts', 'celebrant', 'preacher', 'introit_hymn',
+           'offertory_hymn', 'recessional_hymn', 'anthem', 'service_type')
+
+
+@define
+class StoredService:
+    id: int = field()
+    query: str = field()
+    service: Service = field()
+
+
+def _music_ref(music: Optional[Music]) -> Optional[str]:
+    return music.ref if music is not None else None
+
+
+def _service_to_row(service: Service) -> dict:
+    anthem = service.anthem
+    return {
+        'title': service.title,
+        'date': service.date.isoformat(),
+        'time': service.time.isoformat(),
+        'primary_feast': service.primary_feast.slug,
+        'secondary_feasts': ','.join(f.slug for f in service.secondary_feasts),
+        'celebrant': service.celebrant or '',
+        'preacher': service.preacher or '',
+        'introit_hymn': _music_ref(service.introit_hymn),
+        'offertory_hymn': _music_ref(service.offertory_hymn),
+        'recessional_hymn': _music_ref(service.recessional_hymn),
+        'anthem': json.dumps({
+            'title': anthem.title,
+            'composer': anthem.composer,
+            'lyrics': anthem.lyrics,
+            'translation': anthem.translation,
+        }) if anthem is not None else None,
+        'service_type': service.service_type,
+    }
+
+
+def _row_to_stored_service(row: sqlite3.Row) -> StoredService:
+    def hymn(ref: Optional[str]) -> Optional[Music]:
+        return Music.get_neh_hymn_by_ref(ref) if ref else None
+
+    anthem = None
+    if row['anthem'] is not None:
+        anthem = Music(category='Anthem', ref=None,
+                       **json.loads(row['anthem']))
+
+    service = Service(
+        title=row['title'],
+        date=dt.date.fromisoformat(row['date']),
+        time=dt.time.fromisoformat(row['time']),
+        primary_feast=Feast.get(slug=row['primary_feast']),
+        secondary_feasts=[Feast.get(slug=slug)
+                          for slug in row['secondary_feasts'].split(',')
+                          if slug],
+        celebrant=row['celebrant'],
+        preacher=row['preacher'],
+        introit_hymn=hymn(row['introit_hymn']),
+        offertory_hymn=hymn(row['offertory_hymn']),
+        recessional_hymn=hymn(row['recessional_hymn']),
+        anthem=anthem,
+        service_type=row['service_type'],
+    )
+    return StoredService(id=row['id'], query=row['query'], service=service)
+
+
+def _load(row: sqlite3.Row) -> Optional[StoredService]:
+    """The stored service in the row, or None (with a warning) if its
+    feasts no longer exist.
+    """
+    try:
+        return _row_to_stored_service(row)
+    except NotFoundError as exc:
+        logger.warning(f'Skipping stored service {row["id"]}: {exc}')
+        return None
+
+
+def _load_all(rows: List[sqlite3.Row]) -> List[StoredService]:
+    return [ss for ss in map(_load, rows) if ss is not None]
+
+
+def month_range(year: int, month: int) -> Tuple[dt.date, dt.date]:
+    """The first and last days of the given month."""
+    start = dt.date(year, month, 1)
+    if month == 12:
+        end = dt.date(year + 1, 1, 1)
+    else:
+        end = dt.date(year, month + 1, 1)
+    return start, end - dt.timedelta(days=1)
+
+
+class ServiceStore:
+    """Services stored in a SQLite database, indexed by date, primary
+    feast and celebrant. Each thread gets its own connection.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def _connection(self) -> sqlite3.Connection:
+        # A connection must not be shared with a forked child process
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def add(self, service: Service, query: str) -> int:
+        """Store the service, which was created from the given query
+        string, and return its id. Storing the same query string again
+        returns the existing id.
+        """
+        row = _service_to_row(service)
+        row['query'] = query
+        row['created'] = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                f'INSERT OR IGNORE INTO services ({", ".join(row)})'
+                f' VALUES ({", ".join("?" * len(row))})',
+                tuple(row.values())
+            )
+            (service_id,) = conn.execute(
+                'SELECT id FROM services WHERE query = ?', (query,)
+            ).fetchone()
+        return service_id
+
+    def get(self, service_id: int) -> Optional[StoredService]:
+        row = self._connection().execute(
+            f'SELECT {", ".join(COLUMNS)} FROM services WHERE id = ?',
+            (service_id,)
+        ).fetchone()
+        return _load(row) if row is not None else None
+
+    def get_many(self, service_ids: List[int]) -> List[StoredService]:
+        """The services with the given ids, ordered by date. Unknown ids,
+        and services whose feasts no longer exist, are ignored.
+        """
+        if not service_ids:
+            return []
+        rows = self._connection().execute(
+            f'SELECT {", ".join(COLUMNS)} FROM services'
+            f' WHERE id IN ({", ".join("?" * len(service_ids))})'
+            ' ORDER BY date, time',
+            tuple(service_ids)
+        ).fetchall()
+        return _load_all(rows)
+
+    def delete(self, service_id: int) -> None:
+        with self._connection() as conn:
+            conn.execute('DELETE FROM services WHERE id = ?', (service_id,))
+
+    @staticmethod
+    def _where(start: Optional[dt.date] = None,
+               end: Optional[dt.date] = None,
+               primary_feast: Optional[str] = None,
+               celebrant: Optional[str] = None) -> Tuple[str, tuple]:
+        clauses, params = [], []
+        if start is not None:
+            clauses.append('date >= ?')
+            params.append(start.isoformat())
+        if end is not None:
+            clauses.append('date <= ?')
+            params.append(end.isoformat())
+        if primary_feast is not None:
+            clauses.append('primary_feast = ?')
+            params.append(primary_feast)
+        if celebrant is not None:
+            clauses.append('celebrant = ?')
+            params.append(celebrant)
+
+        if not clauses:
+            return '', ()
+        return ' WHERE ' + ' AND '.join(clauses), tuple(params)
+
+    def query(self, start: Optional[dt.date] = None,
+              end: Optional[dt.date] = None,
+              primary_feast: Optional[str] = None,
+              celebrant: Optional[str] = None,
+              limit: Optional[int] = None,
+              offset: int = 0) -> List[StoredService]:
+        """Services matching all of the given criteria, ordered by
+        date. Dates are inclusive. Services whose feasts no longer exist
+        are left out.
+        """
+        where, params = self._where(start, end, primary_feast, celebrant)
+        sql = (f'SELECT {", ".join(COLUMNS)} FROM services{where}'
+               ' ORDER BY date, time')
+        if limit is not None:
+            sql += ' LIMIT ? OFFSET ?'
+            params += (limit, offset)
+        rows = self._connection().execute(sql, params).fetchall()
+        return _load_all(rows)
+
+    def count(self, start: Optional[dt.date] = None,
+              end: Optional[dt.date] = None,
+              primary_feast: Optional[str] = None,
+              celebrant: Optional[str] = None) -> int:
+        where, params = self._where(start, end, primary_feast, celebrant)
+        (n,) = self._connection().execute(
+            f'SELECT COUNT(*) FROM services{where}', params
+        ).fetchone()
+        return n
+
+    def in_month(self, year: int, month: int) -> List[StoredService]:
+        """All services in the given month."""
+        start, end = month_range(year, month)
+        return self.query(start=start, end=end)
+
+    def by_celebrant(self, celebrant: str) -> List[StoredService]:
+        """All services celebrated by the given person."""
+        return self.query(celebrant=celebrant)
+
+
+def get_service_store() -> ServiceStore:
+    """The service store of the current Flask app."""
+    return current_app.extensions['service_store']
@@ -0,0 +1,304 @@
+"""Server-side session storage.
+
+Flask's default session interface serialises the whole session into a
+signed cookie, so the pew sheet history travels back and forth on
+every request. The interface here keeps the session data in a
+server-side store and only puts an opaque, signed session id in the
+cookie.
+"""
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+from flask.sessions import SessionInterface, SessionMixin, \
+    session_json_serializer
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from utils import cache_dir
+
+
+class SessionStore(ABC):
+    """A backend that maps session ids to serialised session data, with
+    an expiry time (seconds since the epoch) attached to each entry.
+    """
+
+    def __init__(self, compact_interval: float = 600) -> None:
+        self.compact_interval = compact_interval
+        self._last_compacted = time.time()
+
+    @abstractmethod
+    def load(self, sid: str) -> Optional[Tuple[str, float]]:
+        """Return the data and expiry time for this session id, or None
+        if there is no unexpired entry.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def save(self, sid: str, data: str, expires: float) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def touch(self, sid: str, expires: float) -> None:
+        """Extend the lifetime of a session without rewriting its
+        data.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, sid: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def compact(self) -> int:
+        """Remove every expired entry. Returns the number removed."""
+        raise NotImplementedError
+
+    def maybe_compact(self) -> None:
+        """Compact the store if it has not been done recently."""
+        now = time.time()
+        if now - self._last_compacted >= self.compact_interval:
+            self._last_compacted = now
+            self.compact()
+
+
+class MemorySessionStore(SessionStore):
+    """Keeps sessions in a dict. Only suitable for tests and for a single
+    process.
+    """
+
+    def __init__(self, compact_interval: float = 600) -> None:
+        super().__init__(compact_interval)
+        self._data: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def load(self, sid):
+        entry = self._data.get(sid)
+        if entry is None or entry[1] < time.time():
+            return None
+        return entry
+
+    def save(self, sid, data, expires):
+        with self._lock:
+            self._data[sid] = (data, expires)
+
+    def touch(self, sid, expires):
+        with self._lock:
+            if sid in self._data:
+                self._data[sid] = (self._data[sid][0], expires)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def compact(self):
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (_, expires) in self._data.items()
+                       if expires < now]
+            for sid in expired:
+                del self._data[sid]
+        return len(expired)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Keeps sessions in a SQLite database, which may be shared between
+    several worker processes. Each thread gets its own connection.
+    """
+
+    def __init__(self, path: str, compact_interval: float = 600) -> None:
+        super().__init__(compact_interval)
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                ' sid TEXT PRIMARY KEY,'
+                ' data TEXT NOT NULL,'
+                ' expires REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS sessions_expires'
+                ' ON sessions (expires)'
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # A connection must not be shared with a forked child process
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def load(self, sid):
+        row = self._connection().execute(
+            'SELECT data, expires FROM sessions'
+            ' WHERE sid = ? AND expires >= ?',
+            (sid, time.time())
+        ).fetchone()
+        return tuple(row) if row is not None else None
+
+    def save(self, sid, data, expires):
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO sessions (sid, data, expires)'
+                ' VALUES (?, ?, ?)',
+                (sid, data, expires)
+            )
+
+    def touch(self, sid, expires):
+        with self._connection() as conn:
+            conn.execute('UPDATE sessions SET expires = ? WHERE sid = ?',
+                         (expires, sid))
+
+    def delete(self, sid):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def compact(self):
+        with self._connection() as conn:
+            cursor = conn.execute('DELETE FROM sessions WHERE expires < ?',
+                                  (time.time(),))
+            return cursor.rowcount
+
+
+def make_session_store(session_type: str) -> SessionStore:
+    """Create the store named by the SESSION_TYPE config value."""
+    if session_type == 'memory':
+        return MemorySessionStore()
+    if session_type in {'sqlite', 'filesystem'}:
+        path = os.environ.get(
+            'SESSION_DB', os.path.join(cache_dir, 'sessions.sqlite3')
+        )
+        return SQLiteSessionStore(path)
+    raise ValueError(f'Unknown session type {session_type}')
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid: Optional[str] = None,
+                 expires: Optional[float] = None) -> None:
+        def on_update(self) -> None:
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires = expires
+        self.modified = False
+        self.accessed = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Stores session data in a SessionStore. The cookie only holds a
+    random session id, signed with the app's secret key so that forged
+    ids are rejected without touching the store.
+    """
+
+    salt = 'pypew-session-id'
+    serializer = session_json_serializer
+    session_class = ServerSideSession
+
+    def __init__(self, store: SessionStore) -> None:
+        self.store = store
+
+    def _signer(self, app) -> Signer:
+        return Signer(app.secret_key, salt=self.salt)
+
+    def _ttl(self, app) -> float:
+        return app.permanent_session_lifetime.total_seconds()
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return self.session_class()
+
+        try:
+            sid = self._signer(app).unsign(cookie).decode()
+        except BadSignature:
+            return self.session_class()
+
+        entry = self.store.load(sid)
+        if entry is None:
+            return self.session_class()
+
+        data, expires = entry
+        return self.session_class(self.serializer.loads(data), sid, expires)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        self.store.maybe_compact()
+
+        # If the session has been emptied, drop it from the store and
+        # remove the cookie.
+        if not session:
+            if session.modified:
+                if session.sid is not None:
+                    self.store.delete(session.sid)
+                response.delete_cookie(
+                    name, domain=domain, path=path, secure=secure,
+                    samesite=samesite, httponly=httponly,
+                )
+                response.vary.add('Cookie')
+            return
+
+        now = time.time()
+        ttl = self._ttl(app)
+        if session.modified or session.sid is None:
+            if session.sid is None:
+                session.sid = secrets.token_urlsafe(32)
+            self.store.save(session.sid,
+                            self.serializer.dumps(dict(session)),
+                            now + ttl)
+        elif session.expires is not None and session.expires - now < ttl / 2:
+            # Sliding expiry, but only write once the session is half
+            # way to expiring so that reads stay cheap.
+            self.store.touch(session.sid, now + ttl)
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly,
+            domain=domain,
+            path=path,
+            secure=secure,
+            samesite=samesite,
+        )
+        response.vary.add('Cookie')
@@ -22,17 +22,36 @@ setTitle();
 primaryFeastField.addEventListener('change', setTitle);
 secondaryFeastsField.addEventListener('change', setTitle);
 
-const updateDateFromPrimaryFeast = async () => {
-  const url = '/feast/api/' + primaryFeastField.value + '/date';
-  const r = await fetch(url);
-  const j = await r.json();
-  if (j !== null)
-    dateField.value = j;
+const updateDateFromPrimaryFeast = () => {
+  const date = feastDates[primaryFeastField.value];
+  if (date !== undefined)
+    dateField.value = date;
 };
 
-updateDateFromPrimaryFeast().then();
 primaryFeastField.addEventListener('change', updateDateFromPrimaryFeast);
 
+const selectFeasts = (field, slugs) => {
+  Array.prototype.forEach.call(field.options, opt => {
+    opt.selected = slugs.includes(opt.value);
+  });
+};
+
+const updateFeastsFromDate = async () => {
+  if (dateField.value === '')
+    return;
+  const r = await fetch('/feasts/api/on?date=' + encodeURIComponent(dateField.value));
+  if (!r.ok)
+    return;
+  const j = await r.json();
+  if (j === null)
+    return;
+  primaryFeastField.value = j.primary.slug;
+  selectFeasts(secondaryFeastsField, j.secondary.map(f => f.slug));
+  setTitle();
+};
+
+dateField.addEventListener('change', updateFeastsFromDate);
+
 const today = new Date()
 const day = 1000 * 60 * 60 * 24;  // milliseconds in a day
 const sunday = new Date(today.getTime() + (7 - today.getDay()) * day);
@@ -44,23 +63,27 @@ function toISO(date) {
 const todayBtn = document.getElementById('today-btn');
 todayBtn.onclick = () => {
   dateField.value = toISO(today);
+  updateFeastsFromDate().then();
 };
 
 const sundayBtn = document.getElementById('sunday-btn');
 sundayBtn.onclick = () => {
   dateField.value = toISO(sunday);
+  updateFeastsFromDate().then();
 };
 
 const prevWeekBtn = document.getElementById('prev-week-btn');
 prevWeekBtn.onclick = () => {
   const prevWeek = (new Date(dateField.value)).getTime() - 7 * day;
   dateField.value = toISO(new Date(prevWeek));
+  updateFeastsFromDate().then();
 };
 
 const nextWeekBtn = document.getElementById('next-week-btn');
 nextWeekBtn.onclick = () => {
   const nextWeek = (new Date(dateField.value)).getTime() + 7 * day;
   dateField.value = toISO(new Date(nextWeek));
+  updateFeastsFromDate().then();
 };
 
 /**
@@ -106,8 +129,6 @@ const hymnFields = Array.prototype.map.call(
   primaryFeastField.addEventListener('change', setTitle);
   secondaryFeastsField.addEventListener('change', setTitle);
 
-  updateDateFromPrimaryFeast().then();
-
   if (timeField.value === '')
     timeField.value = "11:00";
 
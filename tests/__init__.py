@@ -0,0 +1,31 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+
+def isolate_stores(test: TestCase) -> str:
+    """Keep the sessions in memory and the services in a temporary
+    directory for the rest of the test, rather than in the real cache
+    directory. Returns the temporary directory.
+    """
+    tempdir = TemporaryDirectory()
+    test.addCleanup(tempdir.cleanup)
+    env = patch.dict(os.environ, {
+        'SESSION_TYPE': 'memory',
+        'SESSION_DB': os.path.join(tempdir.name, 'sessions.sqlite3'),
+        'SERVICE_DB': os.path.join(tempdir.name, 'services.sqlite3'),
+    })
+    env.start()
+    test.addCleanup(env.stop)
+    return tempdir.name
+
+
+def create_test_app(test: TestCase, **kwargs):
+    """Create the app for a test, with isolated stores."""
+    from pypew import create_app
+
+    isolate_stores(test)
+    app = create_app(**kwargs)
+    app.config['SERVER_NAME'] = 'localhost:5000'
+    return app
@@ -0,0 +1,81 @@
+import gzip
+import os
+import unittest
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from flask import Flask, url_for
+
+import assets
+
+CSS = b'body { color: black; }\n' * 100
+
+
+class TestAssets(TestCase):
+    def setUp(self) -> None:
+        self.tempdir = TemporaryDirectory()
+        self.static_dir = self.tempdir.name
+        with open(os.path.join(self.static_dir, 'styles.css'), 'wb') as f:
+            f.write(CSS)
+        self.app = Flask(__name__, static_folder=self.static_dir,
+                         static_url_path='/static')
+        self.app.config['SERVER_NAME'] = 'localhost:5000'
+        assets.init_app(self.app)
+        self.client = self.app.test_client()
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def hashed_url(self):
+        with self.app.app_context():
+            return url_for('static', filename='styles.css')
+
+    def test_url_is_fingerprinted(self):
+        url = self.hashed_url()
+        digest = assets.file_hash(os.path.join(self.static_dir, 'styles.css'))
+        self.assertTrue(url.endswith(f'/static/styles.{digest}.css'))
+
+    def test_fingerprinted_url_is_immutable(self):
+        with self.client.get(self.hashed_url()) as r:
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.data, CSS)
+            self.assertTrue(r.cache_control.immutable)
+            self.assertEqual(r.cache_control.max_age, assets.MAX_AGE)
+
+    def test_plain_url_still_works(self):
+        with self.client.get('/static/styles.css') as r:
+            self.assertEqual(r.status_code, 200)
+            self.assertFalse(r.cache_control.immutable)
+
+    def test_unknown_hash(self):
+        with self.client.get('/static/styles.000000000000.css') as r:
+            self.assertEqual(r.status_code, 404)
+
+    def test_precompressed(self):
+        self.assertGreaterEqual(assets.compress(self.static_dir), 1)
+        url = self.hashed_url()
+
+        with self.client.get(url, headers={'Accept-Encoding': 'gzip'}) as r:
+            self.assertEqual(r.headers['Content-Encoding'], 'gzip')
+            self.assertEqual(r.mimetype, 'text/css')
+            self.assertEqual(gzip.decompress(r.data), CSS)
+            self.assertIn('Accept-Encoding', r.headers['Vary'])
+
+        with self.client.get(url) as r:
+            self.assertNotIn('Content-Encoding', r.headers)
+            self.assertEqual(r.data, CSS)
+
+    def test_rehashes_changed_files_in_debug_mode(self):
+        manifest = assets.AssetManifest(self.static_dir, check_mtimes=True)
+        before = manifest.hashed('styles.css')
+        path = os.path.join(self.static_dir, 'styles.css')
+        with open(path, 'ab') as f:
+            f.write(b'p { color: red; }\n')
+        os.utime(path, (0, 0))
+        after = manifest.hashed('styles.css')
+        self.assertNotEqual(before, after)
+        self.assertEqual(manifest.original(after), 'styles.css')
+
+
+if __name__ == '__main__':
+    unittest.main()
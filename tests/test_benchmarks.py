@@ -0,0 +1,62 @@
+import unittest
+from unittest import TestCase
+
+from tempfile import TemporaryDirectory
+
+from benchmarks import hotpaths, loadtest
+from tests import isolate_stores
+
+
+class TestHotPathBenchmarks(TestCase):
+    def setUp(self):
+        isolate_stores(self)
+
+    def test_percentile(self):
+        values = [float(x) for x in range(1, 101)]
+        self.assertAlmostEqual(hotpaths.percentile(values, 0), 1)
+        self.assertAlmostEqual(hotpaths.percentile(values, 50), 50.5)
+        self.assertAlmostEqual(hotpaths.percentile(values, 95), 95.05)
+        self.assertAlmostEqual(hotpaths.percentile(values, 100), 100)
+
+    def test_compare(self):
+        results = {'a': {'median': 2.0}, 'b': {'median': 1.0}}
+        baseline = {'a': {'median': 1.0}}
+        self.assertDictEqual(hotpaths.compare(results, baseline), {'a': 2.0})
+
+    def test_all_benchmarks_run(self):
+        results = hotpaths.run(repeat=1)
+        self.assertIn('Service.create_docx', results)
+        self.assertIn('GET pew_sheet_docx_view', results)
+        for stats in results.values():
+            self.assertLessEqual(stats['min'], stats['p95'])
+
+
+class TestLoadTest(TestCase):
+    def setUp(self):
+        isolate_stores(self)
+
+    def test_summarise(self):
+        results = [loadtest.Result('feast page', 200, 0.001 * n)
+                   for n in range(1, 100)]
+        results.append(loadtest.Result('feast page', 503, 0.1))
+        summary = loadtest.summarise(results, elapsed=2)
+        stats = summary['feast page']
+        self.assertEqual(stats['requests'], 100)
+        self.assertEqual(stats['errors'], 1)
+        self.assertAlmostEqual(stats['error_rate'], 0.01)
+        self.assertAlmostEqual(stats['throughput'], 50)
+        self.assertLessEqual(stats['p50'], stats['p95'])
+        self.assertLessEqual(stats['p95'], stats['p99'])
+        self.assertDictEqual(stats['statuses'], {'200': 99, '503': 1})
+        self.assertEqual(summary['all']['requests'], 100)
+
+    def test_in_process(self):
+        with TemporaryDirectory() as tempdir:
+            summary = loadtest.run(loadtest.in_process_clients(tempdir),
+                                   users=2, duration=1)
+        self.assertGreater(summary['all']['requests'], 0)
+        self.assertEqual(summary['all']['errors'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+import os
+import shutil
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+import catalogue
+import models
+from forms import feast_choices
+from models import DATA_DIR, Feast
+
+
+class TestCatalogue(TestCase):
+    def setUp(self) -> None:
+        self.tempdir = TemporaryDirectory()
+        self.src_dir = Path(self.tempdir.name) / 'feasts'
+        shutil.copytree(DATA_DIR, self.src_dir)
+        self.path = os.path.join(self.tempdir.name, 'feasts.catalogue')
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def test_matches_yaml(self):
+        cat = catalogue.load_catalogue(self.src_dir, self.path)
+        slugs = catalogue.read_slugs(self.src_dir)
+        self.assertListEqual([e['slug'] for e in cat.entries], slugs)
+
+        for entry in cat.entries:
+            info = catalogue.read_yaml(self.src_dir, entry['slug'])
+            metadata, propers = catalogue.split_fields(info)
+            for k, v in metadata.items():
+                self.assertEqual(entry[k], v)
+            self.assertDictEqual(
+                cat.read_propers(entry['offset'], entry['length']),
+                propers
+            )
+        cat.close()
+
+    def test_recompiles_when_stale(self):
+        cat = catalogue.load_catalogue(self.src_dir, self.path)
+        self.assertEqual(cat.entries[0]['name'], 'Advent I')
+        cat.close()
+
+        yaml_path = self.src_dir / 'advent-i.yaml'
+        text = yaml_path.read_text().replace('name: Advent I',
+                                             'name: Advent Sunday')
+        yaml_path.write_text(text)
+        later = time.time() + 10
+        os.utime(yaml_path, (later, later))
+
+        cat = catalogue.load_catalogue(self.src_dir, self.path)
+        self.assertEqual(cat.entries[0]['name'], 'Advent Sunday')
+        cat.close()
+
+    def test_named_by_contents(self):
+        cache = os.path.join(self.tempdir.name, 'cache')
+        os.mkdir(cache)
+        copy = Path(self.tempdir.name) / 'unpacked-again'
+        shutil.copytree(self.src_dir, copy)
+        os.utime(copy / 'advent-i.yaml')
+
+        with patch('catalogue.cache_dir', cache):
+            # The same feasts somewhere else share a catalogue
+            self.assertEqual(catalogue.default_path(copy),
+                             catalogue.default_path(self.src_dir))
+            catalogue.load_catalogue(self.src_dir).close()
+            catalogue.load_catalogue(copy).close()
+            self.assertEqual(len(os.listdir(cache)), 1)
+
+            # Changed feasts replace it
+            _edit(copy / 'advent-i.yaml', 'name: Advent I',
+                  'name: Advent Sunday')
+            cat = catalogue.load_catalogue(copy)
+            self.assertEqual(cat.entries[0]['name'], 'Advent Sunday')
+            self.assertListEqual(os.listdir(cache),
+                                 [os.path.basename(cat.path)])
+            cat.close()
+
+    def test_unknown_field(self):
+        with self.assertRaises(ValueError):
+            catalogue.split_fields({'name': 'Foo', 'colect': 'Typo'})
+
+
+class TestLazyPropers(TestCase):
+    def test_propers_are_loaded_lazily(self):
+        loads = []
+
+        def loader():
+            loads.append(None)
+            return {'collect': 'O Lord'}
+
+        feast = Feast(slug='foo', name='Foo', propers_loader=loader)
+        self.assertEqual(feast.name, 'Foo')
+        self.assertListEqual(loads, [])
+        self.assertEqual(feast.collect, 'O Lord')
+        self.assertEqual(feast.gat, '')
+        self.assertEqual(len(loads), 1)
+
+    def test_from_yaml_matches_catalogue(self):
+        for feast in Feast.all():
+            self.assertEqual(Feast.from_yaml(feast.slug).as_dict(),
+                             feast.as_dict())
+
+
+def _edit(path: Path, old: str, new: str) -> None:
+    path.write_text(path.read_text().replace(old, new))
+    # Make sure that the mtime changes, however coarse the filesystem's
+    # timestamps are
+    later = time.time() + 10
+    os.utime(path, (later, later))
+
+
+class TestFeastWatcher(TestCase):
+    def setUp(self) -> None:
+        self.tempdir = TemporaryDirectory()
+        self.src_dir = Path(self.tempdir.name) / 'feasts'
+        shutil.copytree(DATA_DIR, self.src_dir)
+        self.changes = []
+        self.watcher = catalogue.FeastWatcher(self.src_dir,
+                                              self.changes.append)
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def test_no_changes(self):
+        self.assertFalse(self.watcher.check())
+        self.assertListEqual(self.changes, [])
+
+    def test_reports_changed_slugs(self):
+        _edit(self.src_dir / 'advent-i.yaml', 'Advent I', 'Advent Sunday')
+        _edit(self.src_dir / 'st-andrew.yaml', 'Andrew', 'Andrew')
+        self.assertTrue(self.watcher.check())
+        self.assertListEqual(self.changes, [{'advent-i', 'st-andrew'}])
+        # Each change is only reported once
+        self.assertFalse(self.watcher.check())
+
+    def test_list_change_reloads_everything(self):
+        _edit(self.src_dir / '_list.txt', 'advent-i\n', '')
+        self.assertTrue(self.watcher.check())
+        self.assertListEqual(self.changes, [None])
+
+    def test_failed_reload_is_retried(self):
+        def on_change(slugs):
+            self.changes.append(slugs)
+            if len(self.changes) == 1:
+                raise ValueError('half-written file')
+
+        self.watcher.on_change = on_change
+        _edit(self.src_dir / 'advent-i.yaml', 'Advent I', 'Advent Sunday')
+        self.assertFalse(self.watcher.check())
+        self.assertTrue(self.watcher.check())
+        self.assertListEqual(self.changes, [{'advent-i'}, {'advent-i'}])
+
+
+class TestReloadFeasts(TestCase):
+    def setUp(self) -> None:
+        self.tempdir = TemporaryDirectory()
+        self.src_dir = Path(self.tempdir.name) / 'feasts'
+        shutil.copytree(DATA_DIR, self.src_dir)
+
+    def tearDown(self) -> None:
+        models.reload_feasts(['advent-i'])
+        self.tempdir.cleanup()
+
+    def test_reloads_only_changed_feasts(self):
+        before = {f.slug: f for f in Feast.all()}
+        version = catalogue.data_version()
+        self.assertIn(('advent-i', 'Advent I'), feast_choices())
+
+        _edit(self.src_dir / 'advent-i.yaml', 'name: Advent I',
+              'name: Advent Sunday')
+        with patch('models.DATA_DIR', self.src_dir):
+            models.reload_feasts(['advent-i'])
+
+        self.assertGreater(catalogue.data_version(), version)
+        self.assertEqual(Feast.get(slug='advent-i').name, 'Advent Sunday')
+        self.assertIn(('advent-i', 'Advent Sunday'), feast_choices())
+        # Everything else is untouched
+        self.assertIs(Feast.get(slug='st-andrew'), before['st-andrew'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import datetime as dt
+import unittest
+import zipfile
+from io import BytesIO
+from unittest import TestCase
+from unittest.mock import patch
+
+import attr
+import jinja2
+from docxtpl import DocxTemplate
+from parameterized import parameterized
+
+import docx_skeleton
+from docx_skeleton import UnsupportedTemplate, compile_template
+from filters import filters_context
+from models import Feast, Music, Service, _pew_sheet_template
+
+
+def render_docxtpl(service, filters=filters_context) -> BytesIO:
+    doc = DocxTemplate(BytesIO(_pew_sheet_template()))
+    jinja_env = jinja2.Environment(autoescape=True)
+    jinja_env.filters.update(filters)
+    doc.render({'service': service}, jinja_env)
+    f = BytesIO()
+    doc.save(f)
+    return f
+
+
+def render_skeleton(service, filters=filters_context) -> BytesIO:
+    f = BytesIO()
+    compile_template(_pew_sheet_template()).render(service, filters, f)
+    return f
+
+
+def base_service() -> Service:
+    return Service(
+        title='Advent I', date=dt.date(2022, 11, 27), time=dt.time(11),
+        primary_feast=Feast.get(slug='advent-i'),
+        secondary_feasts=[Feast.get(slug='st-andrew')],
+        celebrant='Fr X', preacher='Fr Y',
+    )
+
+
+class TestSkeletonTemplate(TestCase):
+    def assertSameDocx(self, expected: BytesIO, actual: BytesIO):
+        with zipfile.ZipFile(expected) as e, zipfile.ZipFile(actual) as a:
+            self.assertIsNone(a.testzip())
+            self.assertListEqual(a.namelist(), e.namelist())
+            for name in e.namelist():
+                self.assertEqual(a.read(name), e.read(name), msg=name)
+
+    @parameterized.expand([
+        ('plain', {}),
+        ('no secondary feasts or names',
+         {'secondary_feasts': [], 'celebrant': None, 'preacher': None}),
+        ('markup and non-ASCII',
+         {'celebrant': 'Fr O\'Brien & <Co> "Père" ✝'}),
+        ('anthem with line breaks',
+         {'anthem': Music(title='Rorate & "caeli"', category='Anthem',
+                          composer='Byrd', lyrics='Rorate\ncaeli\tdesuper',
+                          ref=None, translation='{_{ it\'s }_}')}),
+        ('lent', {'primary_feast': Feast.get(slug='lent-i'),
+                  'secondary_feasts': []}),
+    ])
+    def test_same_as_docxtpl(self, _, changes):
+        service = attr.evolve(base_service(), **changes)
+        self.assertSameDocx(render_docxtpl(service), render_skeleton(service))
+
+    def test_hymns(self):
+        service = base_service()
+        hymns = Music.neh_hymns()
+        if not hymns:
+            self.skipTest('No hymns')
+        service = attr.evolve(service, introit_hymn=hymns[0],
+                              recessional_hymn=hymns[1])
+        self.assertSameDocx(render_docxtpl(service), render_skeleton(service))
+
+    def test_empty_value(self):
+        filters = dict(filters_context, service_header=lambda s: '')
+        service = base_service()
+        self.assertSameDocx(render_docxtpl(service, filters),
+                            render_skeleton(service, filters))
+
+    def test_values_needing_docxtpl(self):
+        filters = dict(filters_context, service_header=lambda s: 'a\tb')
+        with self.assertRaises(UnsupportedTemplate):
+            render_skeleton(base_service(), filters)
+
+    def test_unsupported_tag(self):
+        with patch.object(DocxTemplate, 'patch_xml',
+                          lambda self, xml: xml + '{{ foo }}'):
+            with self.assertRaises(UnsupportedTemplate):
+                compile_template(_pew_sheet_template())
+
+    @patch('models._pew_sheet_skeleton')
+    def test_create_docx_falls_back_to_docxtpl(self, m_skeleton):
+        m_skeleton.return_value.render.side_effect = UnsupportedTemplate
+        with patch('models.DocxTemplate') as m_docxtpl:
+            base_service().create_docx(BytesIO())
+        m_docxtpl.return_value.render.assert_called_once()
+
+
+class TestWriteZip(TestCase):
+    def test_round_trip(self):
+        members = [docx_skeleton._member('a.txt', b'hello' * 100),
+                   docx_skeleton._member('dir/b.xml', b'')]
+        f = BytesIO()
+        docx_skeleton.write_zip(f, members)
+        with zipfile.ZipFile(f) as z:
+            self.assertIsNone(z.testzip())
+            self.assertEqual(z.read('a.txt'), b'hello' * 100)
+            self.assertEqual(z.read('dir/b.xml'), b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import shutil
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+import catalogue
+import feastsync
+from models import DATA_DIR
+
+REPO_DIR = Path(__file__).parent.parent
+
+
+class TestFeastSync(TestCase):
+    def setUp(self) -> None:
+        self.tempdir = TemporaryDirectory()
+        self.feast_dir = Path(self.tempdir.name) / 'feasts'
+        shutil.copytree(DATA_DIR, self.feast_dir)
+        self.catalogue_path = os.path.join(self.tempdir.name,
+                                           'feasts.catalogue')
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def import_rows(self, rows, **kwargs):
+        return feastsync.import_rows(rows, self.feast_dir,
+                                     self.catalogue_path, jobs=1, **kwargs)
+
+    def test_round_trip_changes_nothing(self):
+        for ext in ['csv', 'xlsx']:
+            with self.subTest(ext=ext):
+                path = os.path.join(self.tempdir.name, f'texts.{ext}')
+                feastsync.write_rows(path, feastsync.export_rows(
+                    self.feast_dir, jobs=1))
+                result = self.import_rows(feastsync.read_rows(path))
+                self.assertListEqual(result.written, [])
+                self.assertFalse(result.list_changed)
+                self.assertEqual(len(result.unchanged), 104)
+
+    def test_checked_in_spreadsheets_are_up_to_date(self):
+        # They are exported from the YAML files, so importing them
+        # should change nothing. If this fails, export them again.
+        for path in ['data/feasts.csv', 'texts.xlsx']:
+            with self.subTest(path=path):
+                rows = feastsync.read_rows(str(REPO_DIR / path))
+                result = self.import_rows(rows, dry_run=True)
+                self.assertListEqual(result.written, [])
+                self.assertFalse(result.list_changed)
+                self.assertListEqual(result.orphaned, [])
+
+    def test_only_changed_feasts_are_written(self):
+        rows = feastsync.export_rows(self.feast_dir, jobs=1)
+        rows[0]['name'] = 'Advent Sunday'
+        st_andrew = self.feast_dir / 'st-andrew.yaml'
+        mtime = st_andrew.stat().st_mtime_ns
+
+        result = self.import_rows(rows)
+        self.assertListEqual(result.written, ['advent-i'])
+        self.assertEqual(st_andrew.stat().st_mtime_ns, mtime)
+        self.assertIn('name: Advent Sunday',
+                      (self.feast_dir / 'advent-i.yaml').read_text())
+
+        # The catalogue is compiled in the same pass
+        cat = catalogue.Catalogue(self.catalogue_path)
+        self.assertEqual(cat.entries[0]['name'], 'Advent Sunday')
+        self.assertEqual(cat.source,
+                         catalogue.source_signature(self.feast_dir))
+        cat.close()
+
+    def test_new_feast(self):
+        rows = feastsync.export_rows(self.feast_dir, jobs=1)
+        rows.append({'name': 'St. Swithun', 'month': '7', 'day': '15'})
+        result = self.import_rows(rows)
+        self.assertListEqual(result.written, ['st-swithun'])
+        self.assertTrue(result.list_changed)
+        self.assertEqual(catalogue.read_slugs(self.feast_dir)[-1],
+                         'st-swithun')
+        self.assertDictEqual(
+            catalogue.read_yaml(self.feast_dir, 'st-swithun'),
+            {'name': 'St. Swithun', 'month': 7, 'day': 15}
+        )
+
+    def test_invalid_rows_write_nothing(self):
+        rows = feastsync.export_rows(self.feast_dir, jobs=1)
+        rows[0]['name'] = 'Advent Sunday'
+        rows[1]['month'] = 'June'
+        rows[2]['colect'] = 'Typo'
+        rows[3]['month'], rows[3]['day'] = 2, 30
+        with self.assertRaises(feastsync.SyncError) as cm:
+            self.import_rows(rows)
+        self.assertEqual(len(cm.exception.errors), 3)
+        self.assertIn('name: Advent I\n',
+                      (self.feast_dir / 'advent-i.yaml').read_text())
+        self.assertFalse(os.path.exists(self.catalogue_path))
+
+    def test_dry_run(self):
+        rows = feastsync.export_rows(self.feast_dir, jobs=1)
+        del rows[0]
+        result = self.import_rows(rows, dry_run=True)
+        self.assertTrue(result.list_changed)
+        self.assertListEqual(result.orphaned, ['advent-i'])
+        self.assertEqual(catalogue.read_slugs(self.feast_dir)[0], 'advent-i')
+
+    def test_prune(self):
+        rows = feastsync.export_rows(self.feast_dir, jobs=1)
+        del rows[0]
+        self.import_rows(rows, prune=True)
+        self.assertFalse((self.feast_dir / 'advent-i.yaml').exists())
+        self.assertNotIn('advent-i', catalogue.read_slugs(self.feast_dir))
+
+    @patch('feastsync.ProcessPoolExecutor')
+    def test_serial_by_default(self, m_executor):
+        # Too few feasts for processes to be worth starting
+        rows = feastsync.export_rows(self.feast_dir)
+        rows[0]['name'] = 'Advent Sunday'
+        result = feastsync.import_rows(rows, self.feast_dir,
+                                       self.catalogue_path)
+        self.assertListEqual(result.written, ['advent-i'])
+        m_executor.assert_not_called()
+
+    def test_parallel(self):
+        rows = feastsync.export_rows(self.feast_dir, jobs=2)
+        rows[0]['name'] = 'Advent Sunday'
+        result = feastsync.import_rows(rows, self.feast_dir,
+                                       self.catalogue_path, jobs=2)
+        self.assertListEqual(result.written, ['advent-i'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import datetime as dt
+import unittest
+from unittest import TestCase
+from unittest.mock import patch
+
+from flask import url_for
+
+import ical
+from catalogue import bump_data_version
+from models import Feast
+from tests import create_test_app
+from views import feast_views
+
+
+class TestICal(TestCase):
+    def test_fold(self):
+        self.assertEqual(ical.fold('SUMMARY:Short'), 'SUMMARY:Short\r\n')
+        line = 'SUMMARY:' + 'é' * 100
+        folded = ical.fold(line)
+        parts = folded.split('\r\n')[:-1]
+        self.assertGreater(len(parts), 1)
+        for part in parts:
+            self.assertLessEqual(len(part.encode()), 75)
+        self.assertEqual(''.join(p[1:] if i else p
+                                 for i, p in enumerate(parts)), line)
+
+    def test_escape(self):
+        self.assertEqual(ical.escape('SS. Simon, Jude; and\nothers'),
+                         r'SS. Simon\, Jude\; and\nothers')
+
+    def test_calendar(self):
+        text = ''.join(ical.calendar([
+            ical.Event(uid='x@pypew', date=dt.date(2022, 11, 30),
+                       summary='St. Andrew')
+        ]))
+        self.assertTrue(text.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(text.endswith('END:VCALENDAR\r\n'))
+        self.assertIn('DTSTART;VALUE=DATE:20221130\r\n', text)
+        self.assertIn('DTEND;VALUE=DATE:20221201\r\n', text)
+
+
+class TestCalendarView(TestCase):
+    def setUp(self) -> None:
+        self.app = create_test_app(self)
+        self.app.app_context().push()
+        self.client = self.app.test_client()
+        feast_views._ics_cache.clear()
+        self.addCleanup(feast_views._ics_cache.clear)
+
+    def url(self, **kwargs):
+        return url_for('feast_calendar_ics', **kwargs)
+
+    def test_feed(self):
+        r = self.client.get(self.url(start=2022, end=2023,
+                                     feast=['st-andrew', 'christmas-day']))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.mimetype, 'text/calendar')
+        self.assertEqual(r.data.count(b'BEGIN:VEVENT'), 4)
+        self.assertIn(b'UID:st-andrew-20221130@pypew', r.data)
+        self.assertIn(b'UID:christmas-day-20231225@pypew', r.data)
+
+    def test_etag(self):
+        url = self.url(start=2022, feast='st-andrew')
+        # The first request streams the feed and caches it at the end,
+        # but has the same ETag as the cached feed
+        first = self.client.get(url)
+        self.assertIn(b'BEGIN:VEVENT', first.data)
+        etag = first.headers['ETag']
+
+        second = self.client.get(url)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.headers['ETag'], etag)
+
+        for _ in range(2):
+            feast_views._ics_cache.clear()
+            r = self.client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(r.status_code, 304)
+
+    def test_etag_changes_with_the_feasts(self):
+        url = self.url(start=2022, feast='st-andrew')
+        etag = self.client.get(url).headers['ETag']
+        other = self.client.get(self.url(start=2023, feast='st-andrew'))
+        self.assertNotEqual(other.headers['ETag'], etag)
+
+        feast = Feast.get(slug='st-andrew')
+        # Forget the renamed feast afterwards
+        self.addCleanup(bump_data_version)
+        with patch.object(feast, 'name', 'St Andrew'):
+            bump_data_version()
+            r = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(r.status_code, 200)
+        self.assertIn(b'SUMMARY:St Andrew', r.data)
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get(self.url(start='x')).status_code,
+                         400)
+        self.assertEqual(
+            self.client.get(self.url(start=2023, end=2022)).status_code, 400
+        )
+        self.assertEqual(
+            self.client.get(self.url(start=2000, end=2100)).status_code, 400
+        )
+        self.assertEqual(
+            self.client.get(self.url(feast='notmas-day')).status_code, 404
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
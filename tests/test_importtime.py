@@ -0,0 +1,32 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+from unittest import TestCase
+
+from benchmarks import importtime
+from tests import isolate_stores
+
+
+class TestImportTime(TestCase):
+    def test_parse_budgets(self):
+        budgets = importtime.parse_budgets(['pypew=100'])
+        self.assertEqual(budgets['pypew'], 100)
+        self.assertEqual(budgets['models'],
+                         importtime.DEFAULT_BUDGETS_MS['models'])
+
+    def test_within_budget(self):
+        """Fails if importing the app or serving the first request is
+        slower than the budgets in benchmarks/importtime.py (which may
+        be overridden with PYPEW_BUDGETS).
+        """
+        # The first response is from a fresh app in a subprocess, which
+        # inherits the isolated stores
+        isolate_stores(self)
+        report = io.StringIO()
+        with redirect_stdout(report):
+            failures = importtime.check(importtime.parse_budgets([]), top=5)
+        self.assertListEqual(failures, [], report.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import tracemalloc
+import unittest
+from unittest import TestCase
+
+import memreport
+import models
+from memreport import Usage
+from tests import create_test_app
+
+
+def trace(test: TestCase) -> None:
+    """Trace memory for the rest of the test."""
+    if tracemalloc.is_tracing():
+        test.skipTest('Memory is already being traced')
+    memreport.start(25)
+    test.addCleanup(tracemalloc.stop)
+
+
+class TestMemoryReport(TestCase):
+    def test_by_subsystem(self):
+        models._pew_sheet_template.cache_clear()
+        trace(self)
+        template = models._pew_sheet_template()
+        usage = memreport.by_subsystem(memreport.take_snapshot())
+        self.assertGreaterEqual(usage['docx template'].size, len(template))
+        self.assertIn(memreport.OTHER, usage)
+
+    def test_diff(self):
+        before = {'a': Usage(100, 2), 'b': Usage(50, 1)}
+        after = {'a': Usage(40, 1), 'c': Usage(10, 1)}
+        self.assertDictEqual(memreport.diff(before, after), {
+            'a': Usage(-60, -1),
+            'b': Usage(-50, -1),
+            'c': Usage(10, 1),
+        })
+
+    def test_admin_token(self):
+        token = memreport.make_token('secret')
+        self.assertTrue(memreport.is_admin(token, 'secret'))
+        self.assertFalse(memreport.is_admin(token, 'other secret'))
+        self.assertFalse(memreport.is_admin(None, 'secret'))
+
+    def test_admin_secret(self):
+        self.assertEqual(memreport.admin_secret('admin', 'key'), 'admin')
+        self.assertIsNone(memreport.admin_secret(None, 'key'))
+        self.assertIsNone(memreport.admin_secret('password', 'key'))
+        self.assertIsNone(memreport.admin_secret('key', 'key'))
+
+
+class TestDebugMemoryApi(TestCase):
+    def setUp(self) -> None:
+        self.app = create_test_app(self)
+        self.app.config['ADMIN_SECRET'] = 'admin secret'
+        self.client = self.app.test_client()
+        self.token = memreport.make_token('admin secret')
+        self.headers = {memreport.ADMIN_HEADER: self.token}
+        self.addCleanup(setattr, memreport, '_baseline', None)
+
+    def test_needs_admin_secret(self):
+        for secret in [None, 'password', self.app.config['SECRET_KEY']]:
+            self.app.config['ADMIN_SECRET'] = secret
+            headers = {memreport.ADMIN_HEADER: memreport.make_token(
+                secret or ''
+            )}
+            r = self.client.get('/debug/memory', headers=headers)
+            self.assertEqual(r.status_code, 404)
+
+    def test_needs_admin_token(self):
+        r = self.client.get('/debug/memory')
+        self.assertEqual(r.status_code, 403)
+        r = self.client.post('/debug/memory', headers={
+            memreport.ADMIN_HEADER: memreport.make_token(
+                self.app.config['SECRET_KEY']
+            ),
+        })
+        self.assertEqual(r.status_code, 403)
+        # Only in the header, so that it is not logged with the URL
+        r = self.client.get('/debug/memory', query_string={
+            'token': self.token,
+        })
+        self.assertEqual(r.status_code, 403)
+
+    def test_not_tracing(self):
+        if tracemalloc.is_tracing():
+            self.skipTest('Memory is already being traced')
+        r = self.client.get('/debug/memory', headers=self.headers)
+        self.assertEqual(r.status_code, 409)
+        # Does not start tracing
+        r = self.client.post('/debug/memory', headers=self.headers)
+        self.assertEqual(r.status_code, 409)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_baseline(self):
+        trace(self)
+        r = self.client.post('/debug/memory', headers=self.headers)
+        self.assertEqual(r.status_code, 200)
+        r = self.client.get('/debug/memory', headers=self.headers)
+        self.assertEqual(r.status_code, 200)
+        report = r.json
+        self.assertIn('feast_docx', report['cache_entries'])
+        self.assertEqual(report['traced'],
+                         sum(u['size'] for u in report['subsystems'].values()))
+        self.assertIn(memreport.OTHER, report['since_baseline'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from unittest import TestCase
+
+from flask import url_for
+
+import metrics
+from tests import create_test_app
+
+
+class TestMetricTypes(TestCase):
+    def test_counter(self):
+        c = metrics.Counter('things', 'Things.', ['kind'])
+        c.inc('a')
+        c.inc('a', amount=2)
+        self.assertEqual(c.get('a'), 3)
+        self.assertIn('things_total{kind="a"} 3', c.render())
+
+    def test_histogram_buckets_are_cumulative(self):
+        h = metrics.Histogram('latency', 'Latency.', buckets=[1, 2])
+        h.observe(value=0.5)
+        h.observe(value=1.5)
+        h.observe(value=5)
+        text = h.render()
+        self.assertIn('latency_bucket{le="1"} 1', text)
+        self.assertIn('latency_bucket{le="2"} 2', text)
+        self.assertIn('latency_bucket{le="+Inf"} 3', text)
+        self.assertIn('latency_count 3', text)
+        self.assertIn('latency_sum 7.0', text)
+
+    def test_label_values_are_escaped(self):
+        c = metrics.Counter('things', 'Things.', ['kind'])
+        c.inc('say "hi"')
+        self.assertIn(r'things_total{kind="say \"hi\""} 1', c.render())
+
+
+class TestMetricsView(TestCase):
+    def setUp(self) -> None:
+        self.app = create_test_app(self)
+        self.app.app_context().push()
+        self.client = self.app.test_client()
+
+    def test_requests_are_counted(self):
+        before = metrics.requests_total.get('index_view', 'GET', '200')
+        self.client.get(url_for('index_view'))
+        self.assertEqual(
+            metrics.requests_total.get('index_view', 'GET', '200'),
+            before + 1
+        )
+        self.assertGreater(metrics.request_duration.count('index_view', 'GET'),
+                           0)
+        self.assertEqual(metrics.requests_in_progress.get(), 0)
+
+    def test_metrics_view(self):
+        self.client.get(url_for('feast_index_view'))
+        r = self.client.get(url_for('metrics_view'))
+        self.assertEqual(r.status_code, 200)
+        self.assertIn('pypew_request_duration_seconds_bucket'
+                      '{endpoint="feast_index_view"', r.text)
+        self.assertIn('pypew_cache_hits_total{cache="feast"}', r.text)
+
+
+if __name__ == '__main__':
+    unittest.main()
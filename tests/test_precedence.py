@@ -0,0 +1,103 @@
+import datetime as dt
+import unittest
+from unittest import TestCase
+from unittest.mock import patch
+
+from parameterized import parameterized
+
+import precedence
+from catalogue import bump_data_version
+from models import Feast
+from precedence import Rank
+
+
+class TestPrecedence(TestCase):
+    @parameterized.expand([
+        # Annunciation in Holy Week: the Monday after Easter I
+        ('the-annunciation-of-the-bvm', dt.date(2024, 3, 25),
+         dt.date(2024, 4, 8)),
+        # In Easter Week: after Easter I, one per day
+        ('st-george', dt.date(2025, 4, 23), dt.date(2025, 4, 28)),
+        ('st-mark', dt.date(2025, 4, 25), dt.date(2025, 4, 29)),
+        # On a Sunday of Advent
+        ('st-andrew', dt.date(2025, 11, 30), dt.date(2025, 12, 1)),
+        ('st-thomas-the-apostle', dt.date(2025, 12, 21),
+         dt.date(2025, 12, 22)),
+    ])
+    def test_transfers(self, slug, original, transferred):
+        feast = Feast.get(slug=slug)
+        obs = precedence.observance(original)
+        self.assertTrue(obs is None or obs.primary != feast)
+        obs = precedence.observance(transferred)
+        self.assertEqual(obs.primary, feast)
+        self.assertEqual(obs.transferred_from, original)
+
+    def test_transferred_into_the_next_year(self):
+        feasts = [Feast(slug='a', name='A', month=12, day=31),
+                  Feast(slug='b', name='B', month=12, day=31)]
+        with patch.object(Feast, 'all', return_value=feasts):
+            observances = precedence._resolve(2023)
+        obs = observances[dt.date(2023, 1, 1)]
+        self.assertEqual(obs.primary.slug, 'b')
+        self.assertEqual(obs.transferred_from, dt.date(2022, 12, 31))
+        self.assertEqual(observances[dt.date(2023, 12, 31)].primary.slug,
+                         'a')
+
+    def test_festival_on_ordinary_sunday(self):
+        obs = precedence.observance(dt.date(2024, 9, 29))
+        self.assertEqual(obs.primary.slug, 'st-michael-and-all-angels')
+        self.assertListEqual([f.slug for f in obs.secondary],
+                             ['trinity-xviii'])
+        self.assertIsNone(obs.transferred_from)
+
+    def test_lesser_feast_is_secondary(self):
+        obs = precedence.observance(dt.date(2024, 11, 10))
+        self.assertEqual(obs.primary.slug, 'trinity-xxiv')
+        self.assertListEqual([f.slug for f in obs.secondary],
+                             ['remembrance-sunday'])
+
+    def test_one_sunday_per_sunday(self):
+        # Trinity XXIV would also fall on Advent I in 2025
+        obs = precedence.observance(dt.date(2025, 11, 30))
+        self.assertEqual(obs.primary.slug, 'advent-i')
+        self.assertListEqual(obs.secondary, [])
+
+    def test_ranks(self):
+        self.assertEqual(precedence.rank(Feast.get(slug='easter-day'),
+                                         dt.date(2024, 3, 31)),
+                         Rank.PRINCIPAL)
+        self.assertEqual(precedence.rank(Feast.get(slug='lent-ii'),
+                                         dt.date(2024, 2, 25)),
+                         Rank.PRIVILEGED)
+        self.assertEqual(precedence.rank(Feast.get(slug='trinity-ii'),
+                                         dt.date(2024, 6, 9)),
+                         Rank.SUNDAY)
+        self.assertEqual(precedence.rank(Feast.get(slug='st-peter'),
+                                         dt.date(2024, 6, 29)),
+                         Rank.FESTIVAL)
+
+    def test_every_dated_feast_is_kept_somewhere(self):
+        for year in range(2020, 2030):
+            kept = set()
+            for obs in precedence.resolve_year(year).values():
+                kept.add(obs.primary.slug)
+                kept.update(f.slug for f in obs.secondary)
+            for feast in Feast.all():
+                if feast.get_date(year) is None or precedence.is_sunday(
+                        feast, feast.get_date(year)):
+                    continue
+                self.assertIn(feast.slug, kept, msg=f'{year}')
+
+    def test_cached_per_year_and_data_version(self):
+        table = precedence.resolve_year(2024)
+        self.assertIs(precedence.resolve_year(2024), table)
+        bump_data_version()
+        self.assertIsNot(precedence.resolve_year(2024), table)
+
+    def test_next_observance(self):
+        obs = precedence.next_observance(dt.date(2025, 12, 31))
+        self.assertEqual(obs.date, dt.date(2026, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
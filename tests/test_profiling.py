@@ -0,0 +1,62 @@
+import os
+import unittest
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from flask import request
+
+from profiling import ProfilingMiddleware, make_token
+from tests import create_test_app
+
+
+class TestProfilingMiddleware(TestCase):
+    def setUp(self) -> None:
+        self.tempdir = TemporaryDirectory()
+        self.app = create_test_app(self)
+
+        @self.app.route('/_test/args')
+        def args():
+            return ','.join(request.args)
+
+        self.app.wsgi_app = ProfilingMiddleware(
+            self.app.wsgi_app, self.app.config['SECRET_KEY'],
+            output_dir=self.tempdir.name, min_interval=60,
+        )
+        self.client = self.app.test_client()
+        self.token = make_token(self.app.config['SECRET_KEY'])
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def profiles(self):
+        return sorted(os.listdir(self.tempdir.name))
+
+    def test_unprofiled_request(self):
+        self.client.get('/feasts')
+        self.assertListEqual(self.profiles(), [])
+
+    def test_profile_with_header(self):
+        r = self.client.get('/feasts', headers={'X-PyPew-Profile': self.token})
+        self.assertEqual(r.status_code, 200)
+        profiles = self.profiles()
+        self.assertEqual(len(profiles), 2)
+        self.assertTrue(profiles[0].endswith('GET-feasts.prof'))
+        self.assertTrue(profiles[1].endswith('GET-feasts.txt'))
+
+    def test_profile_with_query_arg_hides_it_from_view(self):
+        r = self.client.get(f'/_test/args?x=1&_profile={self.token}')
+        self.assertEqual(r.text, 'x')
+        self.assertEqual(len(self.profiles()), 2)
+
+    def test_invalid_token(self):
+        self.client.get('/feasts', headers={'X-PyPew-Profile': 'nonsense'})
+        self.assertListEqual(self.profiles(), [])
+
+    def test_rate_limited(self):
+        self.client.get('/feasts', headers={'X-PyPew-Profile': self.token})
+        self.client.get('/feasts', headers={'X-PyPew-Profile': self.token})
+        self.assertEqual(len(self.profiles()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
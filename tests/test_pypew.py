@@ -1,19 +1,24 @@
+import threading
+import time
 import unittest
 from datetime import date
 from pathlib import Path
 from unittest.mock import patch
 from urllib.parse import urlencode
 
+import attr
 from dateutil.utils import today
 from flask import url_for
 from parameterized import parameterized
 
+import models
 import views
+from catalogue import bump_data_version
 from filters import english_date
-from models import Feast, Music, Service
+from models import DateRule, Feast, Music, Service
 from models_base import get
-from pypew import create_app
-from utils import advent
+from tests import create_test_app
+from utils import SingleFlightCache, advent, single_flight_cache
 
 
 def m_create_docx_impl(path):
@@ -43,6 +48,36 @@ class TestDates(unittest.TestCase):
     def test_get_date(self, name, year, expected_date):
         self.assertEqual(Feast.get(name=name).get_date(year), expected_date)
 
+    @parameterized.expand([
+        (2023, date(2023, 11, 12)),  # Saturday: the next day
+        (2024, date(2024, 11, 10)),  # Monday: the day before
+        (2029, date(2029, 11, 11)),  # Sunday
+    ])
+    def test_remembrance_sunday(self, year, expected_date):
+        feast = Feast.get(slug='remembrance-sunday')
+        self.assertEqual(feast.dateexpr, 'Sunday nearest 11 November')
+        self.assertEqual(feast.get_date(year), expected_date)
+
+    def test_get_dates(self):
+        years = range(2000, 2040)
+        for feast in Feast.all():
+            self.assertListEqual(feast.get_dates(years),
+                                 [feast.get_date(year) for year in years])
+
+    def test_date_rule(self):
+        self.assertEqual(DateRule(coeaster=1)(2026), date(2026, 4, 6))
+        self.assertEqual(DateRule(coadvent=-7)(2026), date(2026, 11, 22))
+        self.assertEqual(DateRule(dateexpr='Boxing Day')(2026),
+                         date(2026, 12, 26))
+        self.assertIsNone(DateRule()(2026))
+
+    def test_date_rule_rejects_bad_rules(self):
+        with self.assertRaises(ValueError):
+            DateRule(month=1, day=1, coeaster=1)
+        with self.assertRaises(ValueError):
+            Feast.from_dict('foo', {'name': 'Foo',
+                                    'dateexpr': 'Fooday nearest Easter'})
+
     @parameterized.expand([
         (date(2023, 9, 1), "Friday 1st September 2023"),
         (date(2023, 9, 2), "Saturday 2nd September 2023"),
@@ -61,6 +96,117 @@ class TestDates(unittest.TestCase):
         self.assertEqual(english_date(supplied_date), expected_string)
 
 
+class TestSingleFlightCache(unittest.TestCase):
+    def run_threads(self, target, n):
+        threads = [threading.Thread(target=target) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=10)
+
+    def test_computes_once_for_concurrent_callers(self):
+        cache = SingleFlightCache()
+        calls, results = [], []
+        barrier = threading.Barrier(8)
+
+        def compute():
+            calls.append(None)
+            time.sleep(0.05)
+            return 'value'
+
+        def call():
+            barrier.wait()
+            results.append(cache.get('key', compute))
+
+        self.run_threads(call, 8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 8)
+        info = cache.cache_info()
+        self.assertEqual((info.hits + info.misses, info.currsize), (8, 1))
+
+    def test_different_keys_do_not_wait(self):
+        cache = SingleFlightCache()
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(10)
+            return 'slow'
+
+        t = threading.Thread(target=cache.get, args=('slow', slow))
+        t.start()
+        started.wait(10)
+        self.assertEqual(cache.get('fast', lambda: 'fast'), 'fast')
+        release.set()
+        t.join(10)
+        self.assertEqual(cache.get('slow', lambda: 'other'), 'slow')
+
+    def test_exceptions_reach_waiters_and_are_not_cached(self):
+        cache = SingleFlightCache()
+        calls, errors = [], []
+        barrier = threading.Barrier(4)
+
+        def compute():
+            calls.append(None)
+            time.sleep(0.05)
+            raise RuntimeError('Boom')
+
+        def call():
+            barrier.wait()
+            try:
+                cache.get('key', compute)
+            except RuntimeError as e:
+                errors.append(e)
+
+        self.run_threads(call, 4)
+        self.assertEqual(len(errors), 4)
+        self.assertLess(len(calls), 4)
+        self.assertEqual(cache.get('key', lambda: 'value'), 'value')
+
+    def test_evicts_least_recently_used(self):
+        cache = SingleFlightCache(maxsize=2)
+        cache.get('a', lambda: 1)
+        cache.get('b', lambda: 2)
+        cache.get('a', lambda: None)
+        cache.get('c', lambda: 3)
+        self.assertEqual(cache.get('a', lambda: None), 1)
+        self.assertEqual(cache.get('b', lambda: 'again'), 'again')
+        self.assertEqual(cache.cache_info().currsize, 2)
+        cache.cache_clear()
+        self.assertEqual(cache.cache_info().currsize, 0)
+
+    def test_decorator(self):
+        calls = []
+
+        @single_flight_cache(maxsize=4)
+        def f(x, y=0):
+            calls.append((x, y))
+            return x + y
+
+        self.assertEqual(f(1, y=2), 3)
+        self.assertEqual(f(1, y=2), 3)
+        self.assertEqual(f(1), 1)
+        self.assertEqual(calls, [(1, 2), (1, 0)])
+        self.assertEqual(f.cache_info().hits, 1)
+
+    def test_calendar_resolved_once(self):
+        import precedence
+        precedence._resolve_year.cache_clear()
+        self.addCleanup(precedence._resolve_year.cache_clear)
+        barrier = threading.Barrier(6)
+
+        def slow_resolve(year):
+            time.sleep(0.05)
+            return {}
+
+        with patch('precedence._resolve', side_effect=slow_resolve) as m:
+            self.run_threads(
+                lambda: (barrier.wait(), precedence.resolve_year(2024)), 6
+            )
+        m.assert_called_once_with(2024)
+
+
 try:
     import pandas as pd
 except ImportError:
@@ -136,11 +282,68 @@ class TestModels(unittest.TestCase):
         service = Service(title='', date=today(), primary_feast=lent1)
         self.assertListEqual(service.collects, [lent1.collect, ash_wednesday.collect])
 
+    def test_derived_properties_are_memoised(self):
+        advent2 = get(Feast.all(), name='Advent II')
+        service = Service(title='', date=today(), primary_feast=advent2)
+        self.assertIs(service.items, service.items)
+        with patch('models.Feast.get') as m_get:
+            service.collects
+            m_get.assert_not_called()
+
+    def test_derived_properties_invalidated_by_assignment(self):
+        advent2 = get(Feast.all(), name='Advent II')
+        lent1 = get(Feast.all(), name='Lent I')
+        service = Service(title='', date=today(), primary_feast=advent2)
+        items = service.items
+        self.assertEqual(service.collects[0], advent2.collect)
+
+        service.primary_feast = lent1
+        self.assertEqual(service.collects[0], lent1.collect)
+        self.assertIsNot(service.items, items)
+
+    def _anthem_service(self):
+        return Service(
+            title='', date=today(),
+            primary_feast=get(Feast.all(), name='Advent II'),
+            secondary_feasts=[get(Feast.all(), name='St. Stephen')],
+            anthem=Music(title='Rorate caeli', category='Anthem',
+                         composer='Byrd', lyrics='Rorate caeli desuper',
+                         ref=None, translation=''),
+        )
+
+    def test_prerendered_richtext_matches_rendering(self):
+        service = self._anthem_service()
+        expected = [item.as_richtext().xml for item in service.items]
+        # Rendered again, from the cache
+        self.assertListEqual(
+            [item.as_richtext().xml for item in attr.evolve(service).items],
+            expected
+        )
+        models._richtext_fragments.cache_clear()
+        with patch('models.prerendered', side_effect=lambda k, r: r()):
+            self.assertListEqual(
+                [item.as_richtext().xml
+                 for item in attr.evolve(service).items],
+                expected
+            )
+
+    def test_prerendered_richtext_per_data_version(self):
+        service = self._anthem_service()
+        for item in service.items:
+            item.as_richtext()
+        fragments = models._richtext_fragments()
+        keys = list(fragments)
+        self.assertIn(('collect', service.collects[0]), keys)
+        # The anthem is specific to the service
+        self.assertFalse(any('Rorate caeli desuper' in str(k) for k in keys))
+
+        bump_data_version()
+        self.assertIsNot(models._richtext_fragments(), fragments)
+
 
 class TestViews(unittest.TestCase):
     def setUp(self) -> None:
-        self.app = create_app()
-        self.app.config['SERVER_NAME'] = 'localhost:5000'
+        self.app = create_test_app(self)
         self.app.app_context().push()
         self.client = self.app.test_client()
 
@@ -189,6 +392,40 @@ class TestViews(unittest.TestCase):
         r = self.client.get(endpoint)
         self.assertEqual(200, r.status_code, msg=f"Couldn't load {endpoint}")
 
+    def test_feast_on_api(self):
+        r = self.client.get(url_for('feast_on_api', date='2024-04-08'))
+        self.assertEqual(200, r.status_code)
+        self.assertEqual(r.json['primary']['slug'],
+                         'the-annunciation-of-the-bvm')
+        self.assertEqual(r.json['transferred_from'], '2024-03-25')
+
+    def test_feast_on_api_no_feast(self):
+        r = self.client.get(url_for('feast_on_api', date='2024-09-03'))
+        self.assertEqual(200, r.status_code)
+        self.assertIsNone(r.json)
+
+    def test_feast_on_api_bad_date(self):
+        r = self.client.get(url_for('feast_on_api', date='2024-13-01'))
+        self.assertEqual(400, r.status_code)
+
+    def test_pew_sheet_form_picks_feasts_from_date(self):
+        r = self.client.get(
+            url_for('pew_sheet_create_view', date='2024-09-29'))
+        self.assertEqual(200, r.status_code)
+        html = r.get_data(as_text=True)
+        self.assertIn('<option selected value="st-michael-and-all-angels">',
+                      html)
+        self.assertIn('<option selected value="trinity-xviii">', html)
+
+    def test_pew_sheet_form_no_feast_on_date(self):
+        # Nothing is kept on 3 September 2024, so no feast is suggested
+        r = self.client.get(
+            url_for('pew_sheet_create_view', date='2024-09-03'))
+        self.assertEqual(200, r.status_code)
+        html = r.get_data(as_text=True)
+        self.assertNotIn('<option selected', html)
+        self.assertIn('value="2024-09-03"', html)
+
     def test_feast_detail_view_handles_not_found(self):
         r = self.client.get(
             url_for('feast_detail_view', slug='notmas-day')
@@ -197,6 +434,9 @@ class TestViews(unittest.TestCase):
 
     @patch('pypew.views.feast_views.Feast.create_docx', side_effect=m_create_docx_impl)
     def test_feast_docx_view(self, m_create_docx):
+        # Don't keep the fake docx
+        models._feast_docx.cache_clear()
+        self.addCleanup(models._feast_docx.cache_clear)
         r = self.client.get(
             url_for('feast_docx_view', slug='christmas-day')
         )
@@ -213,6 +453,9 @@ class TestViews(unittest.TestCase):
 
     @patch('pypew.views.pew_sheet_views.Service.create_docx', side_effect=m_create_docx_impl)
     def test_pew_sheet_docx_view(self, m_create_docx):
+        cache = views.pew_sheet_views._docx_cache
+        cache.cache_clear()
+        self.addCleanup(cache.cache_clear)
         r = self.client.get(
             url_for('pew_sheet_docx_view') + '?' + urlencode(
                 {
@@ -0,0 +1,99 @@
+import threading
+import time
+import unittest
+from unittest import TestCase
+from unittest.mock import patch
+
+import metrics
+import models
+from render_limit import Overloaded, RenderLimiter
+from tests import create_test_app
+
+
+class TestRenderLimiter(TestCase):
+    def test_limits_concurrency(self):
+        limiter = RenderLimiter(concurrency=2, queue_size=10, timeout=5)
+        running, peak = [0], [0]
+        lock = threading.Lock()
+
+        def render():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+        threads = [threading.Thread(target=limiter.run, args=(render,))
+                   for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(metrics.render_queue_depth.get(), 0)
+
+    def test_rejects_when_queue_full(self):
+        limiter = RenderLimiter(concurrency=1, queue_size=0, timeout=5)
+        rejected = metrics.renders_rejected.get('queue_full')
+        with limiter.slot():
+            start = time.perf_counter()
+            with self.assertRaises(Overloaded) as cm:
+                limiter.run(lambda: None)
+            self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(cm.exception.reason, 'queue_full')
+        self.assertEqual(cm.exception.retry_after, 5)
+        self.assertEqual(metrics.renders_rejected.get('queue_full'),
+                         rejected + 1)
+        self.assertEqual(limiter.run(lambda: 'done'), 'done')
+
+    def test_times_out_in_queue(self):
+        limiter = RenderLimiter(concurrency=1, queue_size=1, timeout=0.05)
+        with limiter.slot():
+            with self.assertRaises(Overloaded) as cm:
+                limiter.run(lambda: None)
+        self.assertEqual(cm.exception.reason, 'timeout')
+        self.assertEqual(cm.exception.retry_after, 1)
+
+    def test_waits_for_a_slot(self):
+        limiter = RenderLimiter(concurrency=1, queue_size=1, timeout=5)
+        waits = metrics.render_wait.count()
+        release = threading.Event()
+        started = threading.Event()
+
+        def hold():
+            with limiter.slot():
+                started.set()
+                release.wait(10)
+
+        t = threading.Thread(target=hold)
+        t.start()
+        started.wait(10)
+        threading.Timer(0.05, release.set).start()
+        self.assertEqual(limiter.run(lambda: 'done'), 'done')
+        t.join(10)
+        self.assertEqual(metrics.render_wait.count(), waits + 2)
+
+
+class TestOverloadedResponse(TestCase):
+    def setUp(self) -> None:
+        self.app = create_test_app(self)
+        self.client = self.app.test_client()
+        models._feast_docx.cache_clear()
+        self.addCleanup(models._feast_docx.cache_clear)
+
+    def test_503_when_overloaded(self):
+        limiter = RenderLimiter(concurrency=1, queue_size=0, timeout=3)
+        with patch('render_limit.limiter', limiter), limiter.slot():
+            r = self.client.get('/feast/christmas-day/docx')
+            self.assertEqual(r.status_code, 503)
+            self.assertEqual(r.headers['Retry-After'], '3')
+            # Cheap requests are not held up
+            r = self.client.get('/feasts/api/upcoming')
+            self.assertEqual(r.status_code, 200)
+        r = self.client.get('/feast/christmas-day/docx')
+        self.assertEqual(r.status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import TestCase
+from unittest.mock import patch
+
+from flask import Flask
+
+import pypew
+import warmup
+from models import Feast
+from pypew import create_app
+from tests import create_test_app, isolate_stores
+
+try:
+    import server
+except ImportError:  # gunicorn is not available on Windows
+    server = None
+
+
+class TestWarmup(TestCase):
+    def test_warm(self):
+        timings = warmup.warm()
+        self.assertListEqual(list(timings), [name for name, _ in warmup.STEPS])
+        for ms in timings.values():
+            self.assertGreaterEqual(ms, 0)
+
+    def test_warm_with_app(self):
+        app = create_test_app(self)
+        timings = warmup.warm(app)
+        self.assertListEqual(
+            list(timings),
+            [name for name, _ in warmup.STEPS + warmup.APP_STEPS]
+        )
+        with patch('models.Feast.create_docx') as m_create_docx:
+            Feast.get(slug='easter-day').docx()
+        m_create_docx.assert_not_called()
+        with patch('views.feast_views.jsonify') as m_jsonify:
+            app.test_client().get('/feasts/api')
+        m_jsonify.assert_not_called()
+
+    @patch('warmup.warm')
+    def test_startup_hook(self, m_warm):
+        isolate_stores(self)
+        with patch.dict(os.environ, {'PYPEW_WARM': '1'}):
+            app = create_app()
+        m_warm.assert_called_once_with(app)
+        m_warm.reset_mock()
+        create_app()
+        m_warm.assert_not_called()
+
+    @patch('warmup.warm', return_value={'calendar': 1.5, 'hymns': 20.25})
+    def test_warm_command(self, m_warm):
+        isolate_stores(self)
+        out = StringIO()
+        with redirect_stdout(out):
+            pypew.main(['warm'])
+        m_warm.assert_called_once()
+        self.assertIn('calendar', out.getvalue())
+        self.assertIn('21.8 ms', out.getvalue())
+
+
+@unittest.skipIf(server is None, 'gunicorn not available')
+class TestServer(TestCase):
+    def test_options(self):
+        s = server.PyPewServer({'bind': '127.0.0.1:8123', 'workers': 3,
+                                'threads': 4, 'timeout': None})
+        self.assertTrue(s.cfg.preload_app)
+        self.assertListEqual(s.cfg.bind, ['127.0.0.1:8123'])
+        self.assertEqual(s.cfg.workers, 3)
+        self.assertEqual(s.cfg.threads, 4)
+        # Unspecified options keep gunicorn's defaults
+        self.assertEqual(s.cfg.timeout, 30)
+
+    @patch('server.gc')
+    @patch('server.warmup.warm')
+    def test_load_warms_caches(self, m_warm, m_gc):
+        isolate_stores(self)
+        app = server.PyPewServer().load()
+        self.assertIsInstance(app, Flask)
+        m_warm.assert_called_once_with(app)
+        m_gc.freeze.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+import datetime as dt
+import unittest
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+from urllib.parse import urlencode
+
+from flask import url_for
+
+import models
+from models import Feast, Service
+from service_store import ServiceStore
+from tests import create_test_app
+
+
+def remove_feast(slug):
+    """Pretend that the feast has been removed from the catalogue."""
+    feasts = dict(models._feasts_by_slug())
+    del feasts[slug]
+    return patch('models._feasts_by_slug', return_value=feasts)
+
+
+def make_service(date, slug='advent-i', celebrant='Fr X'):
+    return Service(title='', date=date, primary_feast=Feast.get(slug=slug),
+                   celebrant=celebrant)
+
+
+class TestServiceStore(TestCase):
+    def setUp(self) -> None:
+        self.tempdir = TemporaryDirectory()
+        self.store = ServiceStore(f'{self.tempdir.name}/services.sqlite3')
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def test_add_is_idempotent(self):
+        service = make_service(dt.date(2022, 11, 27))
+        first = self.store.add(service, 'a=1')
+        second = self.store.add(service, 'a=1')
+        self.assertEqual(first, second)
+        self.assertEqual(self.store.count(), 1)
+
+    def test_roundtrip(self):
+        service = make_service(dt.date(2022, 11, 27))
+        service.secondary_feasts = [Feast.get(slug='st-andrew')]
+        service_id = self.store.add(service, 'a=1')
+        stored = self.store.get(service_id)
+        self.assertEqual(stored.query, 'a=1')
+        self.assertEqual(stored.service, service)
+
+    def test_queries(self):
+        self.store.add(make_service(dt.date(2022, 11, 27)), 'a=1')
+        self.store.add(make_service(dt.date(2022, 12, 4), 'advent-ii'), 'a=2')
+        self.store.add(make_service(dt.date(2022, 12, 11), 'advent-iii',
+                                    celebrant='Fr Y'), 'a=3')
+
+        self.assertEqual(
+            [ss.query for ss in self.store.in_month(2022, 12)],
+            ['a=2', 'a=3']
+        )
+        self.assertEqual(
+            [ss.query for ss in self.store.by_celebrant('Fr X')],
+            ['a=1', 'a=2']
+        )
+        self.assertEqual(
+            [ss.query for ss in self.store.query(primary_feast='advent-ii')],
+            ['a=2']
+        )
+        self.assertEqual(
+            [ss.query for ss in self.store.query(limit=2, offset=1)],
+            ['a=2', 'a=3']
+        )
+
+    def test_feast_removed(self):
+        kept = self.store.add(make_service(dt.date(2022, 11, 27)), 'a=1')
+        removed = self.store.add(
+            make_service(dt.date(2022, 11, 30), 'st-andrew'), 'a=2'
+        )
+        with remove_feast('st-andrew'), \
+                self.assertLogs('pypew', 'WARNING'):
+            self.assertIsNone(self.store.get(removed))
+            self.assertEqual(
+                [ss.id for ss in self.store.get_many([kept, removed])],
+                [kept]
+            )
+            self.assertEqual([ss.id for ss in self.store.query()], [kept])
+
+
+class TestServiceViews(TestCase):
+    def setUp(self) -> None:
+        self.tempdir = TemporaryDirectory()
+        self.app = create_test_app(self)
+        self.store = ServiceStore(f'{self.tempdir.name}/services.sqlite3')
+        self.app.extensions['service_store'] = self.store
+        self.app.app_context().push()
+        self.client = self.app.test_client()
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def test_creating_a_service_stores_it(self):
+        args = {
+            'title': 'Advent I',
+            'date': '2022-11-27',
+            'time': '11:00',
+            'primary_feast': 'advent-i',
+            'celebrant': 'Fr X',
+            'introit_hymn': '',
+            'offertory_hymn': '',
+            'recessional_hymn': '',
+            'anthem_group-translation': '',
+        }
+        r = self.client.get(url_for('pew_sheet_create_view') + '?'
+                            + urlencode(args))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(self.store.count(celebrant='Fr X'), 1)
+
+    def test_services_differing_in_a_second_secondary_feast(self):
+        args = {
+            'title': 'Advent I',
+            'date': '2022-11-27',
+            'time': '11:00',
+            'primary_feast': 'advent-i',
+            'introit_hymn': '',
+            'offertory_hymn': '',
+            'recessional_hymn': '',
+            'anthem_group-translation': '',
+        }
+        for second in ['christmas-day', 'easter-day']:
+            query = urlencode(dict(args, secondary_feasts=['st-andrew',
+                                                           second]),
+                              doseq=True)
+            r = self.client.get(url_for('pew_sheet_create_view') + '?'
+                                + query)
+            self.assertEqual(r.status_code, 200)
+
+        services = self.store.query()
+        self.assertEqual(len(services), 2)
+        self.assertEqual(
+            [[f.slug for f in ss.service.secondary_feasts]
+             for ss in services],
+            [['st-andrew', 'christmas-day'], ['st-andrew', 'easter-day']]
+        )
+        for ss in services:
+            self.assertEqual(ss.query.count('secondary_feasts='), 2)
+
+    def test_service_index_api(self):
+        for day in range(1, 6):
+            self.store.add(make_service(dt.date(2022, 12, day)), f'a={day}')
+
+        r = self.client.get(url_for('service_index_api', month='2022-12',
+                                    page=2, per_page=2))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json['total'], 5)
+        self.assertEqual(
+            [s['date'] for s in r.json['services']],
+            ['2022-12-03', '2022-12-04']
+        )
+
+    def test_service_index_api_bad_query(self):
+        r = self.client.get(url_for('service_index_api', month='December'))
+        self.assertEqual(r.status_code, 400)
+
+    def test_service_detail_api(self):
+        service_id = self.store.add(make_service(dt.date(2022, 12, 1)), 'a=1')
+        r = self.client.get(url_for('service_detail_api',
+                                    service_id=service_id))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json['primary_feast'], 'advent-i')
+
+        r = self.client.get(url_for('service_detail_api',
+                                    service_id=service_id + 1))
+        self.assertEqual(r.status_code, 404)
+
+    def test_feast_removed(self):
+        service_id = self.store.add(
+            make_service(dt.date(2022, 11, 30), 'st-andrew'), 'a=1'
+        )
+        with self.client.session_transaction() as session:
+            session['previousPewSheets'] = [service_id]
+
+        with remove_feast('st-andrew'), \
+                self.assertLogs('pypew', 'WARNING'):
+            r = self.client.get(url_for('service_detail_api',
+                                        service_id=service_id))
+            self.assertEqual(r.status_code, 404)
+            r = self.client.get(url_for('service_index_api'))
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.json['services'], [])
+            r = self.client.get(url_for('pew_sheet_create_view'))
+            self.assertEqual(r.status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
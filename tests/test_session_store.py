@@ -0,0 +1,89 @@
+import time
+import unittest
+from tempfile import TemporaryDirectory
+from datetime import timedelta
+from unittest import TestCase
+from unittest.mock import patch
+
+from flask import session
+
+from session_store import MemorySessionStore, SQLiteSessionStore, \
+    ServerSideSessionInterface
+from tests import create_test_app
+
+
+class TestSessionStores(TestCase):
+    def check_store(self, store):
+        store.save('abc', '{"x": 1}', time.time() + 60)
+        self.assertEqual(store.load('abc')[0], '{"x": 1}')
+
+        store.save('old', '{}', time.time() - 1)
+        self.assertIsNone(store.load('old'))
+        self.assertEqual(store.compact(), 1)
+
+        store.delete('abc')
+        self.assertIsNone(store.load('abc'))
+
+    def test_memory_store(self):
+        self.check_store(MemorySessionStore())
+
+    def test_sqlite_store(self):
+        with TemporaryDirectory() as d:
+            self.check_store(SQLiteSessionStore(f'{d}/sessions.sqlite3'))
+
+    def test_sqlite_store_reconnects_after_fork(self):
+        with TemporaryDirectory() as d:
+            store = SQLiteSessionStore(f'{d}/sessions.sqlite3')
+            conn = store._connection()
+            self.assertIs(store._connection(), conn)
+            with patch('session_store.os.getpid', return_value=-1):
+                self.assertIsNot(store._connection(), conn)
+
+
+class TestServerSideSessions(TestCase):
+    def setUp(self) -> None:
+        self.app = create_test_app(self)
+        self.store = MemorySessionStore()
+        self.app.session_interface = ServerSideSessionInterface(self.store)
+
+        @self.app.route('/_test/set/<value>')
+        def set_value(value):
+            session['value'] = value
+            return ''
+
+        @self.app.route('/_test/get')
+        def get_value():
+            return session.get('value', '')
+
+        @self.app.route('/_test/clear')
+        def clear_value():
+            session.clear()
+            return ''
+
+        self.client = self.app.test_client()
+
+    def test_cookie_only_holds_session_id(self):
+        r = self.client.get('/_test/set/' + 'x' * 2000)
+        self.assertLess(len(r.headers['Set-Cookie']), 200)
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(self.client.get('/_test/get').text, 'x' * 2000)
+
+    def test_forged_session_id_is_ignored(self):
+        self.client.get('/_test/set/foo')
+        sid = next(iter(self.store._data))
+        self.client.set_cookie('localhost', 'session', sid)
+        self.assertEqual(self.client.get('/_test/get').text, '')
+
+    def test_expired_session_is_dropped(self):
+        self.app.permanent_session_lifetime = timedelta(seconds=-1)
+        self.client.get('/_test/set/foo')
+        self.assertEqual(self.client.get('/_test/get').text, '')
+
+    def test_clearing_session_removes_it_from_store(self):
+        self.client.get('/_test/set/foo')
+        self.client.get('/_test/clear')
+        self.assertEqual(len(self.store), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
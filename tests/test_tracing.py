@@ -0,0 +1,77 @@
+import os
+import unittest
+from datetime import date
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from flask import url_for
+
+import tracing
+from models import Feast, Service
+from tracing import span
+from tests import create_test_app
+
+
+class TestSpans(TestCase):
+    def setUp(self) -> None:
+        tracing.buffer.clear()
+
+    def test_nested_spans(self):
+        with span('outer') as outer:
+            with span('inner', x=1) as inner:
+                pass
+        self.assertEqual(inner.parent_id, outer.span_id)
+        self.assertEqual(inner.trace_id, outer.trace_id)
+        self.assertEqual(inner.attributes, {'x': 1})
+        self.assertIsNone(outer.parent_id)
+        self.assertGreaterEqual(outer.duration_ms, inner.duration_ms)
+        self.assertListEqual(tracing.recent(), [outer, inner])
+
+    @patch('models._pew_sheet_skeleton', return_value=None)
+    def test_create_docx_stages(self, m_skeleton):
+        service = Service(title='', date=date(2022, 11, 27),
+                          primary_feast=Feast.get(slug='advent-i'))
+        with TemporaryDirectory() as d:
+            service.create_docx(os.path.join(d, 'service.docx'))
+        names = {s.name for s in tracing.recent()}
+        for stage in ['Service.create_docx', 'docx.load_template',
+                      'docx.jinja_env', 'docx.render', 'Service.items',
+                      'as_richtext', 'docx.save']:
+            self.assertIn(stage, names)
+
+    def test_create_docx_skeleton_stages(self):
+        service = Service(title='', date=date(2022, 11, 27),
+                          primary_feast=Feast.get(slug='advent-i'))
+        with TemporaryDirectory() as d:
+            service.create_docx(os.path.join(d, 'service.docx'))
+        names = {s.name for s in tracing.recent()}
+        for stage in ['Service.create_docx', 'docx.skeleton_render',
+                      'Service.items', 'as_richtext']:
+            self.assertIn(stage, names)
+        self.assertNotIn('docx.render', names)
+
+
+class TestDebugTracesApi(TestCase):
+    def setUp(self) -> None:
+        self.app = create_test_app(self)
+        self.app.app_context().push()
+        self.client = self.app.test_client()
+
+    def test_hidden_unless_enabled(self):
+        self.app.debug = False
+        self.app.config['DEBUG_ENDPOINTS'] = False
+        r = self.client.get(url_for('debug_traces_api'))
+        self.assertEqual(r.status_code, 404)
+
+    def test_request_spans(self):
+        self.app.debug = True
+        self.client.get(url_for('feast_index_view'))
+        r = self.client.get(url_for('debug_traces_api', name='request'))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json[0]['attributes']['endpoint'],
+                         'feast_index_view')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+"""Lightweight tracing spans.
+
+Wrap a stage of work in ``with span('name', key=value):`` to time it.
+Spans nest, so that a span opened inside another one records it as its
+parent, and spans opened while handling a request share the request's
+trace id. Finished spans go into an in-memory ring buffer, which is
+shown at /debug/traces when the app is in debug mode or
+PYPEW_DEBUG_ENDPOINTS is set, and are also logged as JSON lines to the
+'pypew.trace' logger at DEBUG level (set PYPEW_TRACE_LOG to see them).
+"""
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, List, Optional
+
+from attr import define, field
+from flask import g, request
+
+trace_logger = logging.getLogger('pypew.trace')
+if os.environ.get('PYPEW_TRACE_LOG'):
+    trace_logger.setLevel(logging.DEBUG)
+
+buffer: Deque['Span'] = deque(
+    maxlen=int(os.environ.get('PYPEW_TRACE_BUFFER', 2000))
+)
+
+_current: ContextVar[Optional['Span']] = ContextVar('pypew_span', default=None)
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+@define
+class Span:
+    name: str = field()
+    trace_id: str = field()
+    span_id: str = field(factory=_new_id)
+    parent_id: Optional[str] = field(default=None)
+    start: float = field(factory=time.time)
+    duration_ms: Optional[float] = field(default=None)
+    attributes: dict = field(factory=dict)
+    _t0: float = field(factory=time.perf_counter, repr=False)
+    _token: object = field(default=None, repr=False)
+
+    def finish(self) -> None:
+        self.duration_ms = (time.perf_counter() - self._t0) * 1000
+        if self._token is not None:
+            try:
+                _current.reset(self._token)
+            except ValueError:
+                # Finished in a different context from the one it was
+                # started in
+                _current.set(None)
+            self._token = None
+        buffer.append(self)
+        if trace_logger.isEnabledFor(logging.DEBUG):
+            trace_logger.debug(json.dumps(self.as_dict()))
+
+    def as_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': self.start,
+            'duration_ms': self.duration_ms,
+            'attributes': self.attributes,
+        }
+
+
+def start_span(name: str, **attributes) -> Span:
+    """Start a span and make it the current one. It must be finished by
+    calling its finish method, in the same context.
+    """
+    parent = _current.get()
+    s = Span(
+        name=name,
+        trace_id=parent.trace_id if parent is not None else _new_id(),
+        parent_id=parent.span_id if parent is not None else None,
+        attributes=attributes,
+    )
+    s._token = _current.set(s)
+    return s
+
+
+@contextmanager
+def span(name: str, **attributes):
+    s = start_span(name, **attributes)
+    try:
+        yield s
+    finally:
+        s.finish()
+
+
+def recent(name: Optional[str] = None,
+           trace_id: Optional[str] = None,
+           limit: int = 200) -> List[Span]:
+    """The most recently finished spans, newest first."""
+    out = []
+    # Copy first: other threads may append while we iterate
+    for s in reversed(list(buffer)):
+        if name is not None and not s.name.startswith(name):
+            continue
+        if trace_id is not None and s.trace_id != trace_id:
+            continue
+        out.append(s)
+        if len(out) >= limit:
+            break
+    return out
+
+
+def endpoint_enabled(app) -> bool:
+    return bool(app.debug or app.config.get('DEBUG_ENDPOINTS'))
+
+
+def init_app(app) -> None:
+    """Open a span for each request, so that the spans of each request
+    share a trace id.
+    """
+
+    def _start_request_span():
+        g.trace_span = start_span('request', method=request.method,
+                                  path=request.path,
+                                  endpoint=request.endpoint)
+
+    def _finish_request_span(exc):
+        s = g.pop('trace_span', None)
+        if s is not None:
+            s.finish()
+
+    app.before_request(_start_request_span)
+    app.teardown_request(_finish_request_span)
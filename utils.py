@@ -1,13 +1,18 @@
 import logging
 import os
+import threading
 from datetime import timedelta, date
-from functools import lru_cache
+from collections import OrderedDict, namedtuple
+from functools import wraps
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, Hashable, Optional, TypeVar
 
 from appdirs import AppDirs
 
 
+T = TypeVar('T')
+
+
 class NoPandasError(RuntimeError):
     pass
 
@@ -28,7 +33,134 @@ def str2date(s: Optional[str]) -> date:
     return date.fromisoformat(s)
 
 
-@lru_cache()
+def keyed_cache(key: Callable[[], Hashable]):
+    """Cache the result of a function of no arguments until key()
+    returns something different.
+    """
+
+    def decorator(f):
+        lock = threading.Lock()
+        cached = {}
+
+        @wraps(f)
+        def wrapper():
+            k = key()
+            entry = cached.get('entry')
+            if entry is None or entry[0] != k:
+                with lock:
+                    entry = cached.get('entry')
+                    if entry is None or entry[0] != k:
+                        entry = cached['entry'] = (k, f())
+            return entry[1]
+
+        wrapper.cache_clear = cached.clear
+        return wrapper
+
+    return decorator
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class _Flight:
+    """One computation, which other callers can wait for."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlightCache:
+    """A thread-safe LRU cache in which concurrent callers asking for
+    the same missing key wait for one computation of it, rather than
+    each computing it. Exceptions are passed to every waiting caller
+    and are not cached.
+    """
+
+    def __init__(self, maxsize: Optional[int] = 128) -> None:
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._results: 'OrderedDict[Hashable, object]' = OrderedDict()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable, compute: Callable[[], T]) -> T:
+        with self._lock:
+            try:
+                value = self._results[key]
+            except KeyError:
+                pass
+            else:
+                self._results.move_to_end(key)
+                self._hits += 1
+                return value
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._misses += 1
+            else:
+                self._hits += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        else:
+            with self._lock:
+                self._results[key] = flight.value
+                if self.maxsize is not None:
+                    while len(self._results) > self.maxsize:
+                        self._results.popitem(last=False)
+            return flight.value
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self.maxsize,
+                             len(self._results))
+
+    def cache_clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+            self._hits = self._misses = 0
+
+
+def single_flight_cache(maxsize: Optional[int] = 128):
+    """Like functools.lru_cache, but using a SingleFlightCache, so that
+    a function is never running for the same arguments in two threads
+    at once.
+    """
+
+    def decorator(f):
+        cache = SingleFlightCache(maxsize)
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            return cache.get(key, lambda: f(*args, **kwargs))
+
+        wrapper.cache_info = cache.cache_info
+        wrapper.cache_clear = cache.cache_clear
+        return wrapper
+
+    return decorator
+
+
+@single_flight_cache()
 def get_neh_df():
     try:
         import pandas as pd
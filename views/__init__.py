@@ -1,11 +1,17 @@
+import tracemalloc
 from traceback import format_exc
 
-from flask import (make_response, render_template, request)
+from flask import (Response, abort, current_app, jsonify, make_response,
+                   render_template, request)
 
 import dateexpr
+import memreport
+import metrics
+import tracing
 from utils import logger
 from .feast_views import *
 from .pew_sheet_views import *
+from .service_views import *
 
 
 def index_view():
@@ -16,9 +22,62 @@ def acknowledgements_view():
     return render_template('acknowledgements.html')
 
 
+def metrics_view():
+    return Response(metrics.registry.render(),
+                    mimetype='text/plain; version=0.0.4')
+
+
+def debug_traces_api():
+    """Recently finished tracing spans, newest first. Filter with name
+    (a prefix) and trace_id.
+    """
+    if not tracing.endpoint_enabled(current_app):
+        abort(404)
+    spans = tracing.recent(
+        name=request.args.get('name'),
+        trace_id=request.args.get('trace_id'),
+        limit=int(request.args.get('limit', 200)),
+    )
+    return jsonify([s.as_dict() for s in spans])
+
+
+def debug_memory_api():
+    """The memory kept by each part of the app (see memreport). POST
+    to take a baseline to compare later reports against. Only there if
+    an admin secret is set, and needs an admin token.
+    """
+    secret = memreport.admin_secret(current_app.config['ADMIN_SECRET'],
+                                    current_app.config['SECRET_KEY'])
+    if secret is None:
+        abort(404)
+    token = request.headers.get(memreport.ADMIN_HEADER)
+    if not memreport.is_admin(token, secret):
+        return make_response(jsonify(error='Needs an admin token'), 403)
+    if not tracemalloc.is_tracing():
+        return make_response(jsonify(
+            error='Memory is not being traced. Set PYPEW_TRACEMALLOC.'
+        ), 409)
+    if request.method == 'POST':
+        memreport.set_baseline()
+    return jsonify(memreport.report())
+
+
 def internal_error_handler(error):
     logger.exception(error)
-    return make_response(render_template('exception.html', error=format_exc()), 500)
+    return make_response(
+        render_template('exception.html', error=format_exc()), 500
+    )
+
+
+def overloaded_handler(error):
+    """Refuse quickly, rather than rendering an error page."""
+    response = make_response(
+        'Too many documents are being made right now. Please try again '
+        'in a few seconds.', 503
+    )
+    response.headers['Retry-After'] = str(error.retry_after)
+    response.mimetype = 'text/plain'
+    return response
 
 
 def not_found_handler(error):
@@ -34,20 +93,10 @@ def dateexpr_view():
         date = None
         error = repr(e)
 
-    examples = [
-        "4th Sunday before Christmas",
-        "Epiphany",
-        "1st Sunday after 13 days after Christmas",
-        "Easter",
-        "Easter Monday",
-        "17 weeks after Easter",
-        "11 November",
-        "Remembrance Sunday",
-    ]
     return render_template(
         'dateexpr.html',
         dexpr=dexpr or "",
         date=date,
         error=error,
-        examples=examples
+        examples=dateexpr.examples
     )
@@ -1,20 +1,33 @@
 import datetime
-import os
-import uuid
-from tempfile import TemporaryDirectory
+import hashlib
+import json
+from functools import lru_cache
+from io import BytesIO
+from typing import Tuple
 
-import cattrs
-from flask import (flash, make_response, render_template, send_file,
-                   request, jsonify)
+from flask import (Response, flash, make_response, render_template,
+                   send_file, request, jsonify, url_for)
 
+import ical
+from catalogue import data_version
 from filters import english_date
+from metrics import register_lru_cache
 from models import Feast
-from models_base import NotFoundError, get
-from utils import str2date, cache_dir
+from models_base import NotFoundError
+from precedence import observance
+from utils import keyed_cache, str2date
 
 __all__ = ['feast_index_view', 'feast_index_api', 'feast_date_api',
            'feast_upcoming_api', 'feast_detail_view', 'feast_detail_api',
-           'feast_docx_view']
+           'feast_docx_view', 'feast_calendar_ics', 'feast_on_api']
+
+DOCX_MIMETYPE = ('application/vnd.openxmlformats-officedocument'
+                 '.wordprocessingml.document')
+ICS_MAX_YEARS = 20
+ICS_CACHE_SIZE = 64
+
+# (year range, feasts, feast data, host) -> feed
+_ics_cache = ical.FeedCache(ICS_CACHE_SIZE)
 
 
 def feast_index_view():
@@ -24,9 +37,32 @@ def feast_index_view():
     )
 
 
+def _json_response(body: bytes) -> Response:
+    return Response(body, mimetype='application/json')
+
+
+@keyed_cache(data_version)
+def feast_index_json() -> bytes:
+    """The body of the feast index API, which includes every proper
+    text, so it is only serialised once per feast data version.
+    """
+    return jsonify([feast.as_dict() for feast in Feast.all()]).get_data()
+
+
+@lru_cache(maxsize=512)
+def _feast_detail_json(slug: str, version: int) -> bytes:
+    return jsonify(Feast.get(slug=slug).as_dict()).get_data()
+
+
+def feast_detail_json(slug: str) -> bytes:
+    return _feast_detail_json(slug, data_version())
+
+
+register_lru_cache('feast_json', _feast_detail_json)
+
+
 def feast_index_api():
-    feasts = Feast.all()
-    return jsonify(cattrs.unstructure(feasts))
+    return _json_response(feast_index_json())
 
 
 def feast_upcoming_api():
@@ -51,10 +87,27 @@ def feast_upcoming_api():
     } for n, f in sorted_feasts])
 
 
+def feast_on_api():
+    """API to get the feasts kept on the specified date (by default
+    today), or null if there are none.
+    """
+    s = request.args.get('date')
+    if s is not None:
+        try:
+            date = str2date(s)
+        except ValueError:
+            return make_response(f'Bad date {s}', 400)
+    else:
+        date = datetime.date.today()
+
+    obs = observance(date)
+    return jsonify(obs.as_dict() if obs else None)
+
+
 def feast_date_api(slug):
     try:
         year = request.args.get('year')
-        feast = Feast.from_yaml(slug)
+        feast = Feast.get(slug=slug)
         date = feast.get_date(year=year)
         return jsonify(date.isoformat() if date else None)
     except NotFoundError:
@@ -64,7 +117,7 @@ def feast_date_api(slug):
 def feast_detail_view(slug):
     try:
         feasts = Feast.all()
-        feast = get(feasts, slug=slug)
+        feast = Feast.get(slug=slug)
     except NotFoundError:
         flash(f'Feast {slug} not found.', 'warning')
         return make_response(feast_index_view(), 404)
@@ -74,13 +127,12 @@ def feast_detail_view(slug):
 
 def feast_detail_api(slug):
     try:
-        feasts = Feast.all()
-        feast = get(feasts, slug=slug)
+        feast = Feast.get(slug=slug)
     except NotFoundError:
         flash(f'Feast {slug} not found.', 'warning')
         return make_response(feast_index_view(), 404)
 
-    return jsonify(cattrs.unstructure(feast))
+    return _json_response(feast_detail_json(feast.slug))
 
 
 def feast_docx_view(slug):
@@ -91,8 +143,74 @@ def feast_docx_view(slug):
         return make_response(feast_index_view(), 404)
 
     filename = f'{feast.name}.docx'
-    temp_docx = os.path.join(cache_dir, f"feast_{str(uuid.uuid4())}.docx")
-    feast.create_docx(path=temp_docx)
     return send_file(
-        temp_docx, as_attachment=True, download_name=filename
+        BytesIO(feast.docx()), as_attachment=True, download_name=filename,
+        mimetype=DOCX_MIMETYPE
     )
+
+
+@keyed_cache(data_version)
+def _feasts_signature() -> str:
+    """A hash of everything about the feasts that goes into a feed, so
+    that feeds get new ETags when the feasts change, even across
+    restarts.
+    """
+    return hashlib.sha1(json.dumps([
+        [f.slug, f.name, f.month, f.day, f.coeaster, f.coadvent, f.dateexpr]
+        for f in Feast.all()
+    ]).encode()).hexdigest()
+
+
+def _ics_years() -> Tuple[int, int]:
+    """The start and end years asked for, raising ValueError with a
+    message if they are bad.
+    """
+    this_year = datetime.date.today().year
+    try:
+        start = int(request.args.get('start', this_year))
+        end = int(request.args.get('end', start + 1))
+    except ValueError:
+        raise ValueError('start and end must be years')
+    if not (1 <= start <= end <= 9999):
+        raise ValueError(f'Bad year range {start} to {end}')
+    if end - start >= ICS_MAX_YEARS:
+        raise ValueError(f'At most {ICS_MAX_YEARS} years at a time')
+    return start, end
+
+
+def feast_calendar_ics():
+    """The feasts as an iCalendar feed, for the years start to end
+    inclusive (by default this year and next), optionally only for the
+    feasts given by one or more feast=<slug> parameters. See ical for
+    how it is cached.
+    """
+    try:
+        start, end = _ics_years()
+    except ValueError as exc:
+        return make_response(str(exc), 400)
+
+    slugs = tuple(sorted(set(request.args.getlist('feast'))))
+    feasts = []
+    for slug in slugs:
+        try:
+            feasts.append(Feast.get(slug=slug))
+        except NotFoundError:
+            return make_response(f'Feast {slug} not found', 404)
+    feasts = feasts or Feast.all()
+
+    def events():
+        for year in range(start, end + 1):
+            for feast in feasts:
+                date = feast.get_date(year=year)
+                if date is None:
+                    continue
+                yield ical.Event(
+                    uid=f'{feast.slug}-{date:%Y%m%d}@pypew',
+                    date=date,
+                    summary=feast.name,
+                    url=url_for('feast_detail_view', slug=feast.slug,
+                                _external=True),
+                )
+
+    key = (start, end, slugs, _feasts_signature(), request.host_url)
+    return ical.feed_response(_ics_cache, key, events)
@@ -1,5 +1,5 @@
 import os
-import uuid
+from io import BytesIO
 from urllib.parse import parse_qs, urlencode
 
 import dotenv
@@ -7,48 +7,89 @@ from flask import (flash, make_response, redirect, render_template, request,
                    send_file, session, url_for)
 from werkzeug.datastructures import ImmutableMultiDict
 
+from catalogue import data_version
 from forms import PewSheetForm
-from models import Feast, Service
-from utils import cache_dir, logger
+from metrics import register_lru_cache
+from models import Service
+from precedence import next_observance, observance
+from service_store import get_service_store
+from utils import SingleFlightCache, logger
+from views.feast_views import DOCX_MIMETYPE
 
-__all__ = ['pew_sheet_create_view', 'pew_sheet_clear_history_endpoint', 'pew_sheet_docx_view']
+__all__ = ['pew_sheet_create_view', 'pew_sheet_clear_history_endpoint',
+           'pew_sheet_docx_view']
 
 dotenv.load_dotenv()
 COOKIE_NAME = os.environ.get('COOKIE_NAME', 'previousPewSheets')
+DOCX_CACHE_SIZE = 32
+
+_docx_cache = SingleFlightCache(maxsize=DOCX_CACHE_SIZE)
+register_lru_cache('pew_sheet_docx', _docx_cache)
+
+
+def _query_string(args) -> str:
+    """The query string for the form data, keeping every value of keys
+    such as secondary_feasts that can have several.
+    """
+    return urlencode(list(args.items(multi=True)))
+
+
+def _stored_history(store):
+    """The ids of the services in the session history. Older sessions
+    stored query strings instead, which are added to the store here.
+    """
+    service_ids = []
+    for x in session.get(COOKIE_NAME, []):
+        if isinstance(x, int):
+            service_ids.append(x)
+            continue
+
+        try:
+            args = ImmutableMultiDict(parse_qs(x, keep_blank_values=True))
+            previous_service = Service.from_form(PewSheetForm(args))
+            service_ids.append(store.add(previous_service,
+                                         _query_string(args)))
+        except Exception as exc:
+            logger.warning(exc)
+
+    return service_ids
 
 
 def pew_sheet_create_view():
     form = PewSheetForm(request.args)
     if not form.primary_feast.data:
-        form.primary_feast.data = Feast.next().slug
+        # Suggest the feasts kept on the chosen date (if nothing is,
+        # leave them blank), or if none was chosen whatever is kept
+        # next, and its date
+        if form.date.data:
+            obs = observance(form.date.data)
+        else:
+            obs = next_observance()
+            form.date.data = obs.date
+        if obs is not None:
+            form.primary_feast.data = obs.primary.slug
+            if not form.secondary_feasts.data:
+                form.secondary_feasts.data = [f.slug for f in obs.secondary]
     service = None
 
     if form.validate_on_submit():
         service = Service.from_form(form)
 
-    stored_history = session.get(COOKIE_NAME, [])
-    stored_history = set(stored_history)  # drop duplicates
+    store = get_service_store()
+    stored_history = _stored_history(store)
     if service is not None:
-        stored_history.add(urlencode(request.args))
+        stored_history.append(
+            store.add(service, _query_string(request.args))
+        )
 
     # Update the stored history (might not have changed if the service
-    # creation was unsuccessful). Session data must be JSON
-    # serializable, so convert back to a list
-    stored_history = list(stored_history)
+    # creation was unsuccessful). Drop duplicates, keeping the order.
+    stored_history = list(dict.fromkeys(stored_history))
 
     session[COOKIE_NAME] = stored_history
 
-    previous_services = []
-    for x in stored_history:
-        try:
-            args = ImmutableMultiDict(parse_qs(x, keep_blank_values=True))
-            previous_service = Service.from_form(PewSheetForm(args))
-            previous_services.append((urlencode(args), previous_service))
-        except Exception as exc:
-            logger.warning(exc)
-            pass
-
-    previous_services.sort(key=lambda args_service: args_service[1].date)
+    previous_services = [(ss.query, ss.service)
+                         for ss in store.get_many(stored_history)]
 
     return render_template(
         'pewSheet.html', form=form, service=service,
@@ -57,7 +98,7 @@ def pew_sheet_create_view():
 
 
 def pew_sheet_clear_history_endpoint():
-    session[COOKIE_NAME] = {}
+    session[COOKIE_NAME] = []
     return make_response('', 204)
 
 
@@ -72,7 +113,8 @@ def pew_sheet_docx_view():
             for e in es:
                 flash(f'{k}: {e}', 'danger')
         return redirect(
-            url_for('pew_sheet_create_view') + '?' + urlencode(request.args),
+            url_for('pew_sheet_create_view') + '?'
+            + _query_string(request.args),
             400)
 
     service = Service.from_form(form)
@@ -80,8 +122,13 @@ def pew_sheet_docx_view():
     datestamp = service.date.strftime("%Y-%m-%d")
 
     filename = f'{datestamp} {service.title}.docx'
-    temp_docx = os.path.join(cache_dir, f"pew_sheet_{str(uuid.uuid4())}.docx")
-    service.create_docx(temp_docx)
+    # Many people tend to ask for the same pew sheet just before a
+    # service, so render it once for all of them. The order of the
+    # values of each field matters, e.g. for the secondary feasts.
+    key = (tuple(sorted(request.args.items(multi=True), key=lambda kv: kv[0])),
+           data_version())
+    docx = _docx_cache.get(key, service.docx)
     return send_file(
-        temp_docx, as_attachment=True, download_name=filename
+        BytesIO(docx), as_attachment=True, download_name=filename,
+        mimetype=DOCX_MIMETYPE
     )
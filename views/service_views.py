@@ -0,0 +1,68 @@
+from flask import jsonify, make_response, request, url_for
+
+from service_store import StoredService, get_service_store, month_range
+from utils import str2date
+
+__all__ = ['service_index_api', 'service_detail_api']
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+
+def _stored_service_json(ss: StoredService) -> dict:
+    service = ss.service
+    return {
+        'id': ss.id,
+        'title': service.title,
+        'date': service.date.isoformat(),
+        'time': service.time.isoformat(),
+        'primary_feast': service.primary_feast.slug,
+        'secondary_feasts': [f.slug for f in service.secondary_feasts],
+        'celebrant': service.celebrant,
+        'preacher': service.preacher,
+        'url': url_for('pew_sheet_create_view') + '?' + ss.query,
+    }
+
+
+def service_index_api():
+    """API to list stored services, soonest first. Accepts the filters
+    start, end (ISO dates), month (YYYY-MM), feast (primary feast slug)
+    and celebrant, and is paginated with page and per_page.
+    """
+    try:
+        start = end = None
+        if request.args.get('month'):
+            year, month = request.args['month'].split('-')
+            start, end = month_range(int(year), int(month))
+        if request.args.get('start'):
+            start = str2date(request.args['start'])
+        if request.args.get('end'):
+            end = str2date(request.args['end'])
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', DEFAULT_PER_PAGE))
+    except ValueError as exc:
+        return make_response(f'Bad query: {exc}', 400)
+
+    if page < 1 or not 1 <= per_page <= MAX_PER_PAGE:
+        return make_response('Bad page or per_page', 400)
+
+    criteria = dict(start=start, end=end,
+                    primary_feast=request.args.get('feast') or None,
+                    celebrant=request.args.get('celebrant') or None)
+
+    store = get_service_store()
+    services = store.query(**criteria, limit=per_page,
+                           offset=(page - 1) * per_page)
+    return jsonify({
+        'page': page,
+        'per_page': per_page,
+        'total': store.count(**criteria),
+        'services': [_stored_service_json(ss) for ss in services],
+    })
+
+
+def service_detail_api(service_id):
+    ss = get_service_store().get(service_id)
+    if ss is None:
+        return make_response(f'Service {service_id} not found', 404)
+    return jsonify(_stored_service_json(ss))
@@ -0,0 +1,105 @@
+"""Fill the caches that would otherwise be filled by the first requests.
+
+When serving with several worker processes, this is done once in the
+master process before the workers are forked, so that the workers share
+the warmed caches copy-on-write instead of each building their own. Run
+``python pypew.py warm`` to see how long each step takes.
+"""
+import datetime as dt
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import Flask
+
+import forms
+import precedence
+from models import (Feast, Music, Service, _pew_sheet_skeleton,
+                    _pew_sheet_template)
+from utils import logger
+from views import feast_views
+
+
+def _feast_catalogue() -> None:
+    for feast in Feast.all():
+        # Load the proper texts too, which are otherwise read lazily
+        feast.propers
+
+
+def _calendar() -> None:
+    year = dt.date.today().year
+    precedence.resolve_year(year)
+    precedence.resolve_year(year + 1)
+    Feast.upcoming()
+    forms.feast_choices()
+    forms.feast_dates()
+
+
+def _hymns() -> None:
+    Music.get_neh_hymn_by_ref('NEH: 1a')
+    forms.hymns()
+    forms.translations()
+
+
+def _docx_template() -> None:
+    _pew_sheet_template()
+    _pew_sheet_skeleton()
+
+
+def _proper_texts() -> None:
+    # Pre-render the RichText of each feast's proper texts
+    today = dt.date.today()
+    for feast in Feast.all():
+        for item in Service(title='', date=today, primary_feast=feast).items:
+            item.as_richtext()
+
+
+def _feast_docx() -> None:
+    for feast in Feast.all():
+        feast.docx()
+
+
+def _templates(app: Flask) -> None:
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+
+
+def _json_apis(app: Flask) -> None:
+    with app.app_context():
+        feast_views.feast_index_json()
+        for feast in Feast.all():
+            feast_views.feast_detail_json(feast.slug)
+
+
+STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ('feast catalogue', _feast_catalogue),
+    ('calendar', _calendar),
+    ('hymns', _hymns),
+    ('docx template', _docx_template),
+    ('proper texts', _proper_texts),
+    ('feast docx', _feast_docx),
+]
+
+# Steps that need the app
+APP_STEPS: List[Tuple[str, Callable[[Flask], None]]] = [
+    ('html templates', _templates),
+    ('json apis', _json_apis),
+]
+
+
+def warm(app: Optional[Flask] = None) -> Dict[str, float]:
+    """Run each warming step, returning how long each took in
+    milliseconds. The steps in APP_STEPS are only run if an app is
+    given.
+    """
+    steps = list(STEPS)
+    if app is not None:
+        steps += [(name, lambda step=step: step(app))
+                  for name, step in APP_STEPS]
+
+    timings = {}
+    for name, step in steps:
+        t0 = time.perf_counter()
+        step()
+        timings[name] = (time.perf_counter() - t0) * 1000
+        logger.info(f'Warmed {name} in {timings[name]:.1f} ms')
+    return timings